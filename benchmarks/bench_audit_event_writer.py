@@ -0,0 +1,62 @@
+"""
+Compare creating audit events one at a time with an audit event writer, against a simulated API.
+
+    python benchmarks/bench_audit_event_writer.py [--events N] [--latency SECONDS]
+
+Each request to the simulated API sleeps for ``--latency`` seconds before returning a canned response, standing in for
+the round trip to the Data API, which is what dominates the time taken to create many audit events.
+"""
+import argparse
+import time
+
+import requests
+
+from dmapiclient.audit import AuditTypes
+from dmapiclient.data import DataAPIClient
+from dmapiclient.jsoncodec import StdlibJSONCodec
+
+
+class SlowSession(object):
+    def __init__(self, latency):
+        self.latency = latency
+
+    def request(self, *args, **kwargs):
+        time.sleep(self.latency)
+        response = requests.Response()
+        response.status_code = 201
+        response._content = b'{"auditEvents": {"id": 1}}'
+        response.raw = None
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=500, help="audit events to create")
+    parser.add_argument("--latency", type=float, default=0.01, help="simulated seconds per request")
+    args = parser.parse_args()
+
+    client = DataAPIClient("http://localhost", "auth-token", codec=StdlibJSONCodec(), quiet=True)
+    session = SlowSession(args.latency)
+    client._requests_retry_session = lambda **kwargs: session
+
+    def add_events(add):
+        for object_id in range(args.events):
+            add(AuditTypes.update_service_status, "user", {"new_status": "published"}, "services", object_id)
+
+    cases = []
+    start_time = time.perf_counter()
+    add_events(client.create_audit_event)
+    cases.append(("create_audit_event", time.perf_counter() - start_time))
+
+    start_time = time.perf_counter()
+    with client.audit_event_writer() as writer:
+        add_events(writer.add)
+    cases.append(("audit_event_writer", time.perf_counter() - start_time))
+
+    print("{:<20} {:>10} {:>14}".format("", "seconds", "events / s"))
+    for name, total_time in cases:
+        print("{:<20} {:>10.2f} {:>14.0f}".format(name, total_time, args.events / total_time))
+
+
+if __name__ == "__main__":
+    main()
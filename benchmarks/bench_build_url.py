@@ -0,0 +1,64 @@
+"""
+Compare the cost of building request urls with ``routes.build_url`` against building them from scratch each time.
+
+    python benchmarks/bench_build_url.py [--number N]
+"""
+import argparse
+import timeit
+import urllib.parse as urlparse
+
+import requests
+
+from dmapiclient.routes import build_url
+
+
+def uncached_build_url(base_url, url, params):
+    url = urlparse.urlparse(urlparse.urljoin(base_url, url))
+    parsed_base_url = urlparse.urlparse(base_url)
+    url = url._replace(netloc=parsed_base_url.netloc, scheme=parsed_base_url.scheme).geturl()
+
+    r = requests.PreparedRequest()
+    r.prepare_url(url=url, params=params)
+    return r.url
+
+
+BASE_URL = "http://localhost:5000"
+
+# the url requested each time (formatted with its index), and params
+CASES = {
+    "path": ("/frameworks/g-cloud-12", None),
+    "path with params": ("/brief-responses", {"brief_id": 123, "status": "submitted,pending-awaiting-clarification"}),
+    # a paginated sweep, where every next link is different
+    "next links": ("http://localhost:5000/suppliers?framework=g-cloud-12&page={}", None),
+}
+
+
+def time_urls(build, urls, params):
+    def build_all():
+        for url in urls:
+            build(BASE_URL, url, params)
+
+    return min(timeit.repeat(build_all, number=1, repeat=5))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000, help="urls built per measurement")
+    args = parser.parse_args()
+
+    print("{:<20} {:>14} {:>14} {:>9}".format("url", "uncached (µs)", "cached (µs)", "speedup"))
+    for name, (url_template, params) in CASES.items():
+        urls = [url_template.format(index) for index in range(args.number)]
+        assert build_url(BASE_URL, urls[-1], params) == uncached_build_url(BASE_URL, urls[-1], params)
+        uncached_time = time_urls(uncached_build_url, urls, params)
+        cached_time = time_urls(build_url, urls, params)
+        print("{:<20} {:>14.2f} {:>14.2f} {:>8.1f}x".format(
+            name,
+            uncached_time / args.number * 1e6,
+            cached_time / args.number * 1e6,
+            uncached_time / cached_time,
+        ))
+
+
+if __name__ == "__main__":
+    main()
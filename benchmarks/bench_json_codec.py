@@ -0,0 +1,76 @@
+"""
+Compare the JSON codecs available in this environment on payloads shaped like real API responses.
+
+    python benchmarks/bench_json_codec.py [--number N]
+
+Install ``orjson`` and/or ``ujson`` to include them in the comparison.
+"""
+import argparse
+import timeit
+
+from dmapiclient.jsoncodec import available_codecs
+
+
+def brief_responses_page(count=100):
+    return {
+        "briefResponses": [
+            {
+                "id": 1000 + i,
+                "briefId": 123,
+                "supplierId": 70000 + i,
+                "supplierName": "Supplier {} Ltd".format(i),
+                "status": "submitted",
+                "submittedAt": "2020-01-01T12:00:00.000000Z",
+                "respondToEmailAddress": "bids@supplier{}.example.com".format(i),
+                "availability": "Two weeks from contract signature",
+                "dayRate": "{}.00".format(500 + i),
+                "essentialRequirementsMet": True,
+                "essentialRequirements": [{"evidence": "We have done this " * 20} for _ in range(5)],
+                "niceToHaveRequirements": [{"yesNo": i % 2 == 0, "evidence": "Also this " * 10} for _ in range(5)],
+                "links": {"self": "http://localhost/brief-responses/{}".format(1000 + i)},
+            }
+            for i in range(count)
+        ],
+        "links": {"next": "http://localhost/brief-responses?page=2", "last": "http://localhost/brief-responses?page=9"},
+        "meta": {"total": 900},
+    }
+
+
+def supplier_framework_declaration(questions=400):
+    declaration = {"status": "complete", "nameOfOrganisation": "Ünïcode Ltd", "primaryContactEmail": "a@example.com"}
+    declaration.update(
+        ("question{}".format(i), [True, False, "An answer to the question " * 5, None, 12.5][i % 5])
+        for i in range(questions)
+    )
+    return {"declaration": declaration}
+
+
+PAYLOADS = {
+    "brief responses page": brief_responses_page(),
+    "supplier declaration": supplier_framework_declaration(),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=200, help="iterations per measurement")
+    args = parser.parse_args()
+
+    codecs = available_codecs()
+    print("{:<24} {:<8} {:>12} {:>12} {:>10}".format("payload", "codec", "dumps (µs)", "loads (µs)", "bytes"))
+    for payload_name, payload in PAYLOADS.items():
+        for codec in codecs:
+            body = codec.dumps(payload)
+            dumps_time = min(timeit.repeat(lambda: codec.dumps(payload), number=args.number, repeat=3))
+            loads_time = min(timeit.repeat(lambda: codec.loads(body), number=args.number, repeat=3))
+            print("{:<24} {:<8} {:>12.1f} {:>12.1f} {:>10}".format(
+                payload_name,
+                codec.name,
+                dumps_time / args.number * 1e6,
+                loads_time / args.number * 1e6,
+                len(body),
+            ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Compare the memory held by models decoded to dicts and converted to ``dmapiclient.records`` records.
+
+    python benchmarks/bench_record_memory.py [--models N]
+
+Each model is decoded from its own JSON body, as a page of an iterator's response would be, so that nothing is shared
+between them other than what the JSON decoder shares itself.
+"""
+import argparse
+import json
+import tracemalloc
+
+from dmapiclient.records import AuditEvent, Service
+
+
+def audit_event(index):
+    return {
+        "id": index,
+        "type": "update_service",
+        "user": "user{}@example.com".format(index % 100),
+        "createdAt": "2026-01-01T00:00:{:02d}.000000Z".format(index % 60),
+        "acknowledged": False,
+        "acknowledgedBy": None,
+        "acknowledgedAt": None,
+        "objectType": "services",
+        "objectId": str(1000000000 + index),
+        "data": {"serviceId": str(1000000000 + index), "supplierId": index % 1000},
+        "links": {"self": "http://localhost/audit-events/{}".format(index)},
+    }
+
+
+def service(index):
+    return {
+        "id": str(1000000000 + index),
+        "serviceName": "Service {}".format(index),
+        "supplierId": index % 1000,
+        "supplierName": "Supplier {}".format(index % 1000),
+        "frameworkSlug": "g-cloud-12",
+        "lot": "cloud-software",
+        "status": "published",
+        "serviceDescription": "A service",
+        "serviceFeatures": ["one", "two"],
+        "links": {"self": "http://localhost/services/{}".format(1000000000 + index)},
+    }
+
+
+def held_bytes(bodies, convert):
+    tracemalloc.start()
+    models = [convert(json.loads(body)) for body in bodies]
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del models
+    return held
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--models", type=int, default=100000, help="models of each type to hold")
+    args = parser.parse_args()
+
+    print("{:<12} {:>14} {:>14} {:>10}".format("", "dict bytes", "record bytes", "saving"))
+    for make_model, record_type in ((audit_event, AuditEvent), (service, Service)):
+        bodies = [json.dumps(make_model(index)) for index in range(args.models)]
+        dict_bytes = held_bytes(bodies, lambda model: model)
+        record_bytes = held_bytes(bodies, record_type)
+        print("{:<12} {:>14,} {:>14,} {:>9.0%}".format(
+            record_type.__name__, dict_bytes, record_bytes, 1 - record_bytes / dict_bytes,
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Measure the per-request cost of the clients' request logging, with no network involved.
+
+    python benchmarks/bench_request_logging.py [--number N]
+
+Each request is timed through ``_request`` against a canned response, with the ``dmapiclient.base`` logger at DEBUG
+(everything logged, to a ``NullHandler``), at WARNING (successful requests' records skipped by the level guards), and
+with a ``quiet=True`` client. "unguarded" repeats the WARNING case as the clients behaved before the level guards were
+added: building every record's extras and calling ``logger.log`` on the same WARNING level logger, which then drops
+the disabled records itself.
+"""
+import argparse
+import logging
+import timeit
+from unittest import mock
+
+import requests
+
+from dmapiclient import base
+from dmapiclient.base import BaseAPIClient
+from dmapiclient.jsoncodec import StdlibJSONCodec
+
+
+class CannedSession(object):
+    def __init__(self):
+        self.response = requests.Response()
+        self.response.status_code = 200
+        self.response._content = b'{"frameworks": {"slug": "g-cloud-12", "status": "live"}}'
+        self.response.raw = None
+
+    def request(self, *args, **kwargs):
+        return self.response
+
+
+class UnguardedLogger(object):
+    """Passes the clients' level guards, but logs through ``logger`` - which checks its level as usual"""
+
+    def __init__(self, logger):
+        self._logger = logger
+
+    def isEnabledFor(self, level):
+        return True
+
+    def __getattr__(self, name):
+        return getattr(self._logger, name)
+
+
+def time_requests(client, number):
+    session = CannedSession()
+    client._requests_retry_session = lambda **kwargs: session
+    return min(timeit.repeat(lambda: client._request("GET", "/frameworks/g-cloud-12"), number=number, repeat=5))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000, help="requests per measurement")
+    args = parser.parse_args()
+
+    api_logger = logging.getLogger("dmapiclient.base")
+    api_logger.addHandler(logging.NullHandler())
+    api_logger.propagate = False
+
+    def client(**kwargs):
+        return BaseAPIClient("http://localhost", "auth-token", codec=StdlibJSONCodec(), **kwargs)
+
+    cases = []
+    api_logger.setLevel(logging.DEBUG)
+    cases.append(("DEBUG", time_requests(client(), args.number)))
+    api_logger.setLevel(logging.WARNING)
+    with mock.patch.object(base, "logger", UnguardedLogger(api_logger)):
+        cases.append(("WARNING, unguarded", time_requests(client(), args.number)))
+    cases.append(("WARNING", time_requests(client(), args.number)))
+    cases.append(("quiet", time_requests(client(quiet=True), args.number)))
+
+    baseline = cases[1][1]
+    print("{:<20} {:>14} {:>10}".format("logging", "µs / request", "relative"))
+    for name, total_time in cases:
+        print("{:<20} {:>14.2f} {:>10.2f}".format(name, total_time / args.number * 1e6, total_time / baseline))
+
+
+if __name__ == "__main__":
+    main()
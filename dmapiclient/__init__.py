@@ -1,8 +1,25 @@
-__version__ = '24.0.0'
+__version__ = '24.25.0'
 
 from .errors import APIError, HTTPError, InvalidResponse  # noqa
 from .errors import REQUEST_ERROR_STATUS_CODE, REQUEST_ERROR_MESSAGE  # noqa
+from .errors import CircuitOpenError, DeadlineExceeded  # noqa
+
+from .cache import ResponseCache, RevalidationCache  # noqa
+from .concurrency import BulkResult  # noqa
+from .auditwriter import AuditEventWriter  # noqa
+from .acknowledgement import BulkAcknowledgement  # noqa
+from .jsoncodec import JSONCodec, StdlibJSONCodec, OrjsonCodec, UjsonCodec  # noqa
+from .transfer import TransferStats  # noqa
+from .metrics import MetricsRecorder, InMemoryMetrics, PrometheusMetrics  # noqa
+from .retries import RetryBudget, RetryPolicy  # noqa
+from .circuitbreaker import CircuitBreakerPolicy  # noqa
+from .hedging import HedgingPolicy  # noqa
+from .singleflight import SingleFlight  # noqa
+from .deadlines import deadline  # noqa
+from .checkpoints import FileCheckpointStore  # noqa
+from .columnar import ColumnSchema  # noqa
 
 from .antivirus import AntivirusAPIClient  # noqa
 from .data import DataAPIClient  # noqa
 from .search import SearchAPIClient  # noqa
+from .aio import AsyncDataAPIClient, AsyncSearchAPIClient  # noqa
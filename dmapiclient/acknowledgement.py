@@ -0,0 +1,146 @@
+"""
+Acknowledging many audit events at once.
+
+``DataAPIClient.bulk_acknowledge_audit_events`` finds every unacknowledged audit event matching its filters, then
+acknowledges them concurrently over the client's pooled connections. A service's ``update_service`` events are
+acknowledged together with one ``acknowledge_service_update_including_previous`` call for the latest of them, rather
+than one call each. That call also acknowledges every earlier update of the service, so updates are only collapsed
+like this when the filters given can't have left any of them out - e.g. not when filtering by ``audit_date`` or
+``user``.
+
+Events are only acknowledged once they've all been found: acknowledging them while paging through the unacknowledged
+events would move later events onto pages already read, so they'd be skipped.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import List
+
+from .audit import AuditTypes
+from .errors import APIError
+
+
+# filters of find_audit_events which find either every unacknowledged update_service event of a service or none of them
+_SERVICE_UPDATE_PRESERVING_FILTERS = frozenset(("audit_type", "object_type", "object_id", "latest_first", "sort_by"))
+
+
+def can_collapse_service_updates(filters) -> bool:
+    """Return whether each service's updates can be acknowledged together when finding events with ``filters``"""
+    return all(key in _SERVICE_UPDATE_PRESERVING_FILTERS for key, value in filters.items() if value is not None)
+
+
+class BulkAcknowledgement(object):
+    """The progress of acknowledging many audit events, with thread-safe counts.
+
+    ``errors`` holds the ``APIError`` for each failed call, by the id of the audit event it was acknowledging (for a
+    service's updates acknowledged together, the latest of them).
+    """
+
+    def __init__(
+        self,
+        client,
+        *,
+        user=None,
+        collapse_service_updates: bool = True,
+        on_progress=None,
+        clock=time.perf_counter,
+    ):
+        self.client = client
+        self.user = user
+        self.collapse_service_updates = collapse_service_updates
+        self.on_progress = on_progress
+        self._clock = clock
+        self._started_at = clock()
+
+        self._lock = threading.Lock()
+        # the ids of events to acknowledge one by one
+        self._event_ids: List[int] = []
+        # [latest event id, number of events] of the updates to acknowledge for each service
+        self._service_updates: "OrderedDict[object, List[int]]" = OrderedDict()
+
+        self.found = 0
+        self.acknowledged = 0
+        self.requests = 0
+        self.errors: "OrderedDict[int, APIError]" = OrderedDict()
+
+    def add(self, audit_event):
+        """Add a found audit event to be acknowledged"""
+        service_id = (
+            audit_event.get("data", {}).get("serviceId")
+            if self.collapse_service_updates and audit_event.get("type") == AuditTypes.update_service.value
+            else None
+        )
+        self.found += 1
+        if service_id is None:
+            self._event_ids.append(audit_event["id"])
+            return
+        service_updates = self._service_updates.get(service_id)
+        if service_updates is None:
+            self._service_updates[service_id] = [audit_event["id"], 1]
+        else:
+            service_updates[0] = max(service_updates[0], audit_event["id"])
+            service_updates[1] += 1
+
+    def calls(self):
+        """The acknowledgement calls to make, each to be passed to ``acknowledge``"""
+        return [("audit-event", event_id) for event_id in self._event_ids] + [
+            ("service", service_id) for service_id in self._service_updates
+        ]
+
+    def _prepare(self, call):
+        """Return the client method and arguments for ``call``, with the id of the event it's for and the number of
+        events it acknowledges
+        """
+        kind, key = call
+        if kind == "service":
+            latest_event_id, events = self._service_updates[key]
+            method = self.client.acknowledge_service_update_including_previous
+            return method, (key, latest_event_id), latest_event_id, events
+        return self.client.acknowledge_audit_event, (key,), key, 1
+
+    def _record(self, event_id, events, error=None):
+        with self._lock:
+            self.requests += 1
+            if error is None:
+                self.acknowledged += events
+            else:
+                self.errors[event_id] = error
+            # called with the lock held, so that progress is reported in order
+            if self.on_progress is not None:
+                self.on_progress(self._stats())
+
+    def acknowledge(self, call):
+        method, args, event_id, events = self._prepare(call)
+        try:
+            response = method(*args, user=self.user)
+        except APIError as e:
+            self._record(event_id, events, e)
+            raise
+        self._record(event_id, events)
+        return response
+
+    async def acknowledge_async(self, call):
+        method, args, event_id, events = self._prepare(call)
+        try:
+            response = await method(*args, user=self.user)
+        except APIError as e:
+            self._record(event_id, events, e)
+            raise
+        self._record(event_id, events)
+        return response
+
+    def _stats(self):
+        elapsed_time = self._clock() - self._started_at
+        return {
+            "found": self.found,
+            "acknowledged": self.acknowledged,
+            "failed": len(self.errors),
+            "requests": self.requests,
+            "elapsed_time": elapsed_time,
+            "events_per_second": self.acknowledged / elapsed_time if elapsed_time > 0 else 0.,
+        }
+
+    @property
+    def stats(self):
+        with self._lock:
+            return self._stats()
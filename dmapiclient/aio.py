@@ -0,0 +1,566 @@
+"""
+asyncio counterparts of the API clients.
+
+These share their endpoint definitions with the synchronous clients - an ``AsyncDataAPIClient`` has every method a
+``DataAPIClient`` has, but each one returns an awaitable (or, for ``*_iter`` methods, an async iterator). Only the
+handful of endpoint methods which post-process a response need their own async implementation here.
+
+Requires the optional ``aiohttp`` dependency (``pip install digitalmarketplace-apiclient[async]``).
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+from . import deadlines
+from .acknowledgement import BulkAcknowledgement, can_collapse_service_updates
+from .auditwriter import AsyncAuditEventWriter
+from .base import BaseAPIClient, logger
+from .concurrency import BulkResult
+from .data import DataAPIClient
+from .errors import APIError, HTTPError
+from .projection import Projection
+from .records import record_type
+from .search import SearchAPIClient
+
+
+def _make_response(status, reason, headers, content, url):
+    """Build a ``requests.Response`` from a completed aiohttp response so that our error types behave identically"""
+    response = requests.Response()
+    response.status_code = status
+    response.reason = reason
+    response.headers = CaseInsensitiveDict(headers)
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response.url = url
+    response._content = content
+    return response
+
+
+class AsyncBaseAPIClient(BaseAPIClient):
+    # retries on failed reads and on error statuses are limited to the same methods urllib3 considers safe to retry
+    _RETRIES_ALLOWED_METHODS = Retry.DEFAULT_ALLOWED_METHODS
+
+    def _reset_sessions(self):
+        super()._reset_sessions()
+        # the aiohttp session and the event loop it's bound to
+        self._aiohttp_session = (None, None)
+
+    async def close(self):
+        """Close any pooled connections held by this client"""
+        super().close()
+        (loop, session), self._aiohttp_session = self._aiohttp_session, (None, None)
+        if session is None:
+            return
+        if loop is asyncio.get_running_loop():
+            await session.close()
+        else:
+            self._discard_aiohttp_session(loop, session)
+
+    @staticmethod
+    def _discard_aiohttp_session(loop, session):
+        """Close a session bound to another event loop than the current one"""
+        if loop.is_running():
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+        else:
+            # its loop has stopped (e.g. at the end of asyncio.run()), so its connections can't be closed cleanly -
+            # detaching them at least marks the session closed
+            session.detach()
+
+    def __enter__(self):
+        raise TypeError("{} must be used with 'async with'".format(self.__class__.__name__))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _get_aiohttp_session(self):
+        # imported here so that the rest of the package remains usable without aiohttp installed
+        import aiohttp
+
+        # aiohttp sessions can only be used from the event loop they were created in, whereas a client may be used
+        # from several in turn, e.g. by successive asyncio.run() calls
+        loop = asyncio.get_running_loop()
+        session_loop, session = self._aiohttp_session
+        if session is not None and session_loop is not loop:
+            self._discard_aiohttp_session(session_loop, session)
+            session = None
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self._pool_maxsize))
+            self._aiohttp_session = (loop, session)
+        return session
+
+    def _aiohttp_timeout(self, timeout):
+        import aiohttp
+
+        try:
+            connect_timeout, read_timeout = timeout
+        except TypeError:
+            connect_timeout = read_timeout = timeout
+        # unlike urllib3, aiohttp can limit each attempt to the time left before any deadline in total (a total of 0
+        # would mean no limit)
+        time_left = deadlines.remaining()
+        total = None if time_left is None else max(time_left, 1.e-3)
+        return aiohttp.ClientTimeout(total=total, sock_connect=connect_timeout, sock_read=read_timeout)
+
+    def _get_backoff_time(self, consecutive_errors):
+        # mirrors urllib3's Retry.get_backoff_time
+        if consecutive_errors <= 1:
+            return 0
+        return min(Retry.DEFAULT_BACKOFF_MAX, self._RETRIES_BACKOFF_FACTOR * (2 ** (consecutive_errors - 1)))
+
+    async def _send(self, method, url, headers, data, *, client_wait_for_response, timeout):
+        """Perform a request with our retry policy, returning a ``requests.Response``.
+
+        Raises a ``requests.RequestException`` on failure, as requests itself would.
+        """
+        import aiohttp
+        import yarl
+
+        session = self._get_aiohttp_session()
+        retry_policy = self._retry_policy_for(url)
+        max_retries = self._RETRIES if retry_policy is None else retry_policy.retries
+        force_status_codes = (
+            self._RETRIES_FORCE_STATUS_CODES if retry_policy is None else retry_policy.status_forcelist
+        )
+        # our url is already fully encoded by _build_url - stop yarl from re-normalising it
+        url = yarl.URL(url, encoded=True)
+        method_retryable = method.upper() in self._RETRIES_ALLOWED_METHODS
+
+        consecutive_errors = 0
+        backoff = 0.
+        while True:
+            retry_after = None
+            try:
+                async with session.request(
+                    method, url, headers=headers, data=data, timeout=self._aiohttp_timeout(timeout),
+                ) as resp:
+                    content = await resp.read()
+                    response = _make_response(resp.status, resp.reason, resp.headers, content, str(url))
+            except aiohttp.ClientConnectorError as e:
+                # the request never reached the server, so is always safe to retry
+                error = requests.ConnectionError(e)
+                retryable = True
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = (
+                    requests.ReadTimeout(e) if isinstance(e, asyncio.TimeoutError) else requests.ConnectionError(e)
+                )
+                retryable = method_retryable and client_wait_for_response
+            else:
+                response._dmapiclient_retries = consecutive_errors
+                if not (method_retryable and response.status_code in force_status_codes):
+                    return response
+                error = None
+                retryable = True
+                if response.status_code in Retry.RETRY_AFTER_STATUS_CODES and response.headers.get("Retry-After"):
+                    retry_after = Retry().parse_retry_after(response.headers["Retry-After"])
+
+            consecutive_errors += 1
+            if retry_policy is not None:
+                backoff = retry_policy.next_backoff(backoff)
+            else:
+                backoff = self._get_backoff_time(consecutive_errors)
+            time_left = deadlines.remaining()
+            deadline_exceeded = time_left is not None and time_left <= (retry_after or backoff)
+
+            if (
+                not retryable
+                or consecutive_errors > max_retries
+                or deadline_exceeded
+                or (self._retry_budget is not None and not self._retry_budget.try_retry())
+            ):
+                if error is None:
+                    # like urllib3 with raise_on_status=False, hand back the final error response
+                    return response
+                error._dmapiclient_retries = consecutive_errors - 1
+                error._dmapiclient_deadline_exceeded = deadline_exceeded
+                raise error
+
+            await asyncio.sleep(retry_after or backoff)
+
+    def _count_retries(self, response, exc=None):
+        # counted by _send
+        return getattr(response if response is not None else exc, "_dmapiclient_retries", 0)
+
+    async def _send_request(
+        self,
+        method,
+        url,
+        data=None,
+        *,
+        client_wait_for_response: bool = True,
+        extra_headers=None,
+        stream: bool = False,
+    ):
+        # the body is always read in full before the response is returned
+        timeout, time_left = self._request_timeout(client_wait_for_response)
+        circuit_breaker = self._check_circuit()
+        ci_headers = self._build_headers()
+        if extra_headers:
+            ci_headers.update(extra_headers)
+        body, body_headers, body_size = self._encode_request_body(data)
+        ci_headers.update(body_headers)
+
+        request_log = self._request_log
+        child_span_id = self._child_span_id(ci_headers) if request_log.enabled else None
+        request_log.started(method, url, child_span_id)
+
+        start_time = time.perf_counter()
+        try:
+            response = await self._send(
+                method,
+                url,
+                dict(ci_headers),
+                body,
+                client_wait_for_response=client_wait_for_response,
+                timeout=timeout,
+            )
+            response.raise_for_status()
+        except requests.RequestException as e:
+            elapsed_time = time.perf_counter() - start_time
+
+            if (not client_wait_for_response) and isinstance(e, requests.ReadTimeout):
+                request_log.dispatched(method, url, elapsed_time, child_span_id)
+                if circuit_breaker is not None:
+                    circuit_breaker.record_unknown()
+                return None
+
+            api_error = HTTPError.create(e, codec=self._codec)
+            if time_left is not None:
+                api_error = self._deadline_error(e, api_error)
+            request_log.failed(method, url, api_error, e, elapsed_time, child_span_id)
+            self._record_circuit_failure(circuit_breaker, api_error)
+            self._record_failure(method, url, api_error, e, elapsed_time, body)
+            raise api_error
+        else:
+            elapsed_time = time.perf_counter() - start_time
+            request_log.finished(method, url, response.status_code, elapsed_time, child_span_id)
+            if self._retry_budget is not None:
+                self._retry_budget.record_success()
+            if circuit_breaker is not None:
+                circuit_breaker.record_success()
+
+        self._record_response(
+            method,
+            url,
+            elapsed_time,
+            self._count_retries(response),
+            body,
+            body_size,
+            response,
+            len(response.content),
+        )
+        return response
+
+    async def _send_hedgeable_request(
+        self,
+        method,
+        url,
+        data=None,
+        *,
+        client_wait_for_response=True,
+        extra_headers=None,
+    ):
+        endpoint = self._hedging_endpoint(method, url, client_wait_for_response)
+        if endpoint is None:
+            return await self._send_request(
+                method,
+                url,
+                data,
+                client_wait_for_response=client_wait_for_response,
+                extra_headers=extra_headers,
+            )
+
+        hedge_delay = self._hedger.delay_for(endpoint)
+        start_time = time.perf_counter()
+        first_attempt = asyncio.ensure_future(self._send_request(method, url, data, extra_headers=extra_headers))
+        done, _ = await asyncio.wait((first_attempt,), timeout=hedge_delay)
+        if done or not self._hedger.try_hedge():
+            response = await first_attempt
+            self._hedger.record_latency(endpoint, time.perf_counter() - start_time)
+            return response
+
+        hedge = asyncio.ensure_future(self._send_request(method, url, data, extra_headers=extra_headers))
+        pending = {first_attempt, hedge}
+        winner = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is not None:
+                    if winner is hedge:
+                        self._hedger.record_hedge_won()
+                    break
+        finally:
+            for loser in pending:
+                loser.cancel()
+
+        if winner is None:
+            # both failed
+            return await first_attempt
+
+        # only the first attempt is timed, as hedges are only sent when it's slow - if it lost, it took at least as long
+        self._hedger.record_latency(endpoint, time.perf_counter() - start_time)
+        return winner.result()
+
+    async def _request(self, method, url, data=None, params=None, *, client_wait_for_response: bool = True):
+        if not self._enabled:
+            return None
+
+        url = self._build_url(url, params)
+
+        cached_body, cache_ttl = self._cache_lookup(method, url)
+        if cached_body is not None:
+            return self._codec.loads(cached_body)
+
+        if self._single_flight is not None and method == "GET" and client_wait_for_response:
+            response, body = await self._single_flight.do_async(
+                (self._auth_token, url),
+                lambda: self._fetch_body(method, url, data),
+                name=self._endpoint(url),
+            )
+        else:
+            response, body = await self._fetch_body(
+                method, url, data, client_wait_for_response=client_wait_for_response,
+            )
+            if response is None:
+                return None
+
+        result = self._decode_response(response, body)
+        if cache_ttl is not None:
+            self._cache_store(url, body, cache_ttl)
+        return result
+
+    async def _fetch_body(self, method, url, data=None, *, client_wait_for_response: bool = True):
+        """Send a request, returning its response and body (or ``(None, None)`` if not waiting for the response)"""
+        revalidation_key, validated = self._revalidation_lookup(method, url)
+
+        try:
+            response = await self._send_hedgeable_request(
+                method,
+                url,
+                data,
+                client_wait_for_response=client_wait_for_response,
+                extra_headers=validated.conditional_headers if validated is not None else None,
+            )
+        finally:
+            self._cache_invalidate(method, url)
+
+        if response is None:
+            return None, None
+
+        return response, self._response_body(response, revalidation_key, validated)
+
+    async def _fetch_concurrently(self, fetch, keys, *, max_workers: Optional[int] = None):
+        keys = list(OrderedDict.fromkeys(keys))
+        semaphore = asyncio.Semaphore(max_workers or self._pool_maxsize)
+
+        async def bounded_fetch(key):
+            async with semaphore:
+                return await fetch(key)
+
+        results = BulkResult()
+        outcomes = await asyncio.gather(*(bounded_fetch(key) for key in keys), return_exceptions=True)
+        for key, outcome in zip(keys, outcomes):
+            if isinstance(outcome, APIError):
+                results.errors[key] = outcome
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            else:
+                results[key] = outcome
+        return results
+
+    # iterator options of the synchronous client which these iterators don't support
+    _UNSUPPORTED_ITER_OPTIONS = ("prefetch", "parallel", "stream", "resume_from", "checkpoint")
+
+    async def _project(self, result, model_names, fields):
+        return super()._project(await result, model_names, fields)
+
+    def _iter_models(self, method_name, model_names, *args, records=False, ordered=True, **kwargs):
+        for option in self._UNSUPPORTED_ITER_OPTIONS:
+            if kwargs.pop(option, None):
+                raise ValueError("{} isn't supported by the asyncio client's iterators".format(option))
+        projection = None
+        if kwargs.get("fields") and getattr(getattr(self, method_name), "projected_models", None):
+            projection = Projection(kwargs.pop("fields"))
+        return self._async_models(
+            projection,
+            record_type(method_name, model_names) if records else None,
+            method_name,
+            model_names,
+            *args,
+            **kwargs
+        )
+
+    async def _async_models(self, projection, model_type, method_name, model_names, *args, **kwargs):
+        result = await getattr(self, method_name)(*args, **kwargs)
+        model_name = next((model_name for model_name in model_names if model_name in result), None)
+        if not model_name:
+            return
+
+        while True:
+            for model in result[model_name]:
+                if projection is not None:
+                    model = projection(model)
+                yield model if model_type is None else model_type(model)
+            if 'next' not in result.get('links', {}):
+                return
+            result = await self._get(result['links']['next'])
+
+    async def get_status(self):
+        try:
+            return await self._get("{}/_status".format(self._base_url))
+        except APIError as e:
+            try:
+                return self._codec.loads(e.response.content)
+            except (ValueError, AttributeError):
+                return {
+                    "status": "error",
+                    "message": "{}".format(e.message),
+                }
+
+
+class AsyncDataAPIClient(AsyncBaseAPIClient, DataAPIClient):
+    async def bulk_acknowledge_audit_events(
+        self,
+        *,
+        acknowledged_by=None,
+        collapse_service_updates: bool = True,
+        on_progress=None,
+        max_workers: Optional[int] = None,
+        **filters,
+    ):
+        acknowledgement = BulkAcknowledgement(
+            self,
+            user=self._getuser(acknowledged_by),
+            collapse_service_updates=collapse_service_updates and can_collapse_service_updates(filters),
+            on_progress=on_progress,
+        )
+        async for audit_event in self.find_audit_events_iter(acknowledged="false", **filters):
+            acknowledgement.add(audit_event)
+        await self._fetch_concurrently(
+            acknowledgement.acknowledge_async, acknowledgement.calls(), max_workers=max_workers,
+        )
+        return acknowledgement
+
+    def audit_event_writer(
+        self, *, batch_size: int = 100, flush_interval: float = 5., max_workers: Optional[int] = None
+    ) -> AsyncAuditEventWriter:
+        return AsyncAuditEventWriter(
+            self, batch_size=batch_size, flush_interval=flush_interval, max_workers=max_workers,
+        )
+
+    async def get_supplier_declaration(self, supplier_id, framework_slug):
+        response = await self._get(
+            "/suppliers/{}/frameworks/{}".format(supplier_id, framework_slug)
+        )
+        return {'declaration': response['frameworkInterest']['declaration']}
+
+    async def get_user(self, user_id=None, email_address=None):
+        if user_id is not None and email_address is not None:
+            raise ValueError(
+                "Cannot get user by both user_id and email_address")
+        elif user_id is not None:
+            url = "/users/{}".format(user_id)
+            params = {}
+        elif email_address is not None:
+            url = "/users"
+            params = {"email_address": email_address}
+        else:
+            raise ValueError("Either user_id or email_address must be set")
+
+        try:
+            user = await self._get(url, params=params)
+
+            if isinstance(user['users'], list):
+                user['users'] = user['users'][0]
+
+            return user
+
+        except HTTPError as e:
+            if e.status_code != 404:
+                raise
+        return None
+
+    async def authenticate_user(self, email_address, password):
+        try:
+            response = await self._post(
+                '/users/auth',
+                data={
+                    "authUsers": {
+                        "emailAddress": email_address,
+                        "password": password,
+                    }
+                })
+            return response if response else None
+        except HTTPError as e:
+            if e.status_code not in [400, 403, 404]:
+                raise
+
+    async def update_user_password(self, user_id, new_password, updater=None):
+        try:
+            await self._post_with_updated_by(
+                '/users/{}'.format(user_id),
+                data={
+                    "users": {"password": new_password},
+                },
+                user=updater or self._user or "no logged-in user",
+            )
+            return True
+        except HTTPError:
+            return False
+
+    async def update_user(self, user_id, *args, updater=None, **kwargs):
+        params = self._update_user_params(*args, **kwargs)
+
+        user = await self._post_with_updated_by(
+            '/users/{}'.format(user_id),
+            data=params,
+            user=updater or self._user or "no logged-in user",
+        )
+
+        logger.info("Updated user {user_id} fields {params}",
+                    extra={"user_id": user_id, "params": params})
+        return user
+
+    async def is_email_address_with_valid_buyer_domain(self, email_address):
+        return (await self._post(
+            "/users/check-buyer-email", data={'emailAddress': email_address}
+        ))['valid']
+
+    async def email_is_valid_for_admin_user(self, email_address):
+        return (await self._post(
+            "/users/valid-admin-email", data={'emailAddress': email_address}
+        ))['valid']
+
+    async def get_service(self, service_id):
+        try:
+            return await self._get(
+                "/services/{}".format(service_id))
+        except HTTPError as e:
+            if e.status_code != 404:
+                raise
+        return None
+
+    async def is_supplier_eligible_for_brief(self, supplier_id, brief_id):
+        return len((await self._get(
+            "/briefs/{}/services".format(brief_id),
+            params={"supplier_id": supplier_id}
+        ))['services']) > 0
+
+
+class AsyncSearchAPIClient(AsyncBaseAPIClient, SearchAPIClient):
+    async def delete(self, index, service_id, *, client_wait_for_response: bool = True):
+        url = self._url(index, service_id)
+
+        try:
+            return await self._delete(url, client_wait_for_response=client_wait_for_response)
+        except HTTPError as e:
+            if e.status_code != 404:
+                raise
+        return None
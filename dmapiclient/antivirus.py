@@ -2,6 +2,10 @@ from .base import BaseAPIClient
 
 
 class AntivirusAPIClient(BaseAPIClient):
+    ENDPOINT_TEMPLATES = BaseAPIClient.ENDPOINT_TEMPLATES + (
+        "/scan/s3-object",
+    )
+
     def init_app(self, app):
         self._base_url = app.config['DM_ANTIVIRUS_API_URL']
         self._auth_token = app.config['DM_ANTIVIRUS_API_AUTH_TOKEN']
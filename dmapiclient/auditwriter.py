@@ -0,0 +1,258 @@
+"""
+Buffered writing of many audit events.
+
+The API creates one audit event per request, so a job recording thousands of them one ``create_audit_event`` at a time
+spends nearly all its time waiting on round trips. An ``AuditEventWriter``, from ``DataAPIClient.audit_event_writer()``,
+instead collects events and sends each batch of them concurrently over the client's pooled connections:
+
+    with data_client.audit_event_writer(batch_size=100) as writer:
+        for service_id in service_ids:
+            writer.add(AuditTypes.update_service_status, user, {"new_status": "published"}, "services", service_id)
+
+    for index, payload, error in writer.failed_events:
+        ...
+
+A batch is sent once ``batch_size`` events have been added, once the oldest event waiting has waited
+``flush_interval`` seconds (by a background thread, or for ``AsyncAuditEventWriter`` a task, started when the first
+event is added), on an explicit ``flush()``, and on leaving the ``with`` block - or ``close()``, which stops the
+background flushing. Events which fail are reported rather than raised, so that one failure doesn't lose the rest of
+the batch.
+
+Batches sent in the background aren't sent with the onwards headers or deadline of the Flask request (if any) that added
+their events, as they may well be sent after it has finished.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from .concurrency import BulkResult
+from .errors import APIError
+
+logger = logging.getLogger(__name__)
+
+
+class AuditEventWriter(object):
+    """Collects audit events to create, sending them in concurrent batches.
+
+    :param client: The ``DataAPIClient`` to create the events with
+    :param batch_size: The number of events to collect before sending them
+    :param flush_interval: The longest to hold an event for before sending it, in seconds
+    :param max_workers: The most events to send at once - by default the client's ``pool_maxsize``
+    """
+
+    def __init__(
+        self,
+        client,
+        *,
+        batch_size: int = 100,
+        flush_interval: float = 5.,
+        max_workers: Optional[int] = None,
+        clock=time.monotonic,
+    ):
+        self.client = client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_workers = max_workers
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        # the events waiting to be sent, by the index they were added at
+        self._pending: "OrderedDict[int, dict]" = OrderedDict()
+        self._oldest_pending_at = 0.
+        self._added = 0
+        # for the background flusher: set to wake it when events start waiting, or to stop it once closed
+        self._wake = threading.Event()
+        self._closed = False
+        self._flusher: Optional[threading.Thread] = None
+
+        self.written = 0
+        self.errors: "OrderedDict[int, APIError]" = OrderedDict()
+        self._failed_payloads: "OrderedDict[int, dict]" = OrderedDict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _seconds_until_due(self):
+        # with the lock held
+        if not self._pending:
+            return self.flush_interval
+        return self._oldest_pending_at + self.flush_interval - self._clock()
+
+    def _queue(self, audit_type, user, data, object_type, object_id) -> Tuple[int, bool]:
+        """Add an event to be sent, returning its index and whether it's time to flush"""
+        payload = self.client._audit_event_payload(audit_type, user, data, object_type, object_id)
+        with self._lock:
+            index = self._added
+            self._added += 1
+            if not self._pending:
+                self._oldest_pending_at = self._clock()
+                self._wake.set()
+            self._pending[index] = payload
+            return index, len(self._pending) >= self.batch_size or self._seconds_until_due() <= 0
+
+    def _take_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, OrderedDict()
+        return pending
+
+    def _create(self, payload):
+        return self.client._post("/audit-events", data={"auditEvents": payload})
+
+    def _record(self, pending, results):
+        with self._lock:
+            self.written += len(results)
+            for index, error in results.errors.items():
+                self.errors[index] = error
+                self._failed_payloads[index] = pending[index]
+        return results
+
+    def add(self, audit_type, user=None, data=None, object_type=None, object_id=None) -> int:
+        """Queue an audit event to be created, taking the same arguments as ``DataAPIClient.create_audit_event``.
+
+        Returns the event's index, by which any failure to create it is reported.
+        """
+        index, due = self._queue(audit_type, user, data, object_type, object_id)
+        self._start_flusher()
+        if due:
+            self.flush()
+        return index
+
+    def _start_flusher(self):
+        with self._lock:
+            if self._flusher is not None or self._closed:
+                return
+            self._flusher = threading.Thread(
+                target=self._flush_when_due, name="dmapiclient-audit-event-writer", daemon=True,
+            )
+        self._flusher.start()
+
+    def _flush_when_due(self):
+        while True:
+            with self._lock:
+                timeout = self._seconds_until_due()
+            self._wake.wait(max(timeout, 0))
+            self._wake.clear()
+            if self._closed:
+                return
+            self._flush_if_due()
+
+    def _flush_if_due(self):
+        """Send the events waiting if the oldest has waited ``flush_interval``, as the background flusher does"""
+        with self._lock:
+            due = bool(self._pending) and self._seconds_until_due() <= 0
+        if not due:
+            return BulkResult()
+        try:
+            return self.flush()
+        except Exception:
+            # there's no caller to raise to - the events are lost, as they would be if sending them had raised in add()
+            logger.exception("Failed to send audit events")
+            return BulkResult()
+
+    def close(self):
+        """Stop flushing in the background, once any batch it's sending has been sent, and send any events waiting"""
+        with self._lock:
+            self._closed = True
+            flusher = self._flusher
+        self._wake.set()
+        if flusher is not None:
+            flusher.join()
+        return self.flush()
+
+    def flush(self):
+        """Send every event waiting to be sent, returning the created events (and errors) by index"""
+        pending = self._take_pending()
+        if not pending:
+            return BulkResult()
+        results = self.client._fetch_concurrently(
+            lambda index: self._create(pending[index]), pending, max_workers=self.max_workers,
+        )
+        return self._record(pending, results)
+
+    @property
+    def failed_events(self) -> List[Tuple[int, dict, APIError]]:
+        """The index, request payload and error of every event which couldn't be created, e.g. to retry them"""
+        with self._lock:
+            return [(index, self._failed_payloads[index], error) for index, error in self.errors.items()]
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {
+                "added": self._added,
+                "written": self.written,
+                "failed": len(self.errors),
+                "pending": len(self._pending),
+            }
+
+
+class AsyncAuditEventWriter(AuditEventWriter):
+    """An ``AuditEventWriter`` for ``AsyncDataAPIClient``, whose ``add`` and ``flush`` must be awaited"""
+
+    def __enter__(self):
+        raise TypeError("{} must be used with 'async with'".format(self.__class__.__name__))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def add(self, audit_type, user=None, data=None, object_type=None, object_id=None) -> int:  # type: ignore
+        index, due = self._queue(audit_type, user, data, object_type, object_id)
+        self._start_flusher()
+        if due:
+            await self.flush()
+        return index
+
+    def _start_flusher(self):
+        if self._flusher is None and not self._closed:
+            # created here rather than in __init__, so that it belongs to the event loop the writer is used in
+            self._wake = asyncio.Event()  # type: ignore
+            self._flusher = asyncio.ensure_future(self._flush_when_due())  # type: ignore
+
+    async def _flush_when_due(self):  # type: ignore
+        while True:
+            with self._lock:
+                timeout = self._seconds_until_due()
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._closed:
+                return
+            await self._flush_if_due()
+
+    async def _flush_if_due(self):  # type: ignore
+        with self._lock:
+            due = bool(self._pending) and self._seconds_until_due() <= 0
+        if not due:
+            return BulkResult()
+        try:
+            return await self.flush()
+        except Exception:
+            logger.exception("Failed to send audit events")
+            return BulkResult()
+
+    async def close(self):  # type: ignore
+        self._closed = True
+        self._wake.set()
+        if self._flusher is not None:
+            await self._flusher
+        return await self.flush()
+
+    async def flush(self):
+        pending = self._take_pending()
+        if not pending:
+            return BulkResult()
+        results = await self.client._fetch_concurrently(
+            lambda index: self._create(pending[index]), pending, max_workers=self.max_workers,
+        )
+        return self._record(pending, results)
@@ -1,50 +1,206 @@
 from __future__ import absolute_import
+import contextvars
+import functools
 import logging
+import os
+import threading
 import time
-from typing import Optional
+import weakref
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import closing
+from http.cookiejar import DefaultCookiePolicy
+from typing import Hashable, Optional, Sequence, Tuple
 import requests
-from requests.adapters import HTTPAdapter
+from requests.adapters import HTTPAdapter, DEFAULT_POOLSIZE
 from requests.packages.urllib3.util.retry import Retry
 from requests.exceptions import ReadTimeout
-from urllib3.exceptions import ReadTimeoutError
+from urllib3.exceptions import MaxRetryError, ReadTimeoutError
 from flask import has_request_context, request, current_app
-import urllib.parse as urlparse
 
-from . import __version__
-from .errors import APIError, HTTPError, InvalidResponse
+from . import __version__, deadlines, pagination, streaming
+from .cache import ResponseCache, RevalidationCache
+from .circuitbreaker import CircuitBreakerPolicy, circuit_breaker_for
+from .concurrency import fetch_concurrently, propagate_context
+from .errors import APIError, CircuitOpenError, DeadlineExceeded, HTTPError, InvalidResponse
+from .hedging import Hedger, HedgingPolicy
 from .exceptions import ImproperlyConfigured
+from .jsoncodec import JSONCodec, default_codec
+from .metrics import MetricsRecorder
+from .projection import Projection
+from .records import record_type
+from .retries import RetryBudget, RetryPolicy, _DeadlineRetry
+from .routes import EndpointNormaliser, build_url, url_path
+from .singleflight import SingleFlight
+from .transfer import SUPPORTED_ACCEPT_ENCODING, TransferStats, gzip_body, response_wire_size
 
 
 logger = logging.getLogger(__name__)
 
+# every live client, so that pooled connections inherited across a fork can be dropped in the child
+_clients: "weakref.WeakSet[BaseAPIClient]" = weakref.WeakSet()
+
+
+def _reset_clients_after_fork():
+    for client in list(_clients):
+        client._reset_sessions()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_clients_after_fork)
+
+# set while a streaming iterator calls its find method, so that the find method's GET is handed back to it unsent
+_deferring_gets: "contextvars.ContextVar[bool]" = contextvars.ContextVar("dmapiclient_deferring_gets", default=False)
+
+
+class _DeferredGet(object):
+    def __init__(self, url):
+        self.url = url
+
 
 def make_iter_method(method_name, *model_names):
     """Make a page-concatenating iterator method from a find method
 
     :param method_name: The name of the find method to decorate
     :param model_names: The names of the possible models as they appear in the JSON response. The first found is used.
+
+    The resulting method accepts the find method's arguments, plus:
+
+    :param prefetch: Number of pages to fetch ahead in a background thread while the current page is consumed.
+                     Defaults to 0 - each page is only fetched once the previous one is exhausted.
+    :param parallel: Number of worker threads to fetch all remaining pages with at once, for endpoints whose responses
+                     include a ``links.last`` page. Cannot be combined with ``prefetch``.
+    :param ordered: Whether to yield ``parallel``-fetched pages in page order (the default), or as they arrive.
+    :param stream: Whether to decode models one at a time as each page's body arrives, rather than reading and decoding
+                   whole pages, so that memory use is bounded by the size of a model rather than a page. Useful for
+                   huge responses such as exports. Cannot be combined with ``prefetch`` or ``parallel``.
+    :param resume_from: A ``cursor`` from an earlier iterator made by the same method with the same arguments, to carry
+                        on from where that one got to. Cannot be combined with ``parallel``.
+    :param checkpoint: A checkpoint store, such as ``dmapiclient.checkpoints.FileCheckpointStore``, to save the cursor
+                       to as each page is finished with and resume from if it holds one. Cannot be combined with
+                       ``parallel``.
+
+    :param fields: For find methods which take ``fields``, the fields to keep of each model. Those projected
+                   client-side are projected as each model is yielded, so with ``stream`` only these fields are held.
+    :param records: Whether to yield compact ``dmapiclient.records`` records rather than dicts, for models which have
+                    a record type.
+
+    The iterator returned has a JSON-serialisable ``cursor``, for the position after the last model it yielded.
     """
     def iter_method(self, *args, **kwargs):
-        result = getattr(self, method_name)(*args, **kwargs)
-        # Filter the list of model names for those that are a key in the response, then take the first.
-        # Useful for backwards compatability if response keys might change
-        model_name = next((model_name for model_name in model_names if model_name in result), None)
-        # If there are no model names, return None to avoid raising StopIteration
-        if not model_name:
-            return
+        return self._iter_models(method_name, model_names, *args, **kwargs)
 
-        for model in result[model_name]:
-            yield model
+    return iter_method
 
-        while True:
-            if 'next' not in result.get('links', {}):
-                return
 
-            result = self._get(result['links']['next'])
-            for model in result[model_name]:
-                yield model
+def project_fields(*model_names):
+    """Give a find method a ``fields`` argument, to project the models in its response onto those fields client-side.
 
-    return iter_method
+    :param model_names: The names of the possible models as they appear in the JSON response. The first found is
+                        projected.
+    """
+    def decorator(find_method):
+        @functools.wraps(find_method)
+        def projecting_find_method(self, *args, fields: Optional[Sequence[str]] = None, **kwargs):
+            return self._project(find_method(self, *args, **kwargs), model_names, fields)
+
+        # so that iterators can project each model instead
+        projecting_find_method.projected_models = model_names  # type: ignore
+        return projecting_find_method
+
+    return decorator
+
+
+class _RequestLog(object):
+    """Logs each stage of a request, only building log records for the levels the logger has enabled"""
+    enabled = True
+
+    @staticmethod
+    def _extra(child_span_id, extra):
+        if child_span_id is not None:
+            extra["childSpanId"] = child_span_id
+        return extra
+
+    def started(self, method, url, child_span_id):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.log(
+                logging.DEBUG,
+                "API request {method} {url}",
+                extra=self._extra(child_span_id, {
+                    'method': method,
+                    'url': url,
+                }),
+            )
+
+    def dispatched(self, method, url, elapsed_time, child_span_id):
+        if logger.isEnabledFor(logging.INFO):
+            logger.log(
+                logging.INFO,
+                "API {api_method} request on {api_url} dispatched but ignoring response",
+                extra=self._extra(child_span_id, {
+                    'api_method': method,
+                    'api_url': url,
+                    'api_time': elapsed_time,
+                    'api_time_incomplete': True,
+                }),
+            )
+
+    def failed(self, method, url, api_error, exc, elapsed_time, child_span_id):
+        level = logging.INFO if api_error.status_code == 404 else logging.WARNING
+        if logger.isEnabledFor(level):
+            logger.log(
+                level,
+                "API {api_method} request on {api_url} failed with {api_status} '{api_error}'",
+                extra=self._extra(child_span_id, {
+                    'api_method': method,
+                    'api_url': url,
+                    'api_status': api_error.status_code,
+                    'api_error': '{} raised {}'.format(api_error.message, str(exc)),
+                    'api_time': elapsed_time,
+                }),
+            )
+
+    def finished(self, method, url, status_code, elapsed_time, child_span_id):
+        if logger.isEnabledFor(logging.INFO):
+            logger.log(
+                logging.INFO,
+                "API {api_method} request on {api_url} finished in {api_time}",
+                extra=self._extra(child_span_id, {
+                    'api_method': method,
+                    'api_url': url,
+                    'api_status': status_code,
+                    'api_time': elapsed_time,
+                }),
+            )
+
+
+class _QuietRequestLog(_RequestLog):
+    """Logs nothing at all"""
+    enabled = False
+
+    def started(self, method, url, child_span_id):
+        pass
+
+    def dispatched(self, method, url, elapsed_time, child_span_id):
+        pass
+
+    def failed(self, method, url, api_error, exc, elapsed_time, child_span_id):
+        pass
+
+    def finished(self, method, url, status_code, elapsed_time, child_span_id):
+        pass
+
+
+_request_log = _RequestLog()
+_quiet_request_log = _QuietRequestLog()
+
+
+class _RequestHeaders(requests.structures.CaseInsensitiveDict):
+    """A ``CaseInsensitiveDict`` which can be copied without lower-casing every header name again"""
+
+    def copy(self):
+        headers = self.__class__.__new__(self.__class__)
+        headers._store = self._store.copy()
+        return headers
 
 
 class classproperty(object):
@@ -60,6 +216,16 @@ class BaseAPIClient(object):
     _RETRIES_BACKOFF_FACTOR = 0.3
     #  Respose status codes to retry on.
     _RETRIES_FORCE_STATUS_CODES = (500, 502, 503, 504)
+    _POOL_CONNECTIONS = DEFAULT_POOLSIZE
+    _POOL_MAXSIZE = DEFAULT_POOLSIZE
+    # bytes of a streamed response body to read from the socket at a time
+    _STREAM_CHUNK_SIZE = 64 * 1024
+    # trading a little speed for size - request bodies are only compressed when they're large
+    _REQUEST_COMPRESSION_LEVEL = 6
+
+    # The endpoints this client requests, for grouping metrics by. Paths are matched against these in order - see
+    # EndpointNormaliser.
+    ENDPOINT_TEMPLATES: Tuple[str, ...] = ("/_status",)
 
     # the following are really intended to be read-only from outside the class, hence properties
     @classproperty
@@ -90,6 +256,71 @@ class BaseAPIClient(object):
     def timeout(self):
         return self._timeout
 
+    @property
+    def pool_connections(self):
+        return self._pool_connections
+
+    @property
+    def pool_maxsize(self):
+        return self._pool_maxsize
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @property
+    def revalidation_cache(self):
+        return self._revalidation_cache
+
+    @property
+    def codec(self):
+        return self._codec
+
+    @property
+    def compress_requests_over(self):
+        return self._compress_requests_over
+
+    @property
+    def transfer_stats(self):
+        return self._transfer_stats
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    @property
+    def quiet(self):
+        return self._quiet
+
+    @property
+    def retry_policy(self):
+        return self._retry_policy
+
+    @property
+    def retry_budget(self):
+        return self._retry_budget
+
+    @property
+    def circuit_breaker(self):
+        """The circuit breaker shared by clients of this client's base url, if this client uses one"""
+        if self._circuit_breaker_policy is None or not self._base_url:
+            return None
+        # looked up once for each base url the client is used with (init_app may change it), rather than on every
+        # request, so that a policy mismatch is only warned about once
+        base_url, circuit_breaker = self._circuit_breaker_cache
+        if circuit_breaker is None or base_url != self._base_url:
+            circuit_breaker = circuit_breaker_for(self._base_url, self._circuit_breaker_policy)
+            self._circuit_breaker_cache = (self._base_url, circuit_breaker)
+        return circuit_breaker
+
+    @property
+    def hedger(self):
+        return self._hedger
+
+    @property
+    def single_flight(self):
+        return self._single_flight
+
     @property
     def nowait_timeout(self):
         read_timeout = 1.e-3
@@ -98,12 +329,78 @@ class BaseAPIClient(object):
         except (TypeError, LookupError):
             return self._timeout, read_timeout
 
-    def __init__(self, base_url=None, auth_token=None, enabled=True, timeout=(15, 45,), *, user=None):
+    def __init__(
+        self,
+        base_url=None,
+        auth_token=None,
+        enabled=True,
+        timeout=(15, 45,),
+        *,
+        user=None,
+        pool_connections: Optional[int] = None,
+        pool_maxsize: Optional[int] = None,
+        cache: Optional[ResponseCache] = None,
+        revalidation_cache: Optional[RevalidationCache] = None,
+        codec: Optional[JSONCodec] = None,
+        compress_requests_over: Optional[int] = None,
+        transfer_stats: Optional[TransferStats] = None,
+        metrics: Optional[MetricsRecorder] = None,
+        quiet: bool = False,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreakerPolicy] = None,
+        hedging: Optional[HedgingPolicy] = None,
+        single_flight: Optional[SingleFlight] = None,
+    ):
         self._base_url = base_url
         self._auth_token = auth_token
         self._user = user
         self._enabled = enabled
         self._timeout = timeout
+        self._pool_connections = self._POOL_CONNECTIONS if pool_connections is None else pool_connections
+        self._pool_maxsize = self._POOL_MAXSIZE if pool_maxsize is None else pool_maxsize
+        self._cache = cache
+        self._revalidation_cache = revalidation_cache
+        self._codec = default_codec() if codec is None else codec
+        self._compress_requests_over = compress_requests_over
+        self._transfer_stats = TransferStats() if transfer_stats is None else transfer_stats
+        self._metrics = metrics
+        self._quiet = quiet
+        self._request_log = _quiet_request_log if quiet else _request_log
+        self._static_headers_cache = (None, None)
+        self._retry_policy = retry_policy
+        self._retry_budget: Optional[RetryBudget] = None if retry_policy is None else retry_policy.new_budget()
+        self._circuit_breaker_policy = circuit_breaker
+        self._circuit_breaker_cache = (None, None)
+        self._hedger = None if hedging is None else Hedger(hedging)
+        self._single_flight = single_flight
+        self._reset_sessions()
+        _clients.add(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close any pooled connections held by this client.
+
+        The client remains usable afterwards - a new pool will be created on its next request.
+        """
+        with self._sessions_lock:
+            sessions, self._sessions = self._sessions, {}
+            hedging_executor, self._hedging_executor = self._hedging_executor, None
+        for session in sessions.values():
+            session.close()
+        if hedging_executor is not None:
+            hedging_executor[0].shutdown(wait=False)
+
+    def _reset_sessions(self):
+        # deliberately not closing any existing sessions: after a fork their sockets are still in use by the parent
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+        # nor shutting down the executor - its threads don't exist in a forked child
+        self._hedging_executor = None
 
     def _getuser(self, user=None):
         if user is None and self._user is None:
@@ -150,37 +447,74 @@ class BaseAPIClient(object):
         data = dict(data, updated_by=user)
         return self._delete(url, data, client_wait_for_response=client_wait_for_response)
 
+    def _fetch_concurrently(self, fetch, keys, *, max_workers: Optional[int] = None):
+        # by default use no more threads than there are pooled connections to share between them
+        return fetch_concurrently(fetch, keys, max_workers or self._pool_maxsize)
+
     def _build_url(self, url, params):
         if not self._base_url:
             raise ImproperlyConfigured("{} has no URL configured".format(self.__class__.__name__))
 
-        url = urlparse.urljoin(self._base_url, url)
-
-        # Make sure we always preserve the base_url host and scheme
-        # eg when using next link from the API response we need to keep the scheme
-        # so that app requests don't try to switch from HTTP to HTTPS
-        url = urlparse.urlparse(url)
-        base_url = urlparse.urlparse(self._base_url)
-        url = url._replace(netloc=base_url.netloc, scheme=base_url.scheme).geturl()
+        return build_url(self._base_url, url, params)
 
-        r = requests.PreparedRequest()
-        r.prepare_url(url=url, params=params)
-
-        return r.url
+    def _requests_retry_session(
+        self,
+        *,
+        retry_read_timeouts: bool = True,
+        retry_policy: Optional[RetryPolicy] = None,
+        deadline: bool = False,
+    ):
+        """Return this client's long-lived pooled session for the given retry behaviour, creating it if needed"""
+        key: Hashable
+        if retry_policy is not None:
+            # policies' retries always respect any deadline
+            key = (retry_read_timeouts, retry_policy)
+        elif deadline:
+            key = (retry_read_timeouts, None)
+        else:
+            key = retry_read_timeouts
+        session = self._sessions.get(key)
+        if session is None:
+            with self._sessions_lock:
+                session = self._sessions.get(key)
+                if session is None:
+                    session = self._sessions[key] = self._new_requests_retry_session(
+                        retry_read_timeouts=retry_read_timeouts,
+                        retry_policy=retry_policy,
+                        deadline=deadline,
+                    )
+        return session
 
-    def _requests_retry_session(self, *, retry_read_timeouts: bool = True):
+    def _new_requests_retry_session(
+        self,
+        *,
+        retry_read_timeouts: bool = True,
+        retry_policy: Optional[RetryPolicy] = None,
+        deadline: bool = False,
+    ):
         session = requests.Session()
-        # TODO: remove ignore once requests' typeshed entry is correct (currently missing status and raise_on_status).
-        retry = Retry(  # type: ignore
-            total=self._RETRIES,
-            read=self._RETRIES if retry_read_timeouts else 0,
-            connect=self._RETRIES,
-            status=self._RETRIES,
-            backoff_factor=self._RETRIES_BACKOFF_FACTOR,
-            status_forcelist=self._RETRIES_FORCE_STATUS_CODES,
-            raise_on_status=False,
+        # the session is shared by every caller of the client, so cookies set by one response mustn't be sent with
+        # the others' requests
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        if retry_policy is not None:
+            retry = retry_policy.make_retry(self._retry_budget, retry_read_timeouts=retry_read_timeouts)
+        else:
+            # TODO: remove ignore once requests' typeshed entry is correct (currently missing status and
+            # raise_on_status).
+            retry = (_DeadlineRetry if deadline else Retry)(  # type: ignore
+                total=self._RETRIES,
+                read=self._RETRIES if retry_read_timeouts else 0,
+                connect=self._RETRIES,
+                status=self._RETRIES,
+                backoff_factor=self._RETRIES_BACKOFF_FACTOR,
+                status_forcelist=self._RETRIES_FORCE_STATUS_CODES,
+                raise_on_status=False,
+            )
+        adapter = HTTPAdapter(
+            pool_connections=self._pool_connections,
+            pool_maxsize=self._pool_maxsize,
+            max_retries=retry,
         )
-        adapter = HTTPAdapter(max_retries=retry)
         session.mount('http://', adapter)
         session.mount('https://', adapter)
         return session
@@ -202,33 +536,198 @@ class BaseAPIClient(object):
 
             yield exc
 
-    def _request(self, method, url, data=None, params=None, *, client_wait_for_response: bool = True):
-        if not self._enabled:
-            return None
+    def _project(self, result, model_names, fields):
+        if not fields or not isinstance(result, dict):
+            # nothing to project, or a deferred GET for a streaming iterator to project, or the client is disabled
+            return result
+        model_name = next((model_name for model_name in model_names if model_name in result), None)
+        if model_name is None:
+            return result
+        projection = Projection(fields)
+        models = result[model_name]
+        # a copy, so as not to change a response that's been cached
+        return dict(result, **{
+            model_name: [projection(model) for model in models] if isinstance(models, list) else projection(models)
+        })
 
-        url = self._build_url(url, params)
-        headers = {
-            "Content-type": "application/json",
-            "Authorization": "Bearer {}".format(self._auth_token),
-            "User-agent": "DM-API-Client/{}".format(__version__),
-        }
-        if has_request_context():
-            # Disable type checking for attributes added by RequestIdRequestMixin - mypy doesn't know about it.
-            if callable(getattr(request, "get_onwards_request_headers", None)):
-                headers.update(request.get_onwards_request_headers())  # type: ignore
-            elif getattr(request, "request_id", None) and current_app.config.get("DM_REQUEST_ID_HEADER"):
-                # support old .request_id attr for compatibility
-                headers[current_app.config["DM_REQUEST_ID_HEADER"]] = request.request_id  # type: ignore
-
-        # not using CaseInsensitiveDict as our header dict initially as technically .update()'s behaviour is undefined
-        # for it, but past a certain point we want to be able to know we've resolved what our final header value is
-        # going to be for any certain header name
-        ci_headers = requests.structures.CaseInsensitiveDict(headers)
-        # just in case anyone misses the point and thinks adding anything more to `headers` will do anything beyond here
-        del headers
+    def _iter_models(
+        self,
+        method_name,
+        model_names,
+        *args,
+        prefetch: int = 0,
+        parallel: int = 0,
+        ordered: bool = True,
+        stream: bool = False,
+        resume_from: Optional[dict] = None,
+        checkpoint=None,
+        records: bool = False,
+        **kwargs
+    ):
+        projection = None
+        if kwargs.get("fields") and getattr(getattr(self, method_name), "projected_models", None):
+            # projected as each model is yielded rather than by the find method, so that later pages are too
+            projection = Projection(kwargs.pop("fields"))
+
+        if prefetch and parallel:
+            raise ValueError("prefetch and parallel cannot be combined")
+        if stream and (prefetch or parallel):
+            raise ValueError("stream cannot be combined with prefetch or parallel")
+
+        if resume_from is None and checkpoint is not None:
+            resume_from = checkpoint.load()
+        if parallel:
+            if resume_from is not None or checkpoint is not None:
+                raise ValueError("parallel iterations cannot be resumed")
+            position = None
+        elif resume_from is not None:
+            if resume_from.get("method") != method_name:
+                raise ValueError("cursor is from {}, not {}".format(resume_from.get("method"), method_name))
+            position = pagination.Position(resume_from["url"], resume_from["offset"])
+        else:
+            position = pagination.Position()
+
+        if stream:
+            models = self._stream_models(position, method_name, model_names, *args, **kwargs)
+        else:
+            models = self._page_models(
+                position, method_name, model_names, *args, prefetch=prefetch, parallel=parallel, ordered=ordered,
+                **kwargs
+            )
+        return pagination.ModelIterator(
+            method_name,
+            models,
+            position,
+            checkpoint,
+            record_type=record_type(method_name, model_names) if records else None,
+            projection=projection,
+        )
+
+    def _page_models(self, position, method_name, model_names, *args, prefetch, parallel, ordered, **kwargs):
+        if position is None or position.url is None:
+            result = getattr(self, method_name)(*args, **kwargs)
+        else:
+            result = self._get(position.url)
+        # Filter the list of model names for those that are a key in the response, then take the first.
+        # Useful for backwards compatability if response keys might change
+        model_name = next((model_name for model_name in model_names if model_name in result), None)
+        # If there are no model names, return None to avoid raising StopIteration
+        if not model_name:
+            return
+
+        if parallel:
+            pages = pagination.fan_out_pages(result, self._get, parallel, ordered=ordered)
+        elif prefetch:
+            pages = pagination.prefetch_pages(result, self._get, prefetch)
+        else:
+            pages = pagination.follow_pages(result, self._get)
+
+        with closing(pages):
+            if position is None:
+                for page in pages:
+                    yield from page[model_name]
+                return
 
+            skip = position.offset
+            for page in pages:
+                models = page[model_name]
+                next_url = page.get('links', {}).get('next')
+                for index in range(skip, len(models)):
+                    if next_url and index == len(models) - 1:
+                        # done with this page once its last model has been consumed
+                        position.url, position.offset = next_url, 0
+                    else:
+                        position.offset = index + 1
+                    yield models[index]
+                skip = 0
+                if next_url:
+                    position.url, position.offset = next_url, 0
+
+    def _stream_models(self, position, method_name, model_names, *args, **kwargs):
+        if position.url is None:
+            token = _deferring_gets.set(True)
+            try:
+                deferred = getattr(self, method_name)(*args, **kwargs)
+            finally:
+                _deferring_gets.reset(token)
+            if deferred is None:
+                # client is disabled
+                return
+            if not isinstance(deferred, _DeferredGet):
+                raise TypeError("{} does not return a single GET response, so can't be streamed".format(method_name))
+            url = deferred.url
+        else:
+            url = self._build_url(position.url, None)
+
+        skip = position.offset
+        while url is not None:
+            start_time = time.perf_counter()
+            response = self._send_request("GET", url, stream=True)
+            with closing(response):
+                models = streaming.JSONArrayStream(
+                    response.iter_content(chunk_size=self._STREAM_CHUNK_SIZE),
+                    model_names,
+                )
+                try:
+                    for index, model in enumerate(models):
+                        if index >= skip:
+                            position.offset = index + 1
+                            yield model
+                except ValueError:
+                    raise InvalidResponse(response, message="No JSON object could be decoded", codec=self._codec)
+                self._record_response(
+                    "GET",
+                    url,
+                    time.perf_counter() - start_time,
+                    self._count_retries(response),
+                    None,
+                    0,
+                    response,
+                    models.bytes_read,
+                )
+
+            skip = 0
+            next_url = models.members.get("links", {}).get("next")
+            if next_url:
+                position.url, position.offset = next_url, 0
+                url = self._build_url(next_url, None)
+            else:
+                url = None
+
+    def _static_headers(self):
+        """The headers sent with every request, built once for each auth token the client is used with"""
+        auth_token, static_headers = self._static_headers_cache
+        if static_headers is None or auth_token != self._auth_token:
+            static_headers = _RequestHeaders({
+                "Content-type": "application/json",
+                "Authorization": "Bearer {}".format(self._auth_token),
+                "User-agent": "DM-API-Client/{}".format(__version__),
+                "Accept-Encoding": SUPPORTED_ACCEPT_ENCODING,
+            })
+            self._static_headers_cache = (self._auth_token, static_headers)
+        return static_headers
+
+    def _build_headers(self):
+        """Build the outgoing headers for a request"""
+        ci_headers = self._static_headers().copy()
+        if not has_request_context():
+            return ci_headers
+
+        # Disable type checking for attributes added by RequestIdRequestMixin - mypy doesn't know about it.
+        if callable(getattr(request, "get_onwards_request_headers", None)):
+            # onwards headers are applied in order, so where several differ only in case the last of them wins
+            ci_headers.update(request.get_onwards_request_headers())  # type: ignore
+        elif getattr(request, "request_id", None) and current_app.config.get("DM_REQUEST_ID_HEADER"):
+            # support old .request_id attr for compatibility
+            ci_headers[current_app.config["DM_REQUEST_ID_HEADER"]] = request.request_id  # type: ignore
+
+        return ci_headers
+
+    @staticmethod
+    def _child_span_id(ci_headers):
+        """Return the span id carried by a request's outgoing headers, if any"""
         # determine our final outgoing span id - find the first of DM_SPAN_ID_HEADERS which is set to something truthy
-        child_span_id = next(
+        return next(
             (
                 ci_headers[header_name] for header_name in (current_app.config.get("DM_SPAN_ID_HEADERS") or ())
                 if ci_headers.get(header_name)
@@ -236,28 +735,155 @@ class BaseAPIClient(object):
             None,
         ) if has_request_context() else None
 
-        common_log_extra = {
-            **({"childSpanId": child_span_id} if child_span_id is not None else {}),
-        }
-
-        logger.log(
-            logging.DEBUG,
-            "API request {method} {url}",
-            extra={
-                **common_log_extra,
-                'method': method,
-                'url': url,
-            },
+    def _check_circuit(self):
+        """Return the circuit breaker to record this request's outcome with (if any), raising ``CircuitOpenError`` if
+        it shouldn't be sent
+        """
+        circuit_breaker = self.circuit_breaker
+        if circuit_breaker is not None and not circuit_breaker.allow_request():
+            raise CircuitOpenError(message="Not sending request as {} has been failing - retrying in {:.1f}s".format(
+                self._base_url,
+                circuit_breaker.retry_in,
+            ))
+        return circuit_breaker
+
+    def _record_circuit_failure(self, circuit_breaker, api_error):
+        if circuit_breaker is None:
+            return
+        if isinstance(api_error, DeadlineExceeded):
+            # given up on, rather than failed
+            circuit_breaker.record_unknown()
+        elif circuit_breaker.policy.is_failure(api_error):
+            circuit_breaker.record_failure()
+        else:
+            circuit_breaker.record_success()
+
+    def _request_timeout(self, client_wait_for_response):
+        """Return the timeout to send a request with, cut to the time left before its deadline (if any), and that time
+        left. Raises ``DeadlineExceeded`` if the deadline has already passed.
+        """
+        timeout = self.timeout if client_wait_for_response else self.nowait_timeout
+        time_left = deadlines.remaining()
+        if time_left is None:
+            return timeout, None
+        if time_left <= 0:
+            raise DeadlineExceeded(message="Not sending request as its deadline has passed")
+        return deadlines.shrink_timeout(timeout, time_left), time_left
+
+    def _deadline_error(self, exc, api_error):
+        """Return ``DeadlineExceeded`` in place of ``api_error`` if a request failed because its deadline passed"""
+        time_left = deadlines.remaining()
+        if time_left is not None and time_left > 0 and not any(
+            getattr(cause, "_dmapiclient_deadline_exceeded", False) for cause in self._iter_exceptions_by_cause(exc)
+        ):
+            return api_error
+        return DeadlineExceeded(
+            api_error.response,
+            "Request didn't succeed before its deadline: {}".format(api_error.message),
+            codec=self._codec,
         )
 
+    def _retry_policy_for(self, url):
+        if self._retry_policy is None:
+            return None
+        return self._retry_policy.for_path(url_path(url, self._base_url))
+
+    def _cache_lookup(self, method, url):
+        """Return any cached body for this request, along with the ttl to cache its response for (if cacheable)"""
+        if self._cache is None or method != "GET":
+            return None, None
+
+        cache_ttl = self._cache.ttl_for(url_path(url, self._base_url))
+        if cache_ttl is None:
+            return None, None
+        return self._cache.get((self._auth_token, url)), cache_ttl
+
+    def _cache_store(self, url, body, cache_ttl):
+        self._cache.set((self._auth_token, url), url_path(url, self._base_url), body, cache_ttl)
+
+    def _cache_invalidate(self, method, url):
+        if self._cache is not None and method != "GET":
+            self._cache.invalidate(url_path(url, self._base_url))
+
+    def _revalidation_lookup(self, method, url):
+        """Return the key to store this request's response under for revalidation, along with any previous response
+        """
+        if (
+            self._revalidation_cache is None
+            or method != "GET"
+            or not self._revalidation_cache.handles(url_path(url, self._base_url))
+        ):
+            return None, None
+
+        key = (self._auth_token, url)
+        return key, self._revalidation_cache.get(key)
+
+    def _response_body(self, response, revalidation_key, validated):
+        """Return the body of a successful response, which may be a previously-stored one if it was not modified"""
+        if revalidation_key is None:
+            return response.content
+        if response.status_code == 304 and validated is not None:
+            self._revalidation_cache.record_not_modified(validated)
+            return validated.body
+
+        self._revalidation_cache.store(
+            revalidation_key,
+            response.content,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
+        return response.content
+
+    def _encode_request_body(self, data):
+        """Return the encoded body to send for ``data``, along with any headers it needs and its uncompressed size"""
+        if data is None:
+            return None, {}, 0
+
+        body = self._codec.dumps(data)
+        if self._compress_requests_over is not None and len(body) >= self._compress_requests_over:
+            return gzip_body(body, self._REQUEST_COMPRESSION_LEVEL), {"Content-Encoding": "gzip"}, len(body)
+        return body, {}, len(body)
+
+    def _send_request(
+        self,
+        method,
+        url,
+        data=None,
+        *,
+        client_wait_for_response: bool = True,
+        extra_headers=None,
+        stream: bool = False,
+    ):
+        """Send a request to a fully-built url, returning the successful response.
+
+        Returns None if ``client_wait_for_response`` is false and the response didn't arrive in time. If ``stream`` is
+        true the body is left unread, and the caller must close the response once done with it.
+        """
+        timeout, time_left = self._request_timeout(client_wait_for_response)
+        circuit_breaker = self._check_circuit()
+        ci_headers = self._build_headers()
+        if extra_headers:
+            ci_headers.update(extra_headers)
+        body, body_headers, body_size = self._encode_request_body(data)
+        ci_headers.update(body_headers)
+
+        request_log = self._request_log
+        child_span_id = self._child_span_id(ci_headers) if request_log.enabled else None
+        request_log.started(method, url, child_span_id)
+
         start_time = time.perf_counter()
         try:
-            response = self._requests_retry_session(retry_read_timeouts=client_wait_for_response).request(
+            response = self._requests_retry_session(
+                retry_read_timeouts=client_wait_for_response,
+                retry_policy=self._retry_policy_for(url),
+                deadline=time_left is not None,
+            ).request(
                 method,
                 url,
                 headers=ci_headers,
-                json=data,
-                timeout=self.timeout if client_wait_for_response else self.nowait_timeout,
+                data=body,
+                timeout=timeout,
+                stream=stream,
             )
             response.raise_for_status()
         except requests.RequestException as e:
@@ -268,58 +894,257 @@ class BaseAPIClient(object):
             if (not client_wait_for_response) and any(
                 isinstance(exc, (ReadTimeout, ReadTimeoutError)) for exc in self._iter_exceptions_by_cause(e)
             ):
-                logger.log(
-                    logging.INFO,
-                    "API {api_method} request on {api_url} dispatched but ignoring response",
-                    extra={
-                        **common_log_extra,
-                        'api_method': method,
-                        'api_url': url,
-                        'api_time': elapsed_time,
-                        'api_time_incomplete': True,
-                    },
-                )
+                request_log.dispatched(method, url, elapsed_time, child_span_id)
+                if circuit_breaker is not None:
+                    circuit_breaker.record_unknown()
                 return None
 
-            api_error = HTTPError.create(e)
-            logger.log(
-                logging.INFO if api_error.status_code == 404 else logging.WARNING,
-                "API {api_method} request on {api_url} failed with {api_status} '{api_error}'",
-                extra={
-                    **common_log_extra,
-                    'api_method': method,
-                    'api_url': url,
-                    'api_status': api_error.status_code,
-                    'api_error': '{} raised {}'.format(api_error.message, str(e)),
-                    'api_time': elapsed_time,
-                },
-            )
+            api_error = HTTPError.create(e, codec=self._codec)
+            if time_left is not None:
+                api_error = self._deadline_error(e, api_error)
+            request_log.failed(method, url, api_error, e, elapsed_time, child_span_id)
+            self._record_circuit_failure(circuit_breaker, api_error)
+            self._record_failure(method, url, api_error, e, elapsed_time, body)
             raise api_error
         else:
             elapsed_time = time.perf_counter() - start_time
-            logger.log(
-                logging.INFO,
-                "API {api_method} request on {api_url} finished in {api_time}",
-                extra={
-                    **common_log_extra,
-                    'api_method': method,
-                    'api_url': url,
-                    'api_status': response.status_code,
-                    'api_time': elapsed_time,
-                },
+            request_log.finished(method, url, response.status_code, elapsed_time, child_span_id)
+            if self._retry_budget is not None:
+                self._retry_budget.record_success()
+            if circuit_breaker is not None:
+                circuit_breaker.record_success()
+
+        if not stream:
+            # streamed responses are recorded once their body has been read
+            self._record_response(
+                method,
+                url,
+                elapsed_time,
+                self._count_retries(response),
+                body,
+                body_size,
+                response,
+                len(response.content),
             )
+        return response
+
+    @classmethod
+    def _endpoint_normaliser(cls):
+        # built once per class, as each may have its own ENDPOINT_TEMPLATES
+        normaliser = cls.__dict__.get("_endpoint_normaliser_instance")
+        if normaliser is None:
+            normaliser = EndpointNormaliser(cls.ENDPOINT_TEMPLATES)
+            setattr(cls, "_endpoint_normaliser_instance", normaliser)
+        return normaliser
+
+    def _endpoint(self, url):
+        """Return the endpoint template ``url`` was made from, e.g. ``/services/{service_id}``"""
+        return self._endpoint_normaliser().normalise(url_path(url, self._base_url))
+
+    def _count_retries(self, response, exc=None):
+        """Return how many times urllib3 retried the request behind ``response`` or ``exc``"""
+        retries = getattr(getattr(response, "raw", None), "retries", None)
+        if retries is not None:
+            return len(retries.history)
+        if exc is not None:
+            max_retry_error = next(
+                (cause for cause in self._iter_exceptions_by_cause(exc) if isinstance(cause, MaxRetryError)),
+                None,
+            )
+            if max_retry_error is not None:
+                # retry policies record how many retries were made before giving up
+                return getattr(max_retry_error, "_dmapiclient_retries", self._RETRIES)
+        return 0
+
+    def _record_metrics(self, method, url, status_code, elapsed_time, retries, request_wire_size, response_size):
+        if self._metrics is None:
+            return
+        self._metrics.record_request(
+            self.__class__.__name__,
+            method,
+            self._endpoint(url),
+            status_code,
+            elapsed_time,
+            retries,
+            request_wire_size,
+            response_size,
+        )
+
+    def _record_response(self, method, url, elapsed_time, retries, body, body_size, response, response_size):
+        """Record a successful request, whose (uncompressed) response body was ``response_size`` bytes"""
+        request_wire_size = len(body) if body is not None else 0
+        wire_size = response_wire_size(response)
+        self._transfer_stats.record(method, url, body_size, request_wire_size, response_size, wire_size)
+        self._record_metrics(method, url, response.status_code, elapsed_time, retries, request_wire_size, wire_size)
+
+    def _record_failure(self, method, url, api_error, exc, elapsed_time, body):
+        if self._metrics is None:
+            return
+        response = getattr(exc, "response", None)
+        self._record_metrics(
+            method,
+            url,
+            api_error.status_code,
+            elapsed_time,
+            self._count_retries(response, exc),
+            len(body) if body is not None else 0,
+            response_wire_size(response) if response is not None else 0,
+        )
+
+    def _decode_response(self, response, body):
         try:
-            return response.json()
+            return self._codec.loads(body)
         except ValueError:
             raise InvalidResponse(response,
-                                  message="No JSON object could be decoded")
+                                  message="No JSON object could be decoded",
+                                  codec=self._codec)
+
+    def _request(self, method, url, data=None, params=None, *, client_wait_for_response: bool = True):
+        if not self._enabled:
+            return None
+
+        url = self._build_url(url, params)
+        if method == "GET" and _deferring_gets.get():
+            return _DeferredGet(url)
+
+        cached_body, cache_ttl = self._cache_lookup(method, url)
+        if cached_body is not None:
+            return self._codec.loads(cached_body)
+
+        if self._single_flight is not None and method == "GET" and client_wait_for_response:
+            response, body = self._single_flight.do(
+                (self._auth_token, url),
+                lambda: self._fetch_body(method, url, data),
+                name=self._endpoint(url),
+            )
+        else:
+            response, body = self._fetch_body(method, url, data, client_wait_for_response=client_wait_for_response)
+            if response is None:
+                return None
+
+        result = self._decode_response(response, body)
+        if cache_ttl is not None:
+            self._cache_store(url, body, cache_ttl)
+        return result
+
+    def _fetch_body(self, method, url, data=None, *, client_wait_for_response: bool = True):
+        """Send a request, returning its response and body (or ``(None, None)`` if not waiting for the response)"""
+        revalidation_key, validated = self._revalidation_lookup(method, url)
+
+        try:
+            response = self._send_hedgeable_request(
+                method,
+                url,
+                data,
+                client_wait_for_response=client_wait_for_response,
+                extra_headers=validated.conditional_headers if validated is not None else None,
+            )
+        finally:
+            self._cache_invalidate(method, url)
+
+        if response is None:
+            return None, None
+
+        return response, self._response_body(response, revalidation_key, validated)
+
+    def _hedging_endpoint(self, method, url, client_wait_for_response):
+        """Return the endpoint to time this request against for hedging, or None if it can't be hedged"""
+        if self._hedger is None or not client_wait_for_response:
+            return None
+        path = url_path(url, self._base_url)
+        if not self._hedger.policy.handles(method, path):
+            return None
+        return self._endpoint_normaliser().normalise(path)
+
+    def _get_hedging_executor(self):
+        """Return the executor to send hedgeable requests on, and a semaphore of its free threads"""
+        hedging_executor = self._hedging_executor
+        if hedging_executor is None:
+            with self._sessions_lock:
+                hedging_executor = self._hedging_executor
+                if hedging_executor is None:
+                    # each hedged request occupies up to two threads
+                    max_workers = self._hedger.policy.max_workers or 2 * self._pool_maxsize
+                    hedging_executor = self._hedging_executor = (
+                        ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dmapiclient-hedge"),
+                        threading.BoundedSemaphore(max_workers),
+                    )
+        return hedging_executor
+
+    @staticmethod
+    def _submit_to_free_thread(executor, free_threads, fn):
+        """Run ``fn`` on ``executor``, having acquired one of its ``free_threads``, returning its future"""
+        future = executor.submit(propagate_context(fn))
+        future.add_done_callback(lambda future: free_threads.release())
+        return future
+
+    def _send_hedgeable_request(self, method, url, data=None, *, client_wait_for_response=True, extra_headers=None):
+        """Send a request as ``_send_request`` does, sending a second copy of it if it's slow and this client hedges
+        requests - see ``HedgingPolicy``
+        """
+        endpoint = self._hedging_endpoint(method, url, client_wait_for_response)
+        if endpoint is None:
+            return self._send_request(
+                method,
+                url,
+                data,
+                client_wait_for_response=client_wait_for_response,
+                extra_headers=extra_headers,
+            )
+
+        def send():
+            start_time = time.perf_counter()
+            response = self._send_request(method, url, data, extra_headers=extra_headers)
+            return response, time.perf_counter() - start_time
+
+        def record_latency(future):
+            if not future.cancelled() and future.exception() is None:
+                self._hedger.record_latency(endpoint, future.result()[1])
+
+        hedge_delay = self._hedger.delay_for(endpoint)
+        executor, free_threads = self._get_hedging_executor() if hedge_delay is not None else (None, None)
+        # requests are never queued for a thread, so that time spent waiting for one isn't counted towards the hedge
+        # delay - if every thread is busy, the request is sent on the caller's thread instead, and not hedged
+        if free_threads is None or not free_threads.acquire(blocking=False):
+            response, elapsed_time = send()
+            self._hedger.record_latency(endpoint, elapsed_time)
+            return response
+
+        # only the first attempt is timed, as hedges are only sent when it's slow
+        first_attempt = self._submit_to_free_thread(executor, free_threads, send)
+        first_attempt.add_done_callback(record_latency)
+        done, _ = wait((first_attempt,), timeout=hedge_delay)
+        if done or not free_threads.acquire(blocking=False):
+            return first_attempt.result()[0]
+        if not self._hedger.try_hedge():
+            free_threads.release()
+            return first_attempt.result()[0]
+
+        return self._race(first_attempt, self._submit_to_free_thread(executor, free_threads, send))
+
+    def _race(self, first_attempt, hedge):
+        """Return the response of whichever of a request and its hedge succeeds first"""
+        pending = {first_attempt, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = next((future for future in done if future.exception() is None), None)
+            if winner is not None:
+                if winner is hedge:
+                    self._hedger.record_hedge_won()
+                for loser in pending:
+                    # only stops the loser if it hasn't started - otherwise its response is just ignored
+                    loser.cancel()
+                return winner.result()[0]
+
+        # both failed
+        return first_attempt.result()[0]
 
     def get_status(self):
         try:
             return self._get("{}/_status".format(self._base_url))
         except APIError as e:
             try:
-                return e.response.json()
+                return self._codec.loads(e.response.content)
             except (ValueError, AttributeError):
                 return {
                     "status": "error",
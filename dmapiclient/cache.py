@@ -0,0 +1,235 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from .routes import EndpointTemplate
+
+
+class _BoundedLRU(object):
+    """An LRU mapping of key to (size-in-bytes, value), bounded by both entry count and total size. Not thread-safe."""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[object, tuple]" = OrderedDict()
+        self.bytes = 0
+
+    def get(self, key):
+        item = self.entries.get(key)
+        if item is None:
+            return None
+        self.entries.move_to_end(key)
+        return item[1]
+
+    def set(self, key, size, value):
+        """Store ``value``, returning the number of other entries evicted to make room for it"""
+        if size > self.max_bytes:
+            return 0
+
+        self.pop(key)
+        self.entries[key] = (size, value)
+        self.bytes += size
+
+        evicted = 0
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            self.pop(next(iter(self.entries)))
+            evicted += 1
+        return evicted
+
+    def pop(self, key):
+        item = self.entries.pop(key, None)
+        if item is None:
+            return None
+        self.bytes -= item[0]
+        return item[1]
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+
+class _CacheEntry(object):
+    __slots__ = ("body", "path", "expires_at")
+
+    def __init__(self, body: bytes, path: str, expires_at: float):
+        self.body = body
+        self.path = path
+        self.expires_at = expires_at
+
+
+def _paths_overlap(path, other_path):
+    """Whether either path is the other, or an ancestor of it"""
+    path, other_path = path.rstrip("/") + "/", other_path.rstrip("/") + "/"
+    return path.startswith(other_path) or other_path.startswith(path)
+
+
+class ResponseCache(object):
+    """An in-memory, thread-safe LRU cache of GET response bodies for read-mostly endpoints.
+
+    Only GETs on paths matching one of the endpoint templates in ``ttls`` are cached, each for the number of seconds
+    given. Any other request made through the client invalidates cached entries for its path, its ancestors and its
+    descendants - so a ``POST /frameworks/g-cloud-12`` drops ``/frameworks``, ``/frameworks/g-cloud-12`` and
+    ``/frameworks/g-cloud-12/stats``. The cache is bounded by both number of entries and total size of bodies held.
+
+    A single cache may be shared between several clients.
+
+    :param ttls: A mapping of endpoint template (e.g. ``"/frameworks/{slug}"``) to time-to-live in seconds
+    :param max_entries: The maximum number of responses to hold
+    :param max_bytes: The maximum total size of response bodies to hold
+    """
+
+    def __init__(
+        self,
+        ttls: Dict[str, float],
+        *,
+        max_entries: int = 1000,
+        max_bytes: int = 16 * 1024 * 1024,
+        clock=time.monotonic,
+    ):
+        self._ttls = [(EndpointTemplate(template), ttl) for template, ttl in ttls.items()]
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._entries = _BoundedLRU(max_entries, max_bytes)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def ttl_for(self, path) -> Optional[float]:
+        """The time-to-live for responses from ``path``, or None if they shouldn't be cached"""
+        return next((ttl for template, ttl in self._ttls if template.matches(path)), None)
+
+    def get(self, key) -> Optional[bytes]:
+        with self._lock:
+            entry: Optional[_CacheEntry] = self._entries.get(key)
+            if entry is not None and entry.expires_at <= self._clock():
+                self._entries.pop(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return entry.body
+
+    def set(self, key, path, body: bytes, ttl: float):
+        with self._lock:
+            self.evictions += self._entries.set(key, len(body), _CacheEntry(body, path, self._clock() + ttl))
+
+    def invalidate(self, path):
+        """Drop cached responses for ``path``, its ancestors and its descendants"""
+        with self._lock:
+            stale_keys = [
+                key for key, (_, entry) in self._entries.entries.items() if _paths_overlap(entry.path, path)
+            ]
+            for key in stale_keys:
+                self._entries.pop(key)
+            self.invalidations += len(stale_keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries.entries),
+                "bytes": self._entries.bytes,
+            }
+
+
+class ValidatedResponse(object):
+    __slots__ = ("body", "etag", "last_modified")
+
+    def __init__(self, body: bytes, etag: Optional[str], last_modified: Optional[str]):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def conditional_headers(self) -> Dict[str, str]:
+        """Headers asking the server to only send the response again if it has changed"""
+        return {
+            header: value for header, value in (
+                ("If-None-Match", self.etag),
+                ("If-Modified-Since", self.last_modified),
+            ) if value
+        }
+
+
+class RevalidationCache(object):
+    """An in-memory, thread-safe LRU store of GET response bodies along with their ``ETag``/``Last-Modified``
+    validators.
+
+    When a client with a revalidation cache repeats a GET it sends the stored validators as ``If-None-Match``/
+    ``If-Modified-Since``, and if the server replies ``304 Not Modified`` the stored body is used instead of
+    downloading it again. Only responses carrying at least one validator are stored.
+
+    :param endpoints: Endpoint templates (e.g. ``"/suppliers/export/{framework_slug}"``) to revalidate responses from.
+                      If not given, any GET response with validators is stored.
+    :param max_entries: The maximum number of responses to hold
+    :param max_bytes: The maximum total size of response bodies to hold
+    """
+
+    def __init__(
+        self,
+        endpoints: Optional[Iterable[str]] = None,
+        *,
+        max_entries: int = 1000,
+        max_bytes: int = 64 * 1024 * 1024,
+    ):
+        self._endpoints = None if endpoints is None else [EndpointTemplate(template) for template in endpoints]
+
+        self._lock = threading.Lock()
+        self._entries = _BoundedLRU(max_entries, max_bytes)
+
+        self.not_modified = 0
+        self.modified = 0
+        self.bytes_saved = 0
+
+    def handles(self, path) -> bool:
+        return self._endpoints is None or any(template.matches(path) for template in self._endpoints)
+
+    def get(self, key) -> Optional[ValidatedResponse]:
+        with self._lock:
+            validated: Optional[ValidatedResponse] = self._entries.get(key)
+            return validated
+
+    def record_not_modified(self, validated: ValidatedResponse):
+        """Record that ``validated`` was used in place of a ``304 Not Modified`` response's body"""
+        with self._lock:
+            self.not_modified += 1
+            self.bytes_saved += len(validated.body)
+
+    def store(self, key, body: bytes, etag: Optional[str], last_modified: Optional[str]):
+        with self._lock:
+            if self._entries.get(key) is not None:
+                self.modified += 1
+            if etag or last_modified:
+                self._entries.set(key, len(body), ValidatedResponse(body, etag, last_modified))
+            else:
+                self._entries.pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {
+                "not_modified": self.not_modified,
+                "modified": self.modified,
+                "bytes_saved": self.bytes_saved,
+                "entries": len(self._entries.entries),
+                "bytes": self._entries.bytes,
+            }
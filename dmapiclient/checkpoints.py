@@ -0,0 +1,41 @@
+"""
+Checkpoint stores for resuming long-running ``make_iter_method`` iterations.
+
+An iterator given ``checkpoint=FileCheckpointStore(path)`` saves its cursor to ``path`` each time it moves on to a new
+page. If the job is interrupted, calling the same iterator method (with the same arguments) and checkpoint store again
+carries on from the first page not fully consumed, rather than from the beginning. The checkpoint is cleared once the
+iteration finishes.
+
+Any object with the same ``load``, ``save`` and ``clear`` methods can be used as a checkpoint store, e.g. to keep
+checkpoints in a database.
+"""
+import json
+import os
+from typing import Optional
+
+
+class FileCheckpointStore(object):
+    """Keeps a cursor in a JSON file, replaced atomically each time it's saved"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self) -> Optional[dict]:
+        try:
+            with open(self.path) as f:
+                cursor: dict = json.load(f)
+        except FileNotFoundError:
+            return None
+        return cursor
+
+    def save(self, cursor: dict):
+        temporary_path = "{}.tmp".format(self.path)
+        with open(temporary_path, "w") as f:
+            json.dump(cursor, f)
+        os.replace(temporary_path, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,196 @@
+"""
+Circuit breakers for the API clients.
+
+A client given a ``CircuitBreakerPolicy``, e.g. ``SearchAPIClient(..., circuit_breaker=CircuitBreakerPolicy())``,
+stops sending requests to its API once enough of them have failed in a row, raising ``CircuitOpenError`` straight
+away instead of tying up the caller through connect timeouts and retries. After ``reset_timeout`` seconds a trial
+request is let through: if it succeeds requests resume, otherwise the circuit stays open for another
+``reset_timeout``.
+
+Circuit breakers are shared by every client in the process with the same base url, so that one client discovering an
+API is down spares the others from finding out the slow way. They use the policy of the first client to create them:
+later clients of the same base url with a different policy log a warning (once per client), and share the first policy
+regardless.
+"""
+import logging
+import threading
+import time
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitBreakerPolicy(object):
+    """When a client's circuit breaker should open and close.
+
+    :param failure_threshold: The number of consecutive failed requests after which to stop sending requests
+    :param reset_timeout: The number of seconds to stop sending requests for before trying again
+    :param half_open_max_calls: The number of trial requests to let through at once once ``reset_timeout`` has passed
+    :param failure_status_codes: The response status codes counted as failures, as well as failing to get a response
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        *,
+        reset_timeout: float = 30.,
+        half_open_max_calls: int = 1,
+        failure_status_codes=(500, 502, 503, 504),
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.failure_status_codes = frozenset(failure_status_codes)
+
+    def _settings(self):
+        return self.failure_threshold, self.reset_timeout, self.half_open_max_calls, self.failure_status_codes
+
+    def __eq__(self, other):
+        if not isinstance(other, CircuitBreakerPolicy):
+            return NotImplemented
+        return self._settings() == other._settings()
+
+    def __hash__(self):
+        return hash(self._settings())
+
+    def __repr__(self):
+        return "{}({}, reset_timeout={}, half_open_max_calls={}, failure_status_codes={})".format(
+            self.__class__.__name__, *self._settings()[:3], tuple(sorted(self.failure_status_codes)),
+        )
+
+    def is_failure(self, api_error) -> bool:
+        return api_error.response is None or api_error.status_code in self.failure_status_codes
+
+
+class CircuitBreaker(object):
+    """The thread-safe closed/open/half-open state of requests to one API"""
+
+    def __init__(self, name: str, policy: CircuitBreakerPolicy, *, clock=time.monotonic):
+        self.name = name
+        self.policy = policy
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.
+        self._trials_in_flight = 0
+        self._last_trial_at = 0.
+
+        self.rejected = 0
+        self.times_opened = 0
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.policy.reset_timeout:
+            self._state = HALF_OPEN
+            self._trials_in_flight = 0
+        return self._state
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self.times_opened += 1
+        logger.warning(
+            "Circuit breaker for {circuit_name} opened after {circuit_failures} consecutive failures",
+            extra={"circuit_name": self.name, "circuit_failures": self._consecutive_failures},
+        )
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    @property
+    def retry_in(self) -> float:
+        """The number of seconds until a trial request will be let through, if the circuit is open"""
+        with self._lock:
+            if self._current_state() != OPEN:
+                return 0.
+            return float(max(0., self._opened_at + self.policy.reset_timeout - self._clock()))
+
+    def allow_request(self) -> bool:
+        """Whether a request may be sent. Once one has been, its outcome must be recorded with one of the
+        ``record_...`` methods.
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and (
+                self._trials_in_flight < self.policy.half_open_max_calls
+                # in case a trial request's outcome was never recorded
+                or self._clock() - self._last_trial_at >= self.policy.reset_timeout
+            ):
+                self._trials_in_flight += 1
+                self._last_trial_at = self._clock()
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive_failures = 0
+            if self._current_state() == HALF_OPEN:
+                self._state = CLOSED
+                logger.info("Circuit breaker for {circuit_name} closed", extra={"circuit_name": self.name})
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            state = self._current_state()
+            if state == HALF_OPEN or (state == CLOSED and self._consecutive_failures >= self.policy.failure_threshold):
+                self._open()
+
+    def record_unknown(self):
+        """Record that a request's outcome wasn't waited for"""
+        with self._lock:
+            if self._current_state() == HALF_OPEN and self._trials_in_flight:
+                self._trials_in_flight -= 1
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._consecutive_failures,
+                "rejected": self.rejected,
+                "times_opened": self.times_opened,
+            }
+
+
+_circuit_breakers: Dict[str, CircuitBreaker] = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def circuit_breaker_for(base_url: str, policy: CircuitBreakerPolicy) -> CircuitBreaker:
+    """Return the circuit breaker shared by clients of ``base_url``, creating it with ``policy`` if there isn't one.
+
+    The first policy given for a base url is the one used by every client of it - a warning is logged if a later
+    client's policy is different.
+    """
+    circuit_breaker = _circuit_breakers.get(base_url)
+    if circuit_breaker is None:
+        with _circuit_breakers_lock:
+            circuit_breaker = _circuit_breakers.get(base_url)
+            if circuit_breaker is None:
+                circuit_breaker = _circuit_breakers[base_url] = CircuitBreaker(base_url, policy)
+    if circuit_breaker.policy != policy:
+        logger.warning(
+            "Circuit breaker for {circuit_name} already uses {policy}, not {ignored_policy}",
+            extra={
+                "circuit_name": base_url,
+                "policy": repr(circuit_breaker.policy),
+                "ignored_policy": repr(policy),
+            },
+        )
+    return circuit_breaker
+
+
+def reset_circuit_breakers():
+    """Forget every circuit breaker, e.g. between tests. Existing clients keep the circuit breaker they've used."""
+    with _circuit_breakers_lock:
+        _circuit_breakers.clear()
@@ -0,0 +1,144 @@
+"""
+Columnar export of the models yielded by ``*_iter`` methods.
+
+Reporting jobs usually want a table of a few fields from each model rather than the models themselves. A
+``ColumnSchema`` declares the columns to pick out, by dotted path into each model, and builds them up a chunk of rows at
+a time from any ``*_iter`` iterator, so that only one chunk is held in memory however many models there are:
+
+    schema = ColumnSchema({
+        "id": "id",
+        "name": "name",
+        "email": "contactInformation.0.email",
+    })
+    with open("suppliers.csv", "w", newline="") as f:
+        schema.write_csv(data_client.export_suppliers_iter("g-cloud-12", stream=True), f)
+
+Chunks can also be written to a file each with ``write_csv_chunks``, or, if ``pyarrow`` is installed
+(``pip install digitalmarketplace-apiclient[arrow]``), converted to Arrow record batches or written to a Parquet file.
+"""
+import csv
+import json
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Tuple, Union
+
+
+def _compile_path(path: str) -> Tuple[Union[str, int], ...]:
+    # numeric parts index into lists
+    return tuple(int(part) if part.isdigit() else part for part in path.split("."))
+
+
+def _lookup(model, path, default):
+    value = model
+    for key in path:
+        try:
+            value = value[key]
+        except (KeyError, IndexError, TypeError):
+            return default
+    return value
+
+
+def _csv_value(value):
+    # nested values which weren't flattened are written as JSON
+    return json.dumps(value) if isinstance(value, (dict, list)) else value
+
+
+def _require_pyarrow():
+    # imported only when needed, as importing pyarrow takes longer than the rest of the client put together
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("pyarrow is required for Arrow and Parquet exports - install the 'arrow' extra") from e
+    return pyarrow
+
+
+class ColumnSchema(object):
+    """The columns to export from each model.
+
+    :param columns: Either a mapping of column names to the dotted paths of their values in each model (e.g.
+                    ``"contactInformation.0.email"``, where numeric parts index into lists), or a sequence of paths to
+                    use as the column names too
+    :param default: The value of columns whose path is missing from a model
+    """
+
+    def __init__(self, columns, *, default=None):
+        if isinstance(columns, Mapping):
+            names, paths = list(columns.keys()), list(columns.values())
+        else:
+            names, paths = list(columns), list(columns)
+        self.names: List[str] = names
+        self._paths = [_compile_path(path) for path in paths]
+        self.default = default
+
+    def row(self, model) -> list:
+        """Return the values of each column for ``model``"""
+        return [_lookup(model, path, self.default) for path in self._paths]
+
+    def chunks(self, models, *, chunk_size: int = 10000) -> Iterator[Dict[str, list]]:
+        """Yield the columns for each ``chunk_size`` models, as a dict of column names to lists of values"""
+        columns: List[list] = [[] for _ in self._paths]
+        rows = 0
+        for model in models:
+            for column, path in zip(columns, self._paths):
+                column.append(_lookup(model, path, self.default))
+            rows += 1
+            if rows == chunk_size:
+                yield dict(zip(self.names, columns))
+                columns = [[] for _ in self._paths]
+                rows = 0
+        if rows:
+            yield dict(zip(self.names, columns))
+
+    def _write_csv_rows(self, writer, chunk):
+        writer.writerows(zip(*([_csv_value(value) for value in column] for column in chunk.values())))
+        return len(next(iter(chunk.values()), ()))
+
+    def write_csv(self, models, file, *, chunk_size: int = 10000) -> int:
+        """Write a header and a row for each model to the text file ``file``, returning the number of rows written"""
+        writer = csv.writer(file)
+        writer.writerow(self.names)
+        return sum(self._write_csv_rows(writer, chunk) for chunk in self.chunks(models, chunk_size=chunk_size))
+
+    def write_csv_chunks(self, models, path_template: str, *, chunk_size: int = 10000) -> List[str]:
+        """Write each chunk to its own CSV file, with a header, returning their paths.
+
+        :param path_template: The path of each file, formatted with the chunk's index, e.g. ``"suppliers-{:05d}.csv"``
+        """
+        paths = []
+        for index, chunk in enumerate(self.chunks(models, chunk_size=chunk_size)):
+            path = path_template.format(index)
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(self.names)
+                self._write_csv_rows(writer, chunk)
+            paths.append(path)
+        return paths
+
+    def record_batches(self, models, *, chunk_size: int = 10000, arrow_schema=None):
+        """Yield a ``pyarrow.RecordBatch`` for each chunk.
+
+        :param arrow_schema: The ``pyarrow.Schema`` of the batches. By default it's inferred from the first chunk, so
+                             should be given if a column might have no values in the first chunk.
+        """
+        pyarrow = _require_pyarrow()
+        for chunk in self.chunks(models, chunk_size=chunk_size):
+            batch = pyarrow.RecordBatch.from_pydict(chunk, schema=arrow_schema)
+            # every batch has the same types as the first
+            arrow_schema = batch.schema
+            yield batch
+
+    def write_parquet(self, models, path: str, *, chunk_size: int = 10000, arrow_schema=None) -> int:
+        """Write the models to a Parquet file, one row group per chunk, returning the number of rows written"""
+        pyarrow = _require_pyarrow()
+        rows = 0
+        writer = None
+        try:
+            for batch in self.record_batches(models, chunk_size=chunk_size, arrow_schema=arrow_schema):
+                if writer is None:
+                    writer = pyarrow.parquet.ParquetWriter(path, batch.schema)
+                writer.write_table(pyarrow.Table.from_batches([batch]))
+                rows += batch.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows
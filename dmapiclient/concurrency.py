@@ -0,0 +1,52 @@
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import copy_current_request_context, has_request_context
+
+from .errors import APIError
+
+
+def propagate_context(fn):
+    """Wrap ``fn`` so that, when called from another thread, it runs with the context of the calling thread.
+
+    Both ``contextvars`` and any active Flask request context are carried over, so requests made from worker threads
+    still send the current request's onwards headers. Wrap once per task submitted - a single wrapped function must not
+    be running in more than one thread at a time.
+    """
+    if has_request_context():
+        fn = copy_current_request_context(fn)
+    context = contextvars.copy_context()
+
+    def wrapper(*args, **kwargs):
+        return context.run(fn, *args, **kwargs)
+
+    return wrapper
+
+
+class BulkResult(OrderedDict):
+    """The results of fetching many objects, keyed by id in the order the ids were given.
+
+    Ids whose fetch failed with an ``APIError`` are left out of the mapping, with the error recorded in ``errors``.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.errors: "OrderedDict[object, APIError]" = OrderedDict()
+
+
+def fetch_concurrently(fetch, keys, max_workers):
+    """Call ``fetch(key)`` for each distinct key using a pool of ``max_workers`` threads, returning a ``BulkResult``"""
+    keys = list(OrderedDict.fromkeys(keys))
+    results = BulkResult()
+    if not keys:
+        return results
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dmapiclient-bulk") as executor:
+        futures = [(key, executor.submit(propagate_context(fetch), key)) for key in keys]
+        for key, future in futures:
+            try:
+                results[key] = future.result()
+            except APIError as e:
+                results.errors[key] = e
+
+    return results
@@ -1,20 +1,110 @@
 from __future__ import unicode_literals
 
 import warnings
-from typing import Dict
+from typing import Dict, Optional
 
+from .acknowledgement import BulkAcknowledgement, can_collapse_service_updates
 from .audit import AuditTypes
-from .base import BaseAPIClient, logger, make_iter_method
+from .auditwriter import AuditEventWriter
+from .base import BaseAPIClient, logger, make_iter_method, project_fields
 from .errors import HTTPError
 
 
 class DataAPIClient(BaseAPIClient):
+    # Suggested time-to-live in seconds for endpoints whose data changes rarely, for use with a ResponseCache e.g.
+    #     DataAPIClient(api_url, api_token, cache=ResponseCache(DataAPIClient.READ_MOSTLY_ENDPOINT_TTLS))
+    READ_MOSTLY_ENDPOINT_TTLS = {
+        "/frameworks": 60,
+        "/frameworks/{framework_slug}": 60,
+        "/frameworks/{framework_slug}/stats": 60,
+        "/buyer-email-domains": 300,
+        "/suppliers/{supplier_id}/frameworks": 60,
+    }
+
+    ENDPOINT_TEMPLATES = BaseAPIClient.ENDPOINT_TEMPLATES + (
+        "/agreements",
+        "/agreements/{agreement_id}",
+        "/agreements/{agreement_id}/approve",
+        "/agreements/{agreement_id}/on-hold",
+        "/agreements/{agreement_id}/sign",
+        "/agreements/{agreement_id}/undo-countersign",
+        "/archived-services/{archived_service_id}",
+        "/audit-events",
+        "/audit-events/{audit_event_id}",
+        "/audit-events/{audit_event_id}/acknowledge",
+        "/brief-responses",
+        "/brief-responses/{brief_response_id}",
+        "/brief-responses/{brief_response_id}/submit",
+        "/briefs",
+        "/briefs/{brief_id}",
+        "/briefs/{brief_id}/award",
+        "/briefs/{brief_id}/award/{brief_response_id}/contract-details",
+        "/briefs/{brief_id}/cancel",
+        "/briefs/{brief_id}/clarification-questions",
+        "/briefs/{brief_id}/copy",
+        "/briefs/{brief_id}/publish",
+        "/briefs/{brief_id}/services",
+        "/briefs/{brief_id}/unsuccessful",
+        "/briefs/{brief_id}/withdraw",
+        "/buyer-email-domains",
+        "/direct-award/projects",
+        "/direct-award/projects/{project_id}",
+        "/direct-award/projects/{project_id}/cancel",
+        "/direct-award/projects/{project_id}/lock",
+        "/direct-award/projects/{project_id}/none-suitable",
+        "/direct-award/projects/{project_id}/record-download",
+        "/direct-award/projects/{project_id}/searches",
+        "/direct-award/projects/{project_id}/searches/{search_id}",
+        "/direct-award/projects/{project_id}/services",
+        "/direct-award/projects/{project_id}/services/{service_id}/award",
+        "/draft-services",
+        "/draft-services/copy-from/{service_id}",
+        "/draft-services/framework/{framework_slug}",
+        "/draft-services/{draft_id}",
+        "/draft-services/{draft_id}/complete",
+        "/draft-services/{draft_id}/copy",
+        "/draft-services/{draft_id}/publish",
+        "/draft-services/{draft_id}/update-status",
+        "/draft-services/{framework_slug}/{lot_slug}/copy-published-from-framework",
+        "/frameworks",
+        "/frameworks/transition-dos/{framework_slug}",
+        "/frameworks/{framework_slug}",
+        "/frameworks/{framework_slug}/interest",
+        "/frameworks/{framework_slug}/stats",
+        "/frameworks/{framework_slug}/suppliers",
+        "/outcomes",
+        "/outcomes/{outcome_id}",
+        "/services",
+        "/services/{service_id}",
+        "/services/{service_id}/revert",
+        "/services/{service_id}/status/{status}",
+        "/services/{service_id}/updates/acknowledge",
+        "/suppliers",
+        "/suppliers/export/{framework_slug}",
+        "/suppliers/{supplier_id}",
+        "/suppliers/{supplier_id}/contact-information/{contact_id}",
+        "/suppliers/{supplier_id}/contact-information/{contact_id}/remove-personal-data",
+        "/suppliers/{supplier_id}/frameworks",
+        "/suppliers/{supplier_id}/frameworks/interest",
+        "/suppliers/{supplier_id}/frameworks/{framework_slug}",
+        "/suppliers/{supplier_id}/frameworks/{framework_slug}/declaration",
+        "/suppliers/{supplier_id}/frameworks/{framework_slug}/variation/{variation_slug}",
+        "/users",
+        "/users/auth",
+        "/users/check-buyer-email",
+        "/users/export/{framework_slug}",
+        "/users/valid-admin-email",
+        "/users/{user_id}",
+        "/users/{user_id}/remove-personal-data",
+    )
+
     def init_app(self, app):
         self._base_url = app.config['DM_DATA_API_URL']
         self._auth_token = app.config['DM_DATA_API_AUTH_TOKEN']
 
     # Audit Events
 
+    @project_fields('auditEvents')
     def find_audit_events(
             self,
             audit_type=None,
@@ -81,7 +171,37 @@ class DataAPIClient(BaseAPIClient):
             user=user,
         )
 
-    def create_audit_event(self, audit_type, user=None, data=None, object_type=None, object_id=None):
+    def bulk_acknowledge_audit_events(
+        self,
+        *,
+        acknowledged_by=None,
+        collapse_service_updates: bool = True,
+        on_progress=None,
+        max_workers: Optional[int] = None,
+        **filters,
+    ):
+        """Acknowledge every unacknowledged audit event matching ``filters`` (as taken by ``find_audit_events_iter``),
+        concurrently once they've all been found, as ``acknowledged_by`` (by default the client's user).
+
+        Each service's updates are acknowledged together if ``collapse_service_updates`` is set, unless ``filters``
+        might leave out some of a service's updates (which acknowledging them together would also acknowledge).
+
+        ``on_progress`` is called with the returned ``BulkAcknowledgement``'s ``stats`` after each acknowledgement call.
+        Failed calls are reported in its ``errors`` rather than raised.
+        """
+        acknowledgement = BulkAcknowledgement(
+            self,
+            user=self._getuser(acknowledged_by),
+            collapse_service_updates=collapse_service_updates and can_collapse_service_updates(filters),
+            on_progress=on_progress,
+        )
+        for audit_event in self.find_audit_events_iter(acknowledged="false", **filters):
+            acknowledgement.add(audit_event)
+        self._fetch_concurrently(acknowledgement.acknowledge, acknowledgement.calls(), max_workers=max_workers)
+        return acknowledgement
+
+    @staticmethod
+    def _audit_event_payload(audit_type, user=None, data=None, object_type=None, object_id=None):
         if not isinstance(audit_type, AuditTypes):
             raise TypeError("Must be an AuditTypes")
         if data is None:
@@ -96,13 +216,22 @@ class DataAPIClient(BaseAPIClient):
             payload['objectType'] = object_type
         if object_id is not None:
             payload['objectId'] = object_id
+        return payload
 
+    def create_audit_event(self, audit_type, user=None, data=None, object_type=None, object_id=None):
         return self._post(
             '/audit-events',
-            data={'auditEvents': payload})
+            data={'auditEvents': self._audit_event_payload(audit_type, user, data, object_type, object_id)})
+
+    def audit_event_writer(
+        self, *, batch_size: int = 100, flush_interval: float = 5., max_workers: Optional[int] = None
+    ) -> AuditEventWriter:
+        """Return an ``AuditEventWriter`` to create many audit events in concurrent batches"""
+        return AuditEventWriter(self, batch_size=batch_size, flush_interval=flush_interval, max_workers=max_workers)
 
     # Suppliers
 
+    @project_fields('suppliers')
     def find_suppliers(
         self, prefix=None, page=None, framework=None, duns_number=None, company_registration_number=None, name=None
     ):
@@ -138,6 +267,10 @@ class DataAPIClient(BaseAPIClient):
             "/suppliers/{}".format(supplier_id)
         )
 
+    def get_suppliers(self, supplier_ids, *, max_workers: Optional[int] = None):
+        """Fetch many suppliers concurrently. See ``BulkResult`` for how failures are reported."""
+        return self._fetch_concurrently(self.get_supplier, supplier_ids, max_workers=max_workers)
+
     def create_supplier(self, supplier):
         return self._post(
             "/suppliers",
@@ -341,6 +474,7 @@ class DataAPIClient(BaseAPIClient):
             user=user,
         )
 
+    @project_fields('supplierFrameworks')
     def find_framework_suppliers(self, framework_slug, agreement_returned=None, statuses=None, with_declarations=True):
         '''
         :param agreement_returned: A boolean value that allows filtering by suppliers who have or have not
@@ -365,6 +499,7 @@ class DataAPIClient(BaseAPIClient):
     find_framework_suppliers_iter = make_iter_method('find_framework_suppliers', 'supplierFrameworks')
     find_framework_suppliers_iter.__name__ = str("find_framework_suppliers_iter")
 
+    @project_fields('suppliers')
     def export_suppliers(self, framework_slug):
         return self._get(
             "/suppliers/export/{}".format(framework_slug)
@@ -382,6 +517,7 @@ class DataAPIClient(BaseAPIClient):
                 "users": user,
             })
 
+    @project_fields('users')
     def find_users(
         self,
         supplier_id=None,
@@ -444,6 +580,10 @@ class DataAPIClient(BaseAPIClient):
                 raise
         return None
 
+    def get_users(self, user_ids, *, max_workers: Optional[int] = None):
+        """Fetch many users by id concurrently. Users which don't exist map to None, as with ``get_user``."""
+        return self._fetch_concurrently(self.get_user, user_ids, max_workers=max_workers)
+
     def authenticate_user(self, email_address, password):
         try:
             response = self._post(
@@ -472,15 +612,15 @@ class DataAPIClient(BaseAPIClient):
         except HTTPError:
             return False
 
-    def update_user(self,
-                    user_id,
-                    locked=None,
-                    active=None,
-                    role=None,
-                    supplier_id=None,
-                    name=None,
-                    user_research_opted_in=None,
-                    updater=None):
+    @staticmethod
+    def _update_user_params(
+        locked=None,
+        active=None,
+        role=None,
+        supplier_id=None,
+        name=None,
+        user_research_opted_in=None,
+    ):
         fields = {}
         if locked is not None:
             fields.update({
@@ -512,10 +652,28 @@ class DataAPIClient(BaseAPIClient):
                 'name': name
             })
 
-        params = {
+        return {
             "users": fields,
         }
 
+    def update_user(self,
+                    user_id,
+                    locked=None,
+                    active=None,
+                    role=None,
+                    supplier_id=None,
+                    name=None,
+                    user_research_opted_in=None,
+                    updater=None):
+        params = self._update_user_params(
+            locked=locked,
+            active=active,
+            role=role,
+            supplier_id=supplier_id,
+            name=name,
+            user_research_opted_in=user_research_opted_in,
+        )
+
         user = self._post_with_updated_by(
             '/users/{}'.format(user_id),
             data=params,
@@ -529,6 +687,7 @@ class DataAPIClient(BaseAPIClient):
     def remove_user_personal_data(self, user_id, user=None):
         return self._post_with_updated_by("/users/{}/remove-personal-data".format(user_id), data={}, user=user)
 
+    @project_fields('users')
     def export_users(self, framework_slug):
         return self._get(
             "/users/export/{}".format(framework_slug)
@@ -542,6 +701,7 @@ class DataAPIClient(BaseAPIClient):
             "/users/check-buyer-email", data={'emailAddress': email_address}
         )['valid']
 
+    @project_fields('buyerEmailDomains')
     def get_buyer_email_domains(self, page=None):
         warnings.warn(
             "The output of 'get_buyer_email_domains' is paginated. Use 'get_buyer_email_domains_iter' instead.",
@@ -582,6 +742,7 @@ class DataAPIClient(BaseAPIClient):
 
     # Services
 
+    @project_fields('services')
     def find_draft_services(self, supplier_id, service_id=None, framework=None):
 
         params = {
@@ -597,6 +758,7 @@ class DataAPIClient(BaseAPIClient):
     find_draft_services_iter = make_iter_method('find_draft_services', 'services')
     find_draft_services_iter.__name__ = str("find_draft_services_iter")
 
+    @project_fields('services')
     def find_draft_services_by_framework(self, framework_slug, page=None, status=None, supplier_id=None, lot=None):
         warnings.warn(
             "The output of 'find_draft_services_by_framework' is paginated. "
@@ -713,6 +875,11 @@ class DataAPIClient(BaseAPIClient):
                 raise
         return None
 
+    def get_services(self, service_ids, *, max_workers: Optional[int] = None):
+        """Fetch many services concurrently. Services which don't exist map to None, as with ``get_service``."""
+        return self._fetch_concurrently(self.get_service, service_ids, max_workers=max_workers)
+
+    @project_fields('services')
     def find_services(self, supplier_id=None, framework=None, status=None, page=None, lot=None):
         """
         The response will be paginated unless you provide supplier_id.
@@ -911,6 +1078,11 @@ class DataAPIClient(BaseAPIClient):
         return self._get(
             "/briefs/{}".format(brief_id))
 
+    def get_briefs(self, brief_ids, *, max_workers: Optional[int] = None):
+        """Fetch many briefs concurrently. See ``BulkResult`` for how failures are reported."""
+        return self._fetch_concurrently(self.get_brief, brief_ids, max_workers=max_workers)
+
+    @project_fields('briefs')
     def find_briefs(
         self, user_id=None, status=None, framework=None, lot=None, page=None, human=None, with_users=None,
         with_clarification_questions=None, closed_on=None, withdrawn_on=None, cancelled_on=None, unsuccessful_on=None,
@@ -998,6 +1170,11 @@ class DataAPIClient(BaseAPIClient):
         return self._get(
             "/brief-responses/{}".format(brief_response_id))
 
+    def get_brief_responses(self, brief_response_ids, *, max_workers: Optional[int] = None):
+        """Fetch many brief responses concurrently. See ``BulkResult`` for how failures are reported."""
+        return self._fetch_concurrently(self.get_brief_response, brief_response_ids, max_workers=max_workers)
+
+    @project_fields('briefResponses')
     def find_brief_responses(
         self,
         brief_id=None,
@@ -1109,6 +1286,7 @@ class DataAPIClient(BaseAPIClient):
 
     # Direct Award Projects
 
+    @project_fields('projects')
     def find_direct_award_projects(
         self,
         user_id=None,
@@ -1160,6 +1338,7 @@ class DataAPIClient(BaseAPIClient):
             user=user_email
         )
 
+    @project_fields('searches')
     def find_direct_award_project_searches(self, project_id, user_id=None, page=None, only_active=None):
         warnings.warn(
             "The output of 'find_direct_award_project_searches' is paginated. "
@@ -1279,6 +1458,7 @@ class DataAPIClient(BaseAPIClient):
     def get_outcome(self, outcome_id):
         return self._get("/outcomes/{}".format(outcome_id))
 
+    @project_fields('outcomes')
     def find_outcomes(self, completed=None, page=None):
         warnings.warn(
             "The output of 'find_outcomes' is paginated. Use 'find_outcomes_iter' instead.",
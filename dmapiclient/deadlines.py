@@ -0,0 +1,71 @@
+"""
+Deadlines shared by a chain of API requests.
+
+A Flask view making several API requests in turn usually only has so long to respond in total, but each request gets
+the client's full timeout regardless of how much of that time its predecessors used up. Requests made within
+``with deadline(seconds):`` (or, with ``init_app``, during a Flask request) instead have their connect and read
+timeouts cut to the time left before the deadline, are only retried while there's time left to wait before retrying,
+and raise ``DeadlineExceeded`` without being sent once it has passed.
+
+Deadlines are carried over to threads started with ``dmapiclient.concurrency.propagate_context``, as used for
+concurrent and hedged requests.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from flask import current_app, g, has_request_context
+
+# the time.monotonic() by which requests made in this context must finish, if any
+_deadline: "contextvars.ContextVar[Optional[float]]" = contextvars.ContextVar("dmapiclient_deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds: float):
+    """Limit the API requests made within the block to finishing within ``seconds`` in total.
+
+    A deadline nested inside another can only shorten it.
+    """
+    deadline_at = time.monotonic() + seconds
+    outer_deadline_at = _deadline.get()
+    token = _deadline.set(deadline_at if outer_deadline_at is None else min(deadline_at, outer_deadline_at))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def set_request_deadline(seconds: float):
+    """Limit the API requests made during the rest of the current Flask request to finishing within ``seconds``"""
+    g._dmapiclient_deadline = time.monotonic() + seconds
+
+
+def init_app(app):
+    """Give every request to ``app`` a deadline of ``DM_API_REQUEST_DEADLINE`` seconds, if that's configured"""
+    @app.before_request
+    def start_request_deadline():
+        seconds = current_app.config.get("DM_API_REQUEST_DEADLINE")
+        if seconds:
+            set_request_deadline(seconds)
+
+
+def remaining() -> Optional[float]:
+    """Return the number of seconds left before the current deadline (which may be negative), or None if there's
+    no deadline
+    """
+    deadline_at = _deadline.get()
+    if has_request_context():
+        request_deadline_at = g.get("_dmapiclient_deadline")
+        if request_deadline_at is not None and (deadline_at is None or request_deadline_at < deadline_at):
+            deadline_at = request_deadline_at
+    if deadline_at is None:
+        return None
+    return deadline_at - time.monotonic()
+
+
+def shrink_timeout(timeout, time_left: float):
+    """Return a requests-style ``timeout`` (a number, a ``(connect, read)`` tuple or None) cut to ``time_left``"""
+    if isinstance(timeout, tuple):
+        return tuple(time_left if part is None else min(part, time_left) for part in timeout)
+    return time_left if timeout is None else min(timeout, time_left)
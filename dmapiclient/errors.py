@@ -5,15 +5,21 @@ REQUEST_ERROR_MESSAGE = "Unknown request failure in dmapiclient"
 
 
 class APIError(Exception):
-    def __init__(self, response=None, message=None):
+    def __init__(self, response=None, message=None, *, codec=None):
         self.response = response
         self._message = message
+        self._codec = codec
+
+    def _response_json(self):
+        if self._codec is None:
+            return self.response.json()
+        return self._codec.loads(self.response.content)
 
     @property
     def message(self) -> Union[str, dict]:
         try:
             # If the API returns a well-formed `error`, it should always be a dict.
-            return cast(dict, self.response.json()['error'])
+            return cast(dict, self._response_json()['error'])
         except (TypeError, ValueError, AttributeError, KeyError):
             return self._message or REQUEST_ERROR_MESSAGE
 
@@ -31,11 +37,23 @@ class APIError(Exception):
 
 class HTTPError(APIError):
     @staticmethod
-    def create(e):
+    def create(e, *, codec=None):
         fallback_message = '{}\n{}'.format(str(e), repr(e))
 
-        return HTTPError(e.response, fallback_message)
+        return HTTPError(e.response, fallback_message, codec=codec)
 
 
 class InvalidResponse(APIError):
     pass
+
+
+class CircuitOpenError(APIError):
+    """Raised instead of sending a request while the circuit breaker for the API is open"""
+    pass
+
+
+class DeadlineExceeded(APIError):
+    """Raised instead of sending a request once the deadline it was made under has passed, or if the request failed
+    because it did
+    """
+    pass
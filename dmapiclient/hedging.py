@@ -0,0 +1,130 @@
+"""
+Hedged requests, to cut the tail latency of idempotent GETs.
+
+A client given a ``HedgingPolicy``, e.g. ``DataAPIClient(..., hedging=HedgingPolicy())``, remembers how long recent
+GETs to each endpoint took. If a GET hasn't finished by the time most (say 95%) of them had, a second, identical
+request is sent, and whichever response arrives first is used. Hedges are limited to a proportion of all requests, so
+that an API which is slow across the board isn't sent twice as many requests.
+
+Synchronous clients can't interrupt a request which is already in progress, so the slower of the two is left to finish
+in the background and its response discarded. Asynchronous clients cancel it.
+"""
+import bisect
+import threading
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional
+
+from .routes import EndpointTemplate
+
+# methods which can safely be sent twice
+SAFE_METHODS = frozenset(("GET", "HEAD", "OPTIONS"))
+
+
+class HedgingPolicy(object):
+    """When a client should hedge requests.
+
+    :param delay_percentile: The percentile (0-1) of an endpoint's recent latencies to wait for before hedging
+    :param min_delay: The shortest time to wait before hedging, in seconds
+    :param max_hedge_ratio: The maximum proportion of requests to hedge
+    :param min_samples: The number of requests to an endpoint to time before hedging any
+    :param window: The number of recent requests to each endpoint to keep the latency of
+    :param endpoints: Endpoint templates (e.g. ``"/services/{service_id}"``) to hedge requests to. If not given, GETs to
+                      any endpoint may be hedged.
+    :param max_workers: The most threads a synchronous client sends hedgeable requests and hedges on at once - by
+                        default twice its ``pool_maxsize``. Requests made while they're all busy are sent on the
+                        caller's thread and not hedged, rather than waiting for one.
+    """
+
+    def __init__(
+        self,
+        delay_percentile: float = 0.95,
+        *,
+        min_delay: float = 0.01,
+        max_hedge_ratio: float = 0.05,
+        min_samples: int = 20,
+        window: int = 200,
+        endpoints: Optional[Iterable[str]] = None,
+        max_workers: Optional[int] = None,
+    ):
+        self.delay_percentile = delay_percentile
+        self.min_delay = min_delay
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_samples = min_samples
+        self.window = window
+        self._endpoints = None if endpoints is None else [EndpointTemplate(template) for template in endpoints]
+        self.max_workers = max_workers
+
+    def handles(self, method, path) -> bool:
+        return method in SAFE_METHODS and (
+            self._endpoints is None or any(template.matches(path) for template in self._endpoints)
+        )
+
+
+class Hedger(object):
+    """A client's thread-safe record of recent latencies, and of how many hedges it may still send"""
+
+    # the most hedges which can be saved up while requests are fast, to spend at once when they're slow
+    MAX_SAVED_HEDGES = 10
+
+    def __init__(self, policy: HedgingPolicy):
+        self.policy = policy
+        self._lock = threading.Lock()
+        # the sorted latencies of each endpoint's recent requests, and those latencies in the order they were recorded
+        self._sorted_latencies: Dict[str, list] = {}
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._saved_hedges = 0.
+
+        self.requests = 0
+        self.hedged = 0
+        self.hedges_won = 0
+
+    def delay_for(self, endpoint) -> Optional[float]:
+        """Count a hedgeable request to ``endpoint``, returning how long to wait before hedging it (or None if it
+        shouldn't be, including if no hedge could be sent now - so that the request needn't be sent in a way that
+        allows for one)
+        """
+        with self._lock:
+            self.requests += 1
+            self._saved_hedges = min(self.MAX_SAVED_HEDGES, self._saved_hedges + self.policy.max_hedge_ratio)
+            if self._saved_hedges < 1:
+                return None
+
+            sorted_latencies = self._sorted_latencies.get(endpoint)
+            if sorted_latencies is None or len(sorted_latencies) < self.policy.min_samples:
+                return None
+            index = min(len(sorted_latencies) - 1, int(self.policy.delay_percentile * len(sorted_latencies)))
+            return float(max(self.policy.min_delay, sorted_latencies[index]))
+
+    def try_hedge(self) -> bool:
+        with self._lock:
+            if self._saved_hedges < 1:
+                return False
+            self._saved_hedges -= 1
+            self.hedged += 1
+            return True
+
+    def record_latency(self, endpoint, elapsed_time):
+        with self._lock:
+            latencies = self._latencies.get(endpoint)
+            if latencies is None:
+                latencies = self._latencies[endpoint] = deque()
+                self._sorted_latencies[endpoint] = []
+            sorted_latencies = self._sorted_latencies[endpoint]
+
+            if len(latencies) >= self.policy.window:
+                del sorted_latencies[bisect.bisect_left(sorted_latencies, latencies.popleft())]
+            latencies.append(elapsed_time)
+            bisect.insort(sorted_latencies, elapsed_time)
+
+    def record_hedge_won(self):
+        with self._lock:
+            self.hedges_won += 1
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hedged": self.hedged,
+                "hedges_won": self.hedges_won,
+            }
@@ -0,0 +1,112 @@
+"""
+JSON codecs used by the API clients to encode request bodies and decode response bodies.
+
+By default clients use the fastest codec available - ``orjson`` or ``ujson`` if either is installed
+(``pip install digitalmarketplace-apiclient[fast-json]``), otherwise the standard library's ``json`` module. A codec
+can also be passed to a client explicitly, e.g. ``DataAPIClient(..., codec=StdlibJSONCodec())``.
+
+Whichever codec is used, request bodies are encoded as requests' ``json=`` argument would: non-str keys are converted to
+strings, and NaN and infinity raise ``ValueError`` rather than being sent.
+"""
+import json
+import math
+from typing import Any, List, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None  # type: ignore
+
+
+class JSONCodec(object):
+    """Encodes python objects to, and decodes them from, JSON. Decoding errors must be raised as ``ValueError``s."""
+    name: Optional[str] = None
+
+    def dumps(self, obj) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, body: Union[bytes, str]) -> Any:
+        raise NotImplementedError
+
+    def __repr__(self):
+        return "{}()".format(self.__class__.__name__)
+
+
+class StdlibJSONCodec(JSONCodec):
+    name = "json"
+
+    def dumps(self, obj):
+        # matching what requests does with its json= argument
+        return json.dumps(obj, allow_nan=False).encode("utf-8")
+
+    def loads(self, body):
+        return json.loads(body)
+
+
+_OUT_OF_RANGE_FLOAT_MESSAGE = "Out of range float values are not JSON compliant"
+
+
+def _check_finite(obj):
+    """Raise ValueError, as the standard library's ``json.dumps(..., allow_nan=False)`` does, if ``obj`` contains NaN
+    or infinity
+    """
+    stack = [obj]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                raise ValueError(_OUT_OF_RANGE_FLOAT_MESSAGE)
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+
+
+class OrjsonCodec(JSONCodec):
+    name = "orjson"
+
+    def dumps(self, obj):
+        # non-str keys are converted to strings as the standard library does, rather than raising TypeError
+        body = orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        # orjson encodes NaN and infinity as null, so only documents with nulls need checking for them
+        if b"null" in body:
+            _check_finite(obj)
+        return body
+
+    def loads(self, body):
+        return orjson.loads(body)
+
+
+class UjsonCodec(JSONCodec):
+    name = "ujson"
+
+    def dumps(self, obj):
+        try:
+            return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False, allow_nan=False).encode("utf-8")
+        except OverflowError:
+            # as raised for NaN and infinity
+            raise ValueError(_OUT_OF_RANGE_FLOAT_MESSAGE)
+
+    def loads(self, body):
+        return ujson.loads(body)
+
+
+def available_codecs() -> List[JSONCodec]:
+    """Return an instance of each codec that can be used in this environment, fastest first"""
+    codec_classes: List[type] = [
+        codec_class for codec_class, module in (
+            (OrjsonCodec, orjson),
+            (UjsonCodec, ujson),
+            (StdlibJSONCodec, json),
+        ) if module is not None
+    ]
+    return [codec_class() for codec_class in codec_classes]
+
+
+def default_codec() -> JSONCodec:
+    return available_codecs()[0]
@@ -0,0 +1,229 @@
+"""
+Request-level metrics for the API clients.
+
+Pass ``metrics=`` a ``MetricsRecorder`` when creating a client to have every request it makes recorded against its
+endpoint template (e.g. ``GET /services/{service_id}``, rather than the url requested). ``InMemoryMetrics`` keeps
+latency histograms, status code counts, retry counts and bytes sent and received for each endpoint, and
+``PrometheusMetrics`` can also render them in the Prometheus text exposition format. A recorder may be shared by
+several clients.
+"""
+import bisect
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+# in seconds
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30.)
+
+
+class MetricsRecorder(object):
+    """The interface clients report requests to. Implementations must be thread-safe."""
+
+    def record_request(
+        self,
+        client_name: str,
+        method: str,
+        endpoint: str,
+        status_code: int,
+        elapsed_time: float,
+        retries: int,
+        request_bytes: int,
+        response_bytes: int,
+    ):
+        """Record a completed (successful or failed) request.
+
+        :param client_name: The name of the client class making the request
+        :param endpoint: The endpoint template requested
+        :param status_code: The response's status code, or ``REQUEST_ERROR_STATUS_CODE`` if there was no response
+        :param elapsed_time: The time taken, including any retries, in seconds
+        :param retries: How many times the request was retried
+        :param request_bytes: The size of the request body sent
+        :param response_bytes: The size of the response body received
+        """
+        raise NotImplementedError
+
+
+class Histogram(object):
+    """Counts of observations falling into each of a fixed set of buckets. Not thread-safe."""
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # the last count is of observations greater than every bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self):
+        """Yield ``(upper_bound, count of observations <= upper_bound)`` for each bucket, ending with infinity"""
+        total = 0
+        for upper_bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield upper_bound, total
+
+    def quantile(self, q) -> Optional[float]:
+        """Estimate the ``q``th quantile (0-1) as the upper bound of the bucket it falls in"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        return float(next(upper_bound for upper_bound, total in self.cumulative_counts() if total >= rank))
+
+
+class EndpointMetrics(object):
+    """Everything recorded about requests to one endpoint. Not thread-safe."""
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.latency = Histogram(buckets)
+        self.status_codes: "Counter[int]" = Counter()
+        self.retries = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+    @property
+    def requests(self):
+        return self.latency.count
+
+    @property
+    def mean_latency(self):
+        return self.latency.sum / self.latency.count if self.latency.count else None
+
+
+class InMemoryMetrics(MetricsRecorder):
+    """Keeps metrics for each ``(client_name, method, endpoint)`` in memory, for inspection or export.
+
+    :param buckets: The upper bounds of the latency histogram buckets, in seconds
+    """
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self._buckets = buckets
+        self._lock = threading.Lock()
+        self._endpoints: "OrderedDict[Tuple[str, str, str], EndpointMetrics]" = OrderedDict()
+
+    def record_request(
+        self,
+        client_name,
+        method,
+        endpoint,
+        status_code,
+        elapsed_time,
+        retries,
+        request_bytes,
+        response_bytes,
+    ):
+        key = (client_name, method, endpoint)
+        with self._lock:
+            metrics = self._endpoints.get(key)
+            if metrics is None:
+                metrics = self._endpoints[key] = EndpointMetrics(self._buckets)
+            metrics.latency.observe(elapsed_time)
+            metrics.status_codes[status_code] += 1
+            metrics.retries += retries
+            metrics.request_bytes += request_bytes
+            metrics.response_bytes += response_bytes
+
+    def snapshot(self) -> Dict[Tuple[str, str, str], dict]:
+        """Return a summary of the metrics for each ``(client_name, method, endpoint)`` recorded so far"""
+        with self._lock:
+            return OrderedDict(
+                (key, {
+                    "requests": metrics.requests,
+                    "status_codes": dict(metrics.status_codes),
+                    "retries": metrics.retries,
+                    "request_bytes": metrics.request_bytes,
+                    "response_bytes": metrics.response_bytes,
+                    "latency_sum": metrics.latency.sum,
+                    "latency_p50": metrics.latency.quantile(.5),
+                    "latency_p99": metrics.latency.quantile(.99),
+                })
+                for key, metrics in self._endpoints.items()
+            )
+
+    def slowest(self, n=10):
+        """Return the ``n`` ``(client_name, method, endpoint)``s with the highest mean latency, slowest first"""
+        with self._lock:
+            ranked = sorted(self._endpoints.items(), key=lambda item: item[1].mean_latency, reverse=True)
+        return [key for key, _ in ranked[:n]]
+
+    def clear(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+def _escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels):
+    return "{" + ",".join('{}="{}"'.format(name, _escape_label_value(value)) for name, value in labels.items()) + "}"
+
+
+def _format_bound(upper_bound):
+    return "+Inf" if upper_bound == float("inf") else repr(float(upper_bound))
+
+
+class PrometheusMetrics(InMemoryMetrics):
+    """``InMemoryMetrics`` which can be rendered in the Prometheus text exposition format, for serving from an app's
+    metrics endpoint.
+
+    :param namespace: Prefixed to the name of each metric
+    """
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS, *, namespace="dmapiclient"):
+        super().__init__(buckets)
+        self._namespace = namespace
+
+    def _name(self, metric):
+        return "{}_{}".format(self._namespace, metric)
+
+    def _header(self, metric, metric_type, description):
+        return [
+            "# HELP {} {}".format(self._name(metric), description),
+            "# TYPE {} {}".format(self._name(metric), metric_type),
+        ]
+
+    def render(self) -> str:
+        with self._lock:
+            endpoints = [
+                ({"client": client_name, "method": method, "endpoint": endpoint}, metrics)
+                for (client_name, method, endpoint), metrics in self._endpoints.items()
+            ]
+
+            lines = self._header("request_duration_seconds", "histogram", "Time taken by API requests, with retries.")
+            for labels, metrics in endpoints:
+                for upper_bound, total in metrics.latency.cumulative_counts():
+                    lines.append("{}{} {}".format(
+                        self._name("request_duration_seconds_bucket"),
+                        _labels(**labels, le=_format_bound(upper_bound)),
+                        total,
+                    ))
+                lines.append("{}{} {!r}".format(
+                    self._name("request_duration_seconds_sum"), _labels(**labels), metrics.latency.sum,
+                ))
+                lines.append("{}{} {}".format(
+                    self._name("request_duration_seconds_count"), _labels(**labels), metrics.latency.count,
+                ))
+
+            lines += self._header("requests_total", "counter", "API requests made, by response status code.")
+            for labels, metrics in endpoints:
+                for status_code, count in sorted(metrics.status_codes.items()):
+                    lines.append("{}{} {}".format(
+                        self._name("requests_total"), _labels(**labels, status=status_code), count,
+                    ))
+
+            for metric, attribute, description in (
+                ("request_retries_total", "retries", "Retries of API requests."),
+                ("request_bytes_total", "request_bytes", "Bytes of API request bodies sent."),
+                ("response_bytes_total", "response_bytes", "Bytes of API response bodies received."),
+            ):
+                lines += self._header(metric, "counter", description)
+                lines.extend(
+                    "{}{} {}".format(self._name(metric), _labels(**labels), getattr(metrics, attribute))
+                    for labels, metrics in endpoints
+                )
+
+        return "\n".join(lines) + "\n"
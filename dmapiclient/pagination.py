@@ -0,0 +1,242 @@
+"""
+Strategies for walking the pages of a paginated API response, as used by ``make_iter_method`` iterators.
+
+Each strategy is a generator taking the already-fetched first page and a function to fetch a page by url, yielding
+each page in turn (starting with the first).
+"""
+import collections
+import itertools
+import queue
+import threading
+import urllib.parse as urlparse
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from .concurrency import propagate_context
+
+
+def follow_pages(first_page, get_page):
+    """Fetch each ``links.next`` page only once the previous page has been consumed"""
+    page = first_page
+    yield page
+
+    while 'next' in page.get('links', {}):
+        page = get_page(page['links']['next'])
+        yield page
+
+
+class _Failure(object):
+    def __init__(self, exc):
+        self.exc = exc
+
+
+_DONE = object()
+
+
+class _PagePrefetcher(object):
+    def __init__(self, get_page, depth, poll_interval):
+        self._get_page = get_page
+        self._poll_interval = poll_interval
+        self.pages: "queue.Queue" = queue.Queue(maxsize=depth)
+        self.stopped = threading.Event()
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.pages.put(item, timeout=self._poll_interval)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce(self, page):
+        try:
+            while 'next' in page.get('links', {}) and not self.stopped.is_set():
+                page = self._get_page(page['links']['next'])
+                if not self._put(page):
+                    return
+        except Exception as e:
+            self._put(_Failure(e))
+        else:
+            self._put(_DONE)
+
+    def consume(self):
+        while True:
+            item = self.pages.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.exc
+            yield item
+
+
+def prefetch_pages(first_page, get_page, depth, *, poll_interval=0.1):
+    """Fetch up to ``depth`` ``links.next`` pages ahead of the consumer in a background thread.
+
+    At most ``depth`` unconsumed pages are held in memory at any time. Closing the generator stops any further pages
+    being requested, though a request already in flight will be allowed to complete (its result is discarded).
+    """
+    if depth < 1:
+        raise ValueError("prefetch depth must be at least 1")
+
+    prefetcher = _PagePrefetcher(get_page, depth, poll_interval)
+    threading.Thread(
+        target=propagate_context(prefetcher.produce),
+        args=(first_page,),
+        name="dmapiclient-prefetch",
+        daemon=True,
+    ).start()
+
+    try:
+        yield first_page
+        yield from prefetcher.consume()
+    finally:
+        prefetcher.stopped.set()
+
+
+def _page_number(url):
+    query = urlparse.urlsplit(url).query
+    for name, value in urlparse.parse_qsl(query):
+        if name == "page":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+def _with_page_number(url, page_number):
+    # substitute just the page parameter, leaving the rest of the server-provided url byte-for-byte intact
+    scheme, netloc, path, query, fragment = urlparse.urlsplit(url)
+    query = "&".join(
+        "page={}".format(page_number) if param.split("=", 1)[0] == "page" else param
+        for param in query.split("&")
+    )
+    return urlparse.urlunsplit((scheme, netloc, path, query, fragment))
+
+
+def _submit(executor, get_page, url):
+    return executor.submit(propagate_context(get_page), url)
+
+
+def fan_out_pages(first_page, get_page, workers, *, ordered=True):
+    """Fetch every remaining page concurrently, using ``links.last`` to work out how many pages there are.
+
+    Pages are fetched by a pool of ``workers`` threads, with no more than ``workers`` pages in flight or awaiting
+    consumption at once. If ``ordered`` is false pages are yielded as soon as they arrive, otherwise they are yielded in
+    page order. Responses without a usable ``links.last`` fall back to following ``links.next`` one page at a time.
+
+    Note that because pages are requested by number, records moving between pages while the sweep is underway may be
+    skipped or seen twice, just as they could be when following ``links.next``.
+    """
+    if workers < 1:
+        raise ValueError("number of workers must be at least 1")
+
+    links = first_page.get('links', {})
+    first_page_number = _page_number(links['next']) if 'next' in links else None
+    last_page_number = _page_number(links['last']) if 'last' in links else None
+    if first_page_number is None or last_page_number is None:
+        yield from follow_pages(first_page, get_page)
+        return
+
+    urls = (_with_page_number(links['last'], number) for number in range(first_page_number, last_page_number + 1))
+
+    yield first_page
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dmapiclient-fan-out")
+    in_flight: "collections.deque" = collections.deque(
+        _submit(executor, get_page, url) for url in itertools.islice(urls, workers)
+    )
+    try:
+        while in_flight:
+            if ordered:
+                completed = [in_flight.popleft()]
+            else:
+                done, _ = futures.wait(in_flight, return_when=futures.FIRST_COMPLETED)
+                completed = [future for future in in_flight if future in done]
+                for future in completed:
+                    in_flight.remove(future)
+
+            for future in completed:
+                page = future.result()
+                in_flight.extend(_submit(executor, get_page, url) for url in itertools.islice(urls, 1))
+                yield page
+    finally:
+        for future in in_flight:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+class Position(object):
+    """Where a ``make_iter_method`` iterator has got to: the url of the page it's on (None for the first page, which
+    is fetched by calling the find method again) and how many of that page's models have been yielded
+    """
+    __slots__ = ("url", "offset")
+
+    def __init__(self, url=None, offset=0):
+        self.url = url
+        self.offset = offset
+
+
+class ModelIterator(object):
+    """The models yielded by a ``make_iter_method`` iterator, with a ``cursor`` to resume it from later.
+
+    If given a ``checkpoint_store``, the cursor is saved to it each time the iterator moves on to a new page (once
+    every model from the previous page has been consumed), and cleared once the iterator is exhausted.
+    """
+
+    def __init__(
+        self,
+        method_name,
+        models,
+        position: Optional[Position],
+        checkpoint_store=None,
+        record_type=None,
+        projection=None,
+    ):
+        self.method_name = method_name
+        self._models = models
+        # a dmapiclient.projection.Projection to apply to each model, if any
+        self._projection = projection
+        # the dmapiclient.records type to yield models as, if any
+        self._record_type = record_type
+        # None if the position isn't tracked, e.g. for pages fetched in parallel
+        self._position = position
+        self._checkpoint_store = checkpoint_store
+        self._checkpointed_url = position.url if position is not None else None
+        self._exhausted = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._checkpoint_store is not None and self._position.url != self._checkpointed_url:
+            self.save_checkpoint()
+        try:
+            model = next(self._models)
+        except StopIteration:
+            self._exhausted = True
+            if self._checkpoint_store is not None:
+                self._checkpoint_store.clear()
+            raise
+        if self._projection is not None:
+            model = self._projection(model)
+        return model if self._record_type is None else self._record_type(model)
+
+    def close(self):
+        self._models.close()
+
+    @property
+    def cursor(self) -> Optional[dict]:
+        """A JSON-serialisable cursor which, passed back as ``resume_from``, continues after the last model yielded.
+
+        None once the iterator is exhausted, or if it doesn't track its position.
+        """
+        if self._exhausted or self._position is None:
+            return None
+        return {"method": self.method_name, "url": self._position.url, "offset": self._position.offset}
+
+    def save_checkpoint(self):
+        """Save the current cursor to the checkpoint store, e.g. before stopping part way through a page"""
+        self._checkpointed_url = self._position.url
+        self._checkpoint_store.save(self.cursor)
@@ -0,0 +1,53 @@
+"""
+Client-side projection of models onto just the fields needed.
+
+Most of the API's list endpoints can't return a subset of each model's fields, so a job needing two fields of every
+service holds every field of them all. Find methods and their ``*_iter`` iterators take a ``fields``
+argument to instead keep only the fields given, by dotted path for nested fields:
+
+    suppliers = data_client.export_suppliers_iter("g-cloud-12", fields=["id", "contactInformation.email"], stream=True)
+
+Find methods project each page of models once it has been decoded. Iterators project each model as it's yielded,
+which with ``stream=True`` means only the projected fields of each model are held once it has been decoded.
+
+Paths into lists of objects apply to each object in the list. Fields missing from a model are left out of its
+projection.
+"""
+from typing import Dict, Optional, Sequence
+
+
+class Projection(object):
+    """Picks the ``fields`` given, by dotted path, out of models"""
+
+    def __init__(self, fields: Sequence[str]):
+        self.fields = list(fields)
+        # the nested keys to keep, with None for those whose whole value is kept
+        self._tree: Dict[str, Optional[dict]] = {}
+        for field in self.fields:
+            self._add(self._tree, field.split("."))
+
+    @classmethod
+    def _add(cls, tree, keys):
+        key, nested_keys = keys[0], keys[1:]
+        if not nested_keys:
+            tree[key] = None
+        elif tree.get(key, {}) is not None:
+            cls._add(tree.setdefault(key, {}), nested_keys)
+
+    @classmethod
+    def _project(cls, value, tree):
+        if isinstance(value, list):
+            return [cls._project(item, tree) for item in value]
+        if not isinstance(value, dict):
+            return value
+        return {
+            key: value[key] if nested_tree is None else cls._project(value[key], nested_tree)
+            for key, nested_tree in tree.items()
+            if key in value
+        }
+
+    def __call__(self, model):
+        return self._project(model, self._tree)
+
+    def __repr__(self):
+        return "{}({!r})".format(self.__class__.__name__, self.fields)
@@ -0,0 +1,190 @@
+"""
+Compact record types for high-volume models.
+
+Iterating over hundreds of thousands of models holds a dict for each of them, with a hash table of every key.
+Passing ``records=True`` to an iterator method such as ``find_audit_events_iter`` instead yields a record for each
+model, keeping its most used fields in ``__slots__``, as snake_case attributes:
+
+    for audit_event in data_client.find_audit_events_iter(audit_type=AuditTypes.update_service, records=True):
+        print(audit_event.id, audit_event.created_at)
+
+Any other fields, including nested ones like an audit event's ``data``, are kept together and looked up by their key in
+the API's response, as with a dict: ``audit_event["data"]`` or ``audit_event.get("links")``. ``to_dict()`` converts a
+record back to a dict. A model's slotted fields which are missing from its response are None.
+
+Records also intern the keys of their other fields, and the values of slotted fields shared by many models (such as
+statuses), rather than each holding their own copies.
+
+``python benchmarks/bench_record_memory.py`` compares the memory used by records and dicts.
+"""
+from sys import intern
+from typing import Any, Dict, Optional, Type
+
+
+class Record(object):
+    """The base class of records, whose ``__slots__`` hold the fields keyed by ``_keys`` in the API's response"""
+    __slots__ = ("_rest",)
+    _keys: tuple = ()
+    # slots whose values are shared by many records, e.g. statuses, to intern
+    _interned: frozenset = frozenset()
+    # the slot of each key in _keys, set for each subclass
+    _slots_by_key: Dict[str, str] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._slots_by_key = dict(zip(cls._keys, cls.__slots__))
+
+    def __init__(self, model: dict):
+        rest = dict(model)
+        for key, slot in self._slots_by_key.items():
+            value = rest.pop(key, None)
+            if slot in self._interned and type(value) is str:
+                value = intern(value)
+            setattr(self, slot, value)
+        # the other fields, or None if there are none. Each model is usually decoded separately, with its own copy of
+        # every key, so they're interned to share one between records
+        self._rest: Optional[dict] = {intern(key): value for key, value in rest.items()} or None
+
+    def __getitem__(self, key: str) -> Any:
+        slot = self._slots_by_key.get(key)
+        if slot is not None:
+            return getattr(self, slot)
+        if self._rest is None:
+            raise KeyError(key)
+        return self._rest[key]
+
+    def get(self, key: str, default=None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._slots_by_key or (self._rest is not None and key in self._rest)
+
+    def to_dict(self) -> dict:
+        model = {key: getattr(self, slot) for key, slot in self._slots_by_key.items()}
+        if self._rest is not None:
+            model.update(self._rest)
+        return model
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return "{}({})".format(
+            self.__class__.__name__,
+            ", ".join("{}={!r}".format(slot, getattr(self, slot)) for slot in self.__slots__),
+        )
+
+
+class AuditEvent(Record):
+    __slots__ = (
+        "id", "type", "user", "created_at", "acknowledged", "acknowledged_by", "acknowledged_at", "object_type",
+        "object_id",
+    )
+    _keys = (
+        "id", "type", "user", "createdAt", "acknowledged", "acknowledgedBy", "acknowledgedAt", "objectType",
+        "objectId",
+    )
+    _interned = frozenset(("type", "user", "acknowledged_by", "object_type"))
+
+    id: int
+    type: str
+    user: Optional[str]
+    created_at: str
+    acknowledged: bool
+    acknowledged_by: Optional[str]
+    acknowledged_at: Optional[str]
+    object_type: Optional[str]
+    object_id: Any
+
+
+class Service(Record):
+    __slots__ = ("id", "service_name", "supplier_id", "supplier_name", "framework_slug", "lot", "status")
+    _keys = ("id", "serviceName", "supplierId", "supplierName", "frameworkSlug", "lot", "status")
+    _interned = frozenset(("supplier_name", "framework_slug", "lot", "status"))
+
+    id: str
+    service_name: Optional[str]
+    supplier_id: int
+    supplier_name: Optional[str]
+    framework_slug: str
+    lot: str
+    status: str
+
+
+class Supplier(Record):
+    __slots__ = ("id", "name", "duns_number", "companies_house_number", "registration_country")
+    _keys = ("id", "name", "dunsNumber", "companiesHouseNumber", "registrationCountry")
+    _interned = frozenset(("registration_country",))
+
+    id: int
+    name: str
+    duns_number: Optional[str]
+    companies_house_number: Optional[str]
+    registration_country: Optional[str]
+
+
+class User(Record):
+    __slots__ = ("id", "email_address", "name", "role", "active", "locked", "created_at", "logged_in_at")
+    _keys = ("id", "emailAddress", "name", "role", "active", "locked", "createdAt", "loggedInAt")
+    _interned = frozenset(("role",))
+
+    id: int
+    email_address: str
+    name: str
+    role: str
+    active: bool
+    locked: bool
+    created_at: str
+    logged_in_at: Optional[str]
+
+
+class Brief(Record):
+    __slots__ = ("id", "title", "status", "framework_slug", "lot_slug", "created_at", "published_at")
+    _keys = ("id", "title", "status", "frameworkSlug", "lotSlug", "createdAt", "publishedAt")
+    _interned = frozenset(("status", "framework_slug", "lot_slug"))
+
+    id: int
+    title: Optional[str]
+    status: str
+    framework_slug: str
+    lot_slug: str
+    created_at: str
+    published_at: Optional[str]
+
+
+class BriefResponse(Record):
+    __slots__ = ("id", "brief_id", "supplier_id", "supplier_name", "status", "created_at", "submitted_at")
+    _keys = ("id", "briefId", "supplierId", "supplierName", "status", "createdAt", "submittedAt")
+    _interned = frozenset(("supplier_name", "status"))
+
+    id: int
+    brief_id: int
+    supplier_id: int
+    supplier_name: Optional[str]
+    status: str
+    created_at: str
+    submitted_at: Optional[str]
+
+
+# the record type for each response key models are found under
+RECORD_TYPES: Dict[str, Type[Record]] = {
+    "auditEvents": AuditEvent,
+    "services": Service,
+    "suppliers": Supplier,
+    "users": User,
+    "briefs": Brief,
+    "briefResponses": BriefResponse,
+}
+
+
+def record_type(method_name, model_names) -> Type[Record]:
+    """Return the record type for the models of an iterator method, raising ValueError if they don't have one"""
+    for model_name in model_names:
+        if model_name in RECORD_TYPES:
+            return RECORD_TYPES[model_name]
+    raise ValueError("{} models have no record type".format(method_name))
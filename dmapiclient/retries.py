@@ -0,0 +1,213 @@
+"""
+Retry policies for the API clients.
+
+By default a client retries each failed request up to ``BaseAPIClient.RETRIES`` times with exponential backoff. When
+an API is degraded that multiplies the load on it by every client retrying every request, so a client can instead be
+given a ``RetryPolicy``, e.g. ``DataAPIClient(..., retry_policy=RetryPolicy())``, which:
+
+- limits each client's retries to a proportion of its recent successful requests (its "retry budget"), so that once
+  most requests are failing, most failures aren't retried
+- spreads retries out with "decorrelated jitter" - each backoff is random, between the backoff factor and three times
+  the previous backoff - so that clients which failed together don't all retry together
+- honours ``Retry-After`` headers on ``429``/``503`` responses (which are then retried too)
+- can be overridden for particular endpoints, e.g. to not retry slow exports at all
+"""
+import random
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from urllib3.exceptions import MaxRetryError, ResponseError
+from urllib3.util.retry import Retry
+
+from . import deadlines
+from .routes import EndpointTemplate
+
+
+class RetryBudget(object):
+    """A thread-safe allowance of retries, topped up by successful requests.
+
+    Within any ``window`` seconds, at most ``ratio`` retries per successful request (plus ``min_retries_per_second``,
+    so that a client making few requests can still retry) are allowed.
+
+    :param ratio: The number of retries allowed per successful request
+    :param min_retries_per_second: Retries allowed regardless of how many requests have succeeded
+    :param window: The number of seconds successes and retries are remembered for
+    """
+
+    def __init__(self, ratio=0.2, *, min_retries_per_second=1., window=10, clock=time.monotonic):
+        self.ratio = ratio
+        self.min_retries_per_second = min_retries_per_second
+        self.window = int(window)
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        # [second, successes, retries] for each of the last `window` seconds with any activity, oldest first
+        self._buckets: Deque[List[int]] = deque()
+
+        self.denied = 0
+
+    def _current_bucket(self):
+        now = int(self._clock())
+        while self._buckets and self._buckets[0][0] <= now - self.window:
+            self._buckets.popleft()
+        if not self._buckets or self._buckets[-1][0] != now:
+            self._buckets.append([now, 0, 0])
+        return self._buckets[-1]
+
+    def record_success(self):
+        with self._lock:
+            self._current_bucket()[1] += 1
+
+    def try_retry(self) -> bool:
+        """Withdraw a retry from the budget, returning False (and counting a denial) if none are left"""
+        with self._lock:
+            bucket = self._current_bucket()
+            successes = sum(past_bucket[1] for past_bucket in self._buckets)
+            retries = sum(past_bucket[2] for past_bucket in self._buckets)
+            if retries >= self.min_retries_per_second * self.window + self.ratio * successes:
+                self.denied += 1
+                return False
+            bucket[2] += 1
+            return True
+
+    @property
+    def stats(self):
+        with self._lock:
+            self._current_bucket()
+            return {
+                "successes": sum(bucket[1] for bucket in self._buckets),
+                "retries": sum(bucket[2] for bucket in self._buckets),
+                "denied": self.denied,
+            }
+
+
+class RetryPolicy(object):
+    """How a client retries failed requests - see the module docstring.
+
+    A policy may be shared between clients, but each client has its own ``RetryBudget``.
+
+    :param retries: The maximum number of times to retry a request
+    :param backoff_factor: The shortest time to wait before retrying, in seconds
+    :param backoff_max: The longest time to wait before retrying, in seconds, unless told otherwise by ``Retry-After``
+    :param status_forcelist: The response status codes to retry requests for (only for methods safe to retry)
+    :param jitter: Whether to randomise backoff times. If False, backoff doubles from ``backoff_factor`` each retry.
+    :param budget_ratio: The number of retries allowed per recent successful request, or None for no retry budget
+    :param budget_min_retries_per_second: Retries allowed regardless of how many requests have succeeded
+    :param overrides: A mapping of endpoint template (e.g. ``"/suppliers/export/{framework_slug}"``) to the
+                      ``RetryPolicy`` to use for requests to it instead. Overrides' own budget settings are ignored -
+                      requests to every endpoint share the client's budget.
+    """
+
+    def __init__(
+        self,
+        retries: int = 5,
+        *,
+        backoff_factor: float = 0.3,
+        backoff_max: float = 10.,
+        status_forcelist=(429, 500, 502, 503, 504),
+        jitter: bool = True,
+        budget_ratio: Optional[float] = 0.2,
+        budget_min_retries_per_second: float = 1.,
+        overrides: Optional[Dict[str, "RetryPolicy"]] = None,
+    ):
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.status_forcelist = tuple(status_forcelist)
+        self.jitter = jitter
+        self.budget_ratio = budget_ratio
+        self.budget_min_retries_per_second = budget_min_retries_per_second
+        self._overrides = [(EndpointTemplate(template), policy) for template, policy in (overrides or {}).items()]
+
+    def new_budget(self) -> Optional[RetryBudget]:
+        if self.budget_ratio is None:
+            return None
+        return RetryBudget(self.budget_ratio, min_retries_per_second=self.budget_min_retries_per_second)
+
+    def for_path(self, path) -> "RetryPolicy":
+        """The policy to use for requests to ``path``"""
+        return next((policy for template, policy in self._overrides if template.matches(path)), self)
+
+    def next_backoff(self, previous_backoff) -> float:
+        """How long to wait before the next retry, given how long was waited before the last one (0 if none)"""
+        if not self.jitter:
+            return float(min(self.backoff_max, max(self.backoff_factor, previous_backoff * 2)))
+        return float(min(
+            self.backoff_max,
+            random.uniform(self.backoff_factor, max(self.backoff_factor, previous_backoff) * 3),
+        ))
+
+    def make_retry(self, budget: Optional[RetryBudget], *, retry_read_timeouts: bool = True) -> Retry:
+        """Make the urllib3 ``Retry`` for a requests session to follow this policy with"""
+        retry = _PolicyRetry(
+            total=self.retries,
+            read=self.retries if retry_read_timeouts else 0,
+            connect=self.retries,
+            status=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=self.status_forcelist,
+            raise_on_status=False,
+        )
+        retry.policy = self
+        retry.budget = budget
+        return retry
+
+    def __repr__(self):
+        return "{}(retries={!r}, jitter={!r}, budget_ratio={!r})".format(
+            self.__class__.__name__, self.retries, self.jitter, self.budget_ratio,
+        )
+
+
+class _DeadlineRetry(Retry):
+    """A urllib3 ``Retry`` which gives up once there isn't time left before the current deadline to retry"""
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        self._check_deadline(retry, url, error, _pool)
+        return retry
+
+    def _check_deadline(self, retry, url, error, _pool):
+        time_left = deadlines.remaining()
+        if time_left is not None and time_left <= retry.get_backoff_time():
+            deadline_error = MaxRetryError(_pool, url, error or ResponseError("deadline exceeded"))
+            deadline_error._dmapiclient_retries = len(self.history)  # type: ignore
+            deadline_error._dmapiclient_deadline_exceeded = True  # type: ignore
+            raise deadline_error
+
+
+class _PolicyRetry(_DeadlineRetry):
+    """A urllib3 ``Retry`` which draws on a ``RetryBudget`` and backs off as its ``RetryPolicy`` says"""
+    policy: Optional[RetryPolicy] = None
+    budget: Optional[RetryBudget] = None
+    # the time waited before the retry this instance is counting towards
+    backoff = 0.
+
+    def new(self, **kwargs):
+        retry = super().new(**kwargs)
+        retry.policy = self.policy
+        retry.budget = self.budget
+        retry.backoff = self.backoff
+        return retry
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        try:
+            retry = Retry.increment(self, method, url, response, error, _pool, _stacktrace)
+        except MaxRetryError as e:
+            e._dmapiclient_retries = len(self.history)  # type: ignore
+            raise
+
+        if self.policy is not None:
+            retry.backoff = self.policy.next_backoff(self.backoff)
+        self._check_deadline(retry, url, error, _pool)
+
+        if self.budget is not None and not self.budget.try_retry():
+            budget_error = MaxRetryError(_pool, url, error or ResponseError("retry budget exhausted"))
+            budget_error._dmapiclient_retries = len(self.history)  # type: ignore
+            raise budget_error
+
+        return retry
+
+    def get_backoff_time(self):
+        return self.backoff
@@ -0,0 +1,137 @@
+import functools
+import re
+import urllib.parse as urlparse
+
+import requests
+from requests.models import RequestEncodingMixin
+
+
+class EndpointTemplate(object):
+    """A url path pattern such as ``/frameworks/{slug}/stats``, where each ``{name}`` matches one path segment"""
+
+    _PLACEHOLDER_RE = re.compile(r"\{[^/{}]*\}")
+
+    def __init__(self, template):
+        self.template = template
+        pattern = "".join(
+            re.escape(literal) + ("[^/]+" if placeholder else "")
+            for literal, placeholder in self._split(template)
+        )
+        # unanchored, so that it can be combined with others
+        self.pattern = "{}/?".format(pattern.rstrip("/"))
+        self._regex = re.compile("^{}$".format(self.pattern))
+
+    @classmethod
+    def _split(cls, template):
+        position = 0
+        for match in cls._PLACEHOLDER_RE.finditer(template):
+            yield template[position:match.start()], True
+            position = match.end()
+        yield template[position:], False
+
+    def matches(self, path):
+        return self._regex.match(path) is not None
+
+    def __repr__(self):
+        return "{}({!r})".format(self.__class__.__name__, self.template)
+
+
+class EndpointNormaliser(object):
+    """Map url paths to the endpoint template they were made from, such as ``/services/123`` to ``/services/{id}``.
+
+    Paths are matched against ``templates`` in order, so literal paths should come before templates that would also
+    match them. Paths matching no template have each segment containing a digit or ``@`` replaced with ``{id}``.
+    """
+
+    _ID_SEGMENT_RE = re.compile(r"(?<=/)[^/]*[0-9@][^/]*")
+
+    def __init__(self, templates):
+        self.templates = tuple(templates)
+        # a single regex of named alternatives, so a path is matched against every template in one pass
+        self._templates_by_group = {"t{}".format(index): template for index, template in enumerate(self.templates)}
+        self._regex = re.compile("|".join(
+            "(?P<{}>{})".format(group, EndpointTemplate(template).pattern)
+            for group, template in self._templates_by_group.items()
+        )) if self.templates else None
+
+    def normalise(self, path):
+        match = self._regex.fullmatch(path) if self._regex is not None else None
+        template = self._templates_by_group.get(match.lastgroup or "") if match is not None else None
+        if template is not None:
+            return template
+        return self._ID_SEGMENT_RE.sub("{id}", path)
+
+
+def url_path(url, base_url=None):
+    """Return the path of ``url`` relative to the path of ``base_url``, ignoring any query string"""
+    path = urlparse.urlsplit(url).path or "/"
+    base_path = urlparse.urlsplit(base_url).path.rstrip("/") if base_url else ""
+    if base_path and (path == base_path or path.startswith(base_path + "/")):
+        path = path[len(base_path):] or "/"
+    return path
+
+
+@functools.lru_cache(maxsize=64)
+def _parse_base_url(base_url):
+    return urlparse.urlparse(base_url)
+
+
+def _join_url(base_url, url):
+    """Join ``url`` to ``base_url``, always keeping the scheme and host of ``base_url``"""
+    # when following next links from API responses we need to keep the scheme, so that app requests don't try to switch
+    # from HTTP to HTTPS
+    parsed_base_url = _parse_base_url(base_url)
+    return urlparse.urlparse(urlparse.urljoin(base_url, url))._replace(
+        netloc=parsed_base_url.netloc,
+        scheme=parsed_base_url.scheme,
+    ).geturl()
+
+
+def _prepare_url(url, params):
+    prepared_request = requests.PreparedRequest()
+    prepared_request.prepare_url(url=url, params=params)
+    return prepared_request.url
+
+
+@functools.lru_cache(maxsize=4096)
+def _url_parts(base_url, url):
+    """Return ``(joined_url, prepared_url, query_prefix, fragment)`` for a request to ``url``.
+
+    ``prepared_url`` is the url as requests would send it without params. Params encoded by requests can be inserted
+    between ``query_prefix`` and ``fragment`` to give the url it would send with them - unless ``query_prefix`` is None,
+    as it is for urls with existing percent-escapes (which requests may re-quote along with the params) or whose scheme
+    isn't http(s) (which requests leaves alone).
+    """
+    joined_url = _join_url(base_url, url)
+    prepared_url = _prepare_url(joined_url, None)
+    if "%" in joined_url or not prepared_url.lower().startswith("http"):
+        return joined_url, prepared_url, None, None
+
+    head, hash_sign, fragment = prepared_url.partition("#")
+    return joined_url, prepared_url, head + ("&" if "?" in head else "?"), hash_sign + fragment
+
+
+def _reusable(url):
+    # absolute urls and those with a query string are usually pagination links, each requested once - caching them
+    # would only push out the paths which are requested again and again
+    return "?" not in url and "//" not in url
+
+
+def build_url(base_url, url, params=None):
+    """Return the url requests would send a request to ``url`` (relative to ``base_url``) with ``params`` as.
+
+    Joining and preparing each distinct path is only done once, so repeated requests to the same path (differing only
+    in their params) are cheap.
+    """
+    if not _reusable(url):
+        return _prepare_url(_join_url(base_url, url), params)
+
+    joined_url, prepared_url, query_prefix, fragment = _url_parts(base_url, url)
+    if query_prefix is None or not isinstance(params, (type(None), dict, list, tuple)):
+        # strings and file-like params are sent as they are, so leave them to requests
+        return _prepare_url(joined_url, params)
+
+    encoded_params = params and RequestEncodingMixin._encode_params(params)
+    if not encoded_params:
+        return prepared_url
+    return query_prefix + encoded_params + fragment
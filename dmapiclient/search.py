@@ -10,6 +10,13 @@ from .errors import HTTPError
 
 
 class SearchAPIClient(BaseAPIClient):
+    ENDPOINT_TEMPLATES = BaseAPIClient.ENDPOINT_TEMPLATES + (
+        "/{index}",
+        "/{index}/{doc_type}/search",
+        "/{index}/{doc_type}/aggregations",
+        "/{index}/{doc_type}/{object_id}",
+    )
+
     def init_app(self, app):
         self._base_url = app.config['DM_SEARCH_API_URL']
         self._auth_token = app.config['DM_SEARCH_API_AUTH_TOKEN']
@@ -0,0 +1,192 @@
+"""
+Coalescing of identical concurrent GETs.
+
+A client given a ``SingleFlight``, e.g. ``DataAPIClient(..., single_flight=SingleFlight())``, sends only one request
+at a time for each distinct url and auth token: GETs made while an identical one is already in flight wait for it and
+share its response body (each decoding their own copy), or raise a copy of its error. The waiting requests aren't
+sent at all, so they don't carry the onwards headers of their own Flask request. Clients record deduplication stats
+under the endpoint template each url was made from (as for metrics), so ``key_stats()`` stays readable however many
+distinct urls are requested.
+
+A request waiting for an identical one gives up with ``DeadlineExceeded`` once its own deadline (see
+``dmapiclient.deadlines``) passes. If the request it waited for failed because that request's deadline passed, it
+makes its own instead.
+
+A ``SingleFlight`` may be shared between several clients, and between threads or (via an async client) coroutines.
+"""
+import asyncio
+import copy
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List
+
+from . import deadlines
+from .errors import DeadlineExceeded
+
+
+class _Call(object):
+    __slots__ = ("done", "result", "error", "abandoned")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # set if the call ended with something like a KeyboardInterrupt, which shouldn't be shared
+        self.abandoned = False
+
+
+def _deadline_exceeded():
+    return DeadlineExceeded(message="Gave up waiting for an identical request in flight as its deadline passed")
+
+
+def _copy_error(error):
+    # each waiter raises its own copy of the error, so that their tracebacks don't get tangled up
+    try:
+        return copy.copy(error)
+    except Exception:
+        return error
+
+
+# returned by _await_call when the call waited for didn't produce an outcome to share
+_CALL_AGAIN = object()
+
+
+async def _await_call(future):
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), deadlines.remaining())
+    except asyncio.CancelledError:
+        if not future.cancelled():
+            # it's us that's being cancelled
+            raise
+    except asyncio.TimeoutError as e:
+        if future.done():
+            # the call we waited for timed out itself
+            raise _copy_error(e)
+        raise _deadline_exceeded() from None
+    except DeadlineExceeded:
+        # the call we waited for ran out of time, which we may not have - make our own
+        pass
+    except Exception as e:
+        raise _copy_error(e)
+    return _CALL_AGAIN
+
+
+class SingleFlight(object):
+    """Runs at most one call at a time for each key, sharing its outcome with any identical calls made meanwhile.
+
+    :param max_tracked_keys: The number of most recently used keys to keep deduplication stats for
+    """
+
+    def __init__(self, *, max_tracked_keys: int = 1000):
+        self.max_tracked_keys = max_tracked_keys
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Hashable, "asyncio.Future"] = {}
+        # [calls made, calls which waited for another] for each name recently used
+        self._key_stats: "OrderedDict[str, List[int]]" = OrderedDict()
+        self.calls = 0
+        self.coalesced = 0
+
+    def _count(self, name, coalesced):
+        # with the lock held
+        self.calls += 1
+        self.coalesced += coalesced
+        key_stats = self._key_stats.get(name)
+        if key_stats is None:
+            key_stats = self._key_stats[name] = [0, 0]
+            if len(self._key_stats) > self.max_tracked_keys:
+                self._key_stats.popitem(last=False)
+        else:
+            self._key_stats.move_to_end(name)
+        key_stats[0] += 1
+        key_stats[1] += coalesced
+
+    def do(self, key: Hashable, fn, *, name: str):
+        """Return ``fn()``, or the result of the call already in progress for ``key`` if there is one.
+
+        :param name: What to record deduplication stats for ``key`` under - it must not include anything secret
+        """
+        while True:
+            with self._lock:
+                in_flight = self._calls.get(key)
+                leading = in_flight is None
+                call = self._calls[key] = _Call() if in_flight is None else in_flight
+                self._count(name, not leading)
+
+            if leading:
+                try:
+                    call.result = fn()
+                except Exception as e:
+                    call.error = e
+                    raise
+                except BaseException:
+                    call.abandoned = True
+                    raise
+                finally:
+                    with self._lock:
+                        del self._calls[key]
+                    call.done.set()
+                return call.result
+
+            if not call.done.wait(deadlines.remaining()):
+                raise _deadline_exceeded()
+            if isinstance(call.error, DeadlineExceeded):
+                # the call we waited for ran out of time, which we may not have - make our own
+                continue
+            if call.error is not None:
+                raise _copy_error(call.error)
+            if not call.abandoned:
+                return call.result
+            # the call we waited for was interrupted - make our own
+
+    async def do_async(self, key: Hashable, coroutine_fn, *, name: str):
+        """As ``do``, for coroutines. ``coroutine_fn()`` must return an awaitable."""
+        key = (asyncio.get_running_loop(), key)
+        while True:
+            with self._lock:
+                in_flight = self._async_calls.get(key)
+                leading = in_flight is None
+                future = self._async_calls[key] = (
+                    asyncio.get_running_loop().create_future() if in_flight is None else in_flight
+                )
+                self._count(name, not leading)
+
+            if leading:
+                try:
+                    result = await coroutine_fn()
+                except Exception as e:
+                    future.set_exception(e)
+                    # waiters raise a copy - this one needn't be retrieved from the future
+                    future.exception()
+                    raise
+                except BaseException:
+                    # e.g. cancelled - waiters should make their own request
+                    future.cancel()
+                    raise
+                else:
+                    future.set_result(result)
+                    return result
+                finally:
+                    with self._lock:
+                        del self._async_calls[key]
+
+            result = await _await_call(future)
+            if result is not _CALL_AGAIN:
+                return result
+
+    def key_stats(self) -> Dict[str, Dict[str, int]]:
+        """Return the number of calls made, and how many of them waited for another, for recently used names"""
+        with self._lock:
+            return OrderedDict(
+                (name, {"calls": calls, "coalesced": coalesced})
+                for name, (calls, coalesced) in self._key_stats.items()
+            )
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls) + len(self._async_calls),
+            }
@@ -0,0 +1,134 @@
+"""
+Incremental decoding of large JSON responses, as used by ``make_iter_method`` iterators called with ``stream=True``.
+
+Only the shape the API uses for lists of models is supported: a top-level object with the models in an array member,
+e.g. ``{"links": {...}, "suppliers": [{...}, {...}]}``. Models are decoded and yielded one at a time as their bytes
+arrive, so only a single model (plus one chunk of the raw body) needs to be held in memory at once.
+"""
+import codecs
+import json
+import re
+
+
+_WHITESPACE_RE = re.compile(r"[ \t\n\r]*")
+_NUMBER_CHARACTERS = frozenset("0123456789+-.eE")
+
+_decoder = json.JSONDecoder()
+
+
+class _Reader(object):
+    """A cursor over JSON text decoded from a stream of utf-8 byte chunks, discarding text once it has been consumed"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._position = 0
+        self._exhausted = False
+        self.bytes_read = 0
+
+    def _fill(self, min_length=0):
+        """Read chunks until more than ``min_length`` characters are buffered, returning whether anything was read"""
+        self._buffer = self._buffer[self._position:]
+        self._position = 0
+        initial_length = len(self._buffer)
+        while not self._exhausted and len(self._buffer) <= max(min_length, initial_length):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._exhausted = True
+                self._buffer += self._decoder.decode(b"", final=True)
+            else:
+                self.bytes_read += len(chunk)
+                self._buffer += self._decoder.decode(chunk)
+        return len(self._buffer) > initial_length
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it, or an empty string at the end of input"""
+        while True:
+            self._position = _WHITESPACE_RE.match(self._buffer, self._position).end()
+            if self._position < len(self._buffer) or not self._fill():
+                return self._buffer[self._position:self._position + 1]
+
+    def expect(self, characters):
+        """Consume the next non-whitespace character, which must be one of ``characters``"""
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError("Expecting one of {!r} at {!r}".format(characters, character or "end of input"))
+        self._position += 1
+        return character
+
+    def value(self):
+        """Consume and return the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buffer, self._position)
+            except ValueError:
+                # the value may just be incomplete - read more (doubling what's buffered, so that retrying a large value
+                # doesn't take quadratic time) before trying again
+                if not self._fill(2 * (len(self._buffer) - self._position)):
+                    raise
+                continue
+
+            # a number reaching the end of what has been read (say "1" of "1.5") may continue in the next chunk
+            if self._exhausted or (end < len(self._buffer) and self._buffer[end] not in _NUMBER_CHARACTERS):
+                self._position = end
+                return value
+            self._fill()
+
+
+class JSONArrayStream(object):
+    """Iterate over the items of an array member of a top-level JSON object, decoding them as the body is read.
+
+    The first member of the object named in ``array_names`` is streamed; every other member is decoded whole and made
+    available in ``members`` once iteration has finished. A ``ValueError`` is raised if the body isn't valid JSON.
+
+    :param chunks: An iterable of the response body as ``bytes``
+    :param array_names: The names of the members that may hold the array to stream
+    """
+
+    def __init__(self, chunks, array_names):
+        self._reader = _Reader(chunks)
+        self._array_names = array_names
+        self.members = {}
+        self.array_name = None
+
+    @property
+    def bytes_read(self):
+        return self._reader.bytes_read
+
+    def __iter__(self):
+        reader = self._reader
+        reader.expect("{")
+        if reader.peek() == "}":
+            reader.expect("}")
+        else:
+            while True:
+                name = reader.value()
+                if not isinstance(name, str):
+                    raise ValueError("Expecting an object member name, got {!r}".format(name))
+                reader.expect(":")
+
+                if self.array_name is None and name in self._array_names and reader.peek() == "[":
+                    self.array_name = name
+                    yield from self._iter_array()
+                else:
+                    self.members[name] = reader.value()
+
+                if reader.expect(",}") == "}":
+                    break
+
+        if reader.peek():
+            raise ValueError("Extra data after the end of the document")
+
+    def _iter_array(self):
+        reader = self._reader
+        reader.expect("[")
+        if reader.peek() == "]":
+            reader.expect("]")
+            return
+
+        while True:
+            yield reader.value()
+            if reader.expect(",]") == "]":
+                return
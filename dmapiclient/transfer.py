@@ -0,0 +1,70 @@
+"""
+Compression of request and response bodies, and accounting for the bytes sent and received by the API clients.
+"""
+import gzip
+import threading
+
+from urllib3.util.request import ACCEPT_ENCODING
+
+# every content-coding our HTTP stack can decode, including brotli ("br") when a brotli package is installed
+SUPPORTED_ACCEPT_ENCODING = ACCEPT_ENCODING
+
+
+def gzip_body(body: bytes, compresslevel: int) -> bytes:
+    return gzip.compress(body, compresslevel=compresslevel)
+
+
+def response_wire_size(response) -> int:
+    """The number of bytes of ``response``'s body read off the wire, before any content-coding was decoded"""
+    try:
+        wire_size = response.raw.tell()
+    except (AttributeError, TypeError, ValueError):
+        wire_size = None
+    if wire_size:
+        return int(wire_size)
+
+    try:
+        return int(response.headers["Content-Length"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return len(response.content)
+
+
+class TransferStats(object):
+    """Thread-safe running totals of the body bytes sent and received by a client's successful requests.
+
+    "Logical" sizes are of the JSON bodies themselves, "wire" sizes are after any ``Content-Encoding`` was applied.
+    Override ``record`` to observe individual requests as well.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.compressed_requests = 0
+        self.request_bytes = 0
+        self.request_wire_bytes = 0
+        self.response_bytes = 0
+        self.response_wire_bytes = 0
+
+    def record(self, method, url, request_bytes, request_wire_bytes, response_bytes, response_wire_bytes):
+        with self._lock:
+            self.requests += 1
+            self.compressed_requests += request_wire_bytes != request_bytes
+            self.request_bytes += request_bytes
+            self.request_wire_bytes += request_wire_bytes
+            self.response_bytes += response_bytes
+            self.response_wire_bytes += response_wire_bytes
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "compressed_requests": self.compressed_requests,
+                "request_bytes": self.request_bytes,
+                "request_wire_bytes": self.request_wire_bytes,
+                "response_bytes": self.response_bytes,
+                "response_wire_bytes": self.response_wire_bytes,
+                "bytes_saved": (
+                    self.request_bytes - self.request_wire_bytes + self.response_bytes - self.response_wire_bytes
+                ),
+            }
@@ -27,5 +27,11 @@ setup(
     install_requires=[
         'requests<3,>=2.18.4',
     ],
+    extras_require={
+        'async': ['aiohttp<4,>=3.8'],
+        'fast-json': ['orjson<4,>=3.6'],
+        'brotli': ['brotli>=1.0.9'],
+        'arrow': ['pyarrow>=7'],
+    },
     python_requires="~=3.9",
 )
@@ -1,3 +1,6 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import pytest
 import requests_mock
 from flask import Flask
@@ -8,6 +11,20 @@ def app():
     return Flask(__name__)
 
 
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    """A clock for code taking a ``clock`` argument, which only moves when its ``now`` is changed"""
+    return FakeClock()
+
+
 @pytest.yield_fixture
 def rmock():
     with requests_mock.mock() as rmock:
@@ -22,3 +39,44 @@ def rmock():
         rmock.register_uri = register_uri_with_complete_qs
 
         yield rmock
+
+
+class LocalServer(object):
+    """A threaded HTTP server for tests which need real concurrent requests, or responses as requests sees them.
+
+    Each request is answered by ``handle(request_handler)``, returning a status, dict of headers and body.
+    """
+
+    def __init__(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, headers, body = server.handle(self)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.handle = lambda request_handler: (200, {"Content-Type": "application/json"}, b"{}")
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.url = "http://127.0.0.1:{}".format(self._server.server_address[1])
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.01,), daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.yield_fixture
+def local_server():
+    server = LocalServer()
+    yield server
+    server.close()
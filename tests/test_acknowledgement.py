@@ -0,0 +1,173 @@
+import mock
+import pytest
+
+from dmapiclient import DataAPIClient
+from dmapiclient.acknowledgement import BulkAcknowledgement, can_collapse_service_updates
+from dmapiclient.audit import AuditTypes
+
+
+@pytest.fixture
+def data_client():
+    return DataAPIClient('http://baseurl', 'auth-token', True)
+
+
+def service_update(event_id, service_id):
+    return {"id": event_id, "type": "update_service", "data": {"serviceId": service_id}}
+
+
+def other_event(event_id):
+    return {"id": event_id, "type": "update_service_status", "data": {"serviceId": "9"}}
+
+
+@pytest.fixture
+def audit_events_rmock(rmock):
+    rmock.get(
+        "http://baseurl/audit-events?acknowledged=false",
+        json={
+            "auditEvents": [service_update(1, "10"), other_event(2), service_update(3, "20")],
+            "links": {"next": "http://baseurl/audit-events?acknowledged=false&page=2"},
+        },
+    )
+    rmock.get(
+        "http://baseurl/audit-events?acknowledged=false&page=2",
+        json={"auditEvents": [service_update(4, "10"), other_event(5)], "links": {}},
+    )
+    rmock.post("http://baseurl/audit-events/2/acknowledge", json={"auditEvents": {"id": 2}})
+    rmock.post("http://baseurl/audit-events/5/acknowledge", status_code=500, json={"error": "Oops"})
+    rmock.post("http://baseurl/services/10/updates/acknowledge", json={"auditEvents": [{"id": 1}, {"id": 4}]})
+    rmock.post("http://baseurl/services/20/updates/acknowledge", json={"auditEvents": [{"id": 3}]})
+    return rmock
+
+
+def acknowledgement_requests(rmock):
+    return sorted(
+        (request.path, request.json()) for request in rmock.request_history if request.method == "POST"
+    )
+
+
+class TestBulkAcknowledgement(object):
+    def test_service_updates_collapsed_into_one_call_per_service(self, data_client):
+        acknowledgement = BulkAcknowledgement(data_client, user="user")
+        for audit_event in (service_update(1, "10"), other_event(2), service_update(4, "10"), service_update(3, "20")):
+            acknowledgement.add(audit_event)
+
+        assert acknowledgement.calls() == [("audit-event", 2), ("service", "10"), ("service", "20")]
+
+    def test_service_updates_not_collapsed_if_asked(self, data_client):
+        acknowledgement = BulkAcknowledgement(data_client, user="user", collapse_service_updates=False)
+        for audit_event in (service_update(1, "10"), service_update(4, "10")):
+            acknowledgement.add(audit_event)
+
+        assert acknowledgement.calls() == [("audit-event", 1), ("audit-event", 4)]
+
+    def test_events_without_a_service_id_acknowledged_alone(self, data_client):
+        acknowledgement = BulkAcknowledgement(data_client, user="user")
+        acknowledgement.add({"id": 1, "type": "update_service", "data": {}})
+
+        assert acknowledgement.calls() == [("audit-event", 1)]
+
+    def test_stats(self, data_client, clock):
+        acknowledgement = BulkAcknowledgement(data_client, user="user", clock=clock)
+        for audit_event in (service_update(1, "10"), service_update(4, "10"), other_event(2)):
+            acknowledgement.add(audit_event)
+
+        with mock.patch.object(data_client, "acknowledge_service_update_including_previous") as acknowledge:
+            acknowledgement.acknowledge(("service", "10"))
+        clock.now += 2
+
+        assert acknowledge.call_args_list == [mock.call("10", 4, user="user")]
+        assert acknowledgement.stats == {
+            "found": 3,
+            "acknowledged": 2,
+            "failed": 0,
+            "requests": 1,
+            "elapsed_time": 2.,
+            "events_per_second": 1.,
+        }
+
+
+class TestBulkAcknowledgeAuditEvents(object):
+    def test_acknowledges_every_unacknowledged_event(self, data_client, audit_events_rmock):
+        acknowledgement = data_client.bulk_acknowledge_audit_events(acknowledged_by="user", max_workers=1)
+
+        assert acknowledgement_requests(audit_events_rmock) == [
+            ("/audit-events/2/acknowledge", {"updated_by": "user"}),
+            ("/audit-events/5/acknowledge", {"updated_by": "user"}),
+            ("/services/10/updates/acknowledge", {"latestAuditEventId": 4, "updated_by": "user"}),
+            ("/services/20/updates/acknowledge", {"latestAuditEventId": 3, "updated_by": "user"}),
+        ]
+        assert acknowledgement.stats["found"] == 5
+        assert acknowledgement.stats["acknowledged"] == 4
+        assert acknowledgement.stats["requests"] == 4
+        assert list(acknowledgement.errors) == [5]
+        assert acknowledgement.errors[5].message == "Oops"
+
+    def test_events_all_found_before_any_acknowledged(self, data_client, audit_events_rmock):
+        data_client.bulk_acknowledge_audit_events(acknowledged_by="user", max_workers=1)
+
+        methods = [request.method for request in audit_events_rmock.request_history]
+        assert methods == ["GET", "GET", "POST", "POST", "POST", "POST"]
+
+    def test_filters_passed_on(self, data_client, rmock):
+        rmock.get("http://baseurl/audit-events?acknowledged=false&audit-type=update_service", json={"auditEvents": []})
+
+        acknowledgement = data_client.bulk_acknowledge_audit_events(
+            acknowledged_by="user", audit_type=AuditTypes.update_service,
+        )
+
+        assert acknowledgement.stats["found"] == 0
+        assert rmock.call_count == 1
+
+    def test_can_filter_by_user(self, data_client, rmock):
+        rmock.get(
+            "http://baseurl/audit-events?acknowledged=false&user=someone%40example.com",
+            json={"auditEvents": [other_event(2)]},
+        )
+        rmock.post("http://baseurl/audit-events/2/acknowledge", json={"auditEvents": {"id": 2}})
+
+        data_client.bulk_acknowledge_audit_events(acknowledged_by="admin", user="someone@example.com")
+
+        assert acknowledgement_requests(rmock) == [("/audit-events/2/acknowledge", {"updated_by": "admin"})]
+
+    def test_service_updates_not_collapsed_if_filters_could_leave_some_out(self, data_client, rmock):
+        rmock.get(
+            "http://baseurl/audit-events?acknowledged=false&audit-date=2020-01-01",
+            json={"auditEvents": [service_update(1, "10"), service_update(4, "10")]},
+        )
+        rmock.post("http://baseurl/audit-events/1/acknowledge", json={"auditEvents": {"id": 1}})
+        rmock.post("http://baseurl/audit-events/4/acknowledge", json={"auditEvents": {"id": 4}})
+
+        acknowledgement = data_client.bulk_acknowledge_audit_events(acknowledged_by="user", audit_date="2020-01-01")
+
+        # acknowledging service 10's updates up to event 4 would also acknowledge its updates from other days
+        assert acknowledgement_requests(rmock) == [
+            ("/audit-events/1/acknowledge", {"updated_by": "user"}),
+            ("/audit-events/4/acknowledge", {"updated_by": "user"}),
+        ]
+        assert acknowledgement.stats["acknowledged"] == 2
+
+    @pytest.mark.parametrize("filters,collapsible", (
+        ({}, True),
+        ({"audit_type": AuditTypes.update_service, "object_type": "services", "latest_first": True}, True),
+        ({"audit_date": None}, True),
+        ({"audit_date": "2020-01-01"}, False),
+        ({"user": "someone@example.com"}, False),
+        ({"data_supplier_id": 1}, False),
+        ({"earliest_for_each_object": True}, False),
+    ))
+    def test_can_collapse_service_updates(self, filters, collapsible):
+        assert can_collapse_service_updates(filters) is collapsible
+
+    def test_progress_reported_after_each_call(self, data_client, audit_events_rmock):
+        on_progress = mock.Mock()
+
+        data_client.bulk_acknowledge_audit_events(acknowledged_by="user", on_progress=on_progress, max_workers=4)
+
+        assert [stats["requests"] for (stats,), _ in on_progress.call_args_list] == [1, 2, 3, 4]
+        assert on_progress.call_args_list[-1][0][0]["acknowledged"] == 4
+
+    def test_user_required_before_finding_events(self, data_client, rmock):
+        with pytest.raises(ValueError):
+            data_client.bulk_acknowledge_audit_events()
+
+        assert rmock.called is False
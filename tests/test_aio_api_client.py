@@ -0,0 +1,527 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+
+import pytest
+import mock
+
+from dmapiclient import CircuitOpenError, DeadlineExceeded, HTTPError, InvalidResponse
+from dmapiclient.aio import AsyncBaseAPIClient, AsyncDataAPIClient, AsyncSearchAPIClient
+from dmapiclient.audit import AuditTypes
+from dmapiclient.cache import ResponseCache, RevalidationCache
+from dmapiclient.circuitbreaker import CircuitBreakerPolicy, reset_circuit_breakers
+from dmapiclient.deadlines import deadline
+from dmapiclient.errors import REQUEST_ERROR_STATUS_CODE
+from dmapiclient.hedging import HedgingPolicy
+from dmapiclient.metrics import InMemoryMetrics
+from dmapiclient.retries import RetryPolicy
+from dmapiclient.singleflight import SingleFlight
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web  # noqa: E402
+from aiohttp.test_utils import TestServer  # noqa: E402
+
+
+def run_against_server(routes, test):
+    """Start a local aiohttp server with the given routes and run ``test(base_url, request_log)`` against it"""
+    request_log = []
+
+    @web.middleware
+    async def record(request, handler):
+        # a case-insensitive copy of the headers, as clients may send e.g. User-agent rather than User-Agent
+        request_log.append((request.method, request.raw_path, request.headers.copy(), await request.read()))
+        return await handler(request)
+
+    async def main():
+        app = web.Application(middlewares=[record])
+        app.add_routes(routes)
+        async with TestServer(app) as server:
+            return await test(str(server.make_url("")), request_log)
+
+    return asyncio.run(main())
+
+
+def json_handler(body, status=200, headers=None):
+    async def handler(request):
+        return web.json_response(body, status=status, headers=headers)
+    return handler
+
+
+@mock.patch('dmapiclient.base.BaseAPIClient._RETRIES_BACKOFF_FACTOR', 0)
+class TestAsyncBaseAPIClient(object):
+    def test_get_returns_decoded_json_and_sends_headers(self):
+        async def test(base_url, request_log):
+            async with AsyncBaseAPIClient(base_url, "auth-token") as client:
+                result = await client._get("/thing", params={"a": "b"})
+
+            assert result == {"thing": 1}
+            assert len(request_log) == 1
+            method, path, headers, _ = request_log[0]
+            assert (method, path) == ("GET", "/thing?a=b")
+            assert headers["Authorization"] == "Bearer auth-token"
+            assert headers["User-Agent"].startswith("DM-API-Client/")
+
+        run_against_server([web.get("/thing", json_handler({"thing": 1}))], test)
+
+    def test_usable_from_successive_event_loops(self, local_server):
+        local_server.handle = lambda request_handler: (
+            200, {"Content-Type": "application/json"}, b'{"frameworks": {"slug": "g-cloud-12"}}',
+        )
+        client = AsyncDataAPIClient(local_server.url, "auth-token")
+
+        assert asyncio.run(client.get_framework("g-cloud-12")) == {"frameworks": {"slug": "g-cloud-12"}}
+        _, first_session = client._aiohttp_session
+        assert asyncio.run(client.get_framework("g-cloud-12")) == {"frameworks": {"slug": "g-cloud-12"}}
+        asyncio.run(client.close())
+
+        # the session bound to the first loop was let go of rather than reused
+        assert first_session.closed
+        assert client._aiohttp_session == (None, None)
+
+    def test_post_with_updated_by_sends_json_body(self):
+        async def test(base_url, request_log):
+            async with AsyncBaseAPIClient(base_url, "auth-token", user="someone@example.com") as client:
+                result = await client._post_with_updated_by("/thing", data={"a": "b"})
+
+            assert result == {"ok": True}
+            assert request_log[0][0] == "POST"
+            assert json.loads(request_log[0][3]) == {"a": "b", "updated_by": "someone@example.com"}
+
+        run_against_server([web.post("/thing", json_handler({"ok": True}))], test)
+
+    def test_error_status_raises_http_error(self):
+        async def test(base_url, request_log):
+            async with AsyncBaseAPIClient(base_url, "auth-token") as client:
+                with pytest.raises(HTTPError) as e:
+                    await client._get("/thing")
+
+            assert e.value.status_code == 404
+            assert e.value.message == "Not found"
+
+        run_against_server([web.get("/thing", json_handler({"error": "Not found"}, status=404))], test)
+
+    def test_invalid_json_raises_invalid_response(self):
+        async def handler(request):
+            return web.Response(text="Internal Error")
+
+        async def test(base_url, request_log):
+            async with AsyncBaseAPIClient(base_url, "auth-token") as client:
+                with pytest.raises(InvalidResponse) as e:
+                    await client._get("/thing")
+
+            assert e.value.message == "No JSON object could be decoded"
+            assert e.value.status_code == 200
+
+        run_against_server([web.get("/thing", handler)], test)
+
+    @pytest.mark.parametrize("method,expected_attempts", (("GET", 3), ("POST", 1)))
+    def test_error_statuses_retried_for_safe_methods_only(self, method, expected_attempts):
+        async def test(base_url, request_log):
+            async with AsyncBaseAPIClient(base_url, "auth-token") as client:
+                with mock.patch.object(AsyncBaseAPIClient, "_RETRIES", 2):
+                    with pytest.raises(HTTPError) as e:
+                        await client._request(method, "/thing")
+
+            assert e.value.status_code == 503
+            assert len(request_log) == expected_attempts
+
+        run_against_server([web.route(method, "/thing", json_handler({"error": "Down"}, status=503))], test)
+
+    def test_retries_then_returns_data_if_successful(self):
+        statuses = [502, 500, 200]
+
+        async def handler(request):
+            return web.json_response({"status": "ok"}, status=statuses.pop(0))
+
+        async def test(base_url, request_log):
+            async with AsyncBaseAPIClient(base_url, "auth-token") as client:
+                result = await client._get("/thing")
+
+            assert result == {"status": "ok"}
+            assert len(request_log) == 3
+
+        run_against_server([web.get("/thing", handler)], test)
+
+    def test_metrics_record_retries(self):
+        statuses = [502, 200]
+
+        async def handler(request):
+            return web.json_response({"status": "ok"}, status=statuses.pop(0))
+
+        async def test(base_url, request_log):
+            metrics = InMemoryMetrics()
+            async with AsyncBaseAPIClient(base_url, "auth-token", metrics=metrics) as client:
+                await client._get("/things/123")
+
+            snapshot = metrics.snapshot()["AsyncBaseAPIClient", "GET", "/things/{id}"]
+            assert snapshot["status_codes"] == {200: 1}
+            assert snapshot["retries"] == 1
+
+        run_against_server([web.get("/things/123", handler)], test)
+
+    def test_retry_policy_budget_limits_retries(self):
+        async def test(base_url, request_log):
+            policy = RetryPolicy(5, backoff_factor=0, budget_ratio=0.5, budget_min_retries_per_second=0)
+            async with AsyncBaseAPIClient(base_url, "auth-token", retry_policy=policy) as client:
+                for _ in range(4):
+                    await client._get("/ok")
+                with pytest.raises(HTTPError) as e:
+                    await client._get("/down")
+
+            assert e.value.status_code == 503
+            # four successes bought two retries
+            assert [path for _, path, _, _ in request_log].count("/down") == 3
+            assert client.retry_budget.stats == {"successes": 4, "retries": 2, "denied": 1}
+
+        run_against_server([
+            web.get("/ok", json_handler({})),
+            web.get("/down", json_handler({"error": "Down"}, status=503)),
+        ], test)
+
+    def test_circuit_breaker_fails_fast_once_open(self):
+        async def test(base_url, request_log):
+            reset_circuit_breakers()
+            policy = CircuitBreakerPolicy(1)
+            async with AsyncBaseAPIClient(base_url, "auth-token", circuit_breaker=policy) as client:
+                with mock.patch.object(AsyncBaseAPIClient, "_RETRIES", 0):
+                    with pytest.raises(HTTPError):
+                        await client._get("/down")
+                    with pytest.raises(CircuitOpenError):
+                        await client._get("/down")
+            reset_circuit_breakers()
+
+            assert len(request_log) == 1
+
+        run_against_server([web.get("/down", json_handler({"error": "Down"}, status=503))], test)
+
+    def test_slow_requests_hedged_and_loser_cancelled(self):
+        attempts = []
+        first_attempt_cancelled = asyncio.Event()
+
+        async def handler(request):
+            attempts.append(request)
+            if len(attempts) == 1:
+                try:
+                    await asyncio.sleep(5)
+                except asyncio.CancelledError:
+                    # the server sees the client go away
+                    first_attempt_cancelled.set()
+                    raise
+                return web.json_response({"from": "first attempt"})
+            return web.json_response({"from": "hedge"})
+
+        async def test(base_url, request_log):
+            policy = HedgingPolicy(min_samples=1, min_delay=0, max_hedge_ratio=1)
+            async with AsyncBaseAPIClient(base_url, "auth-token", hedging=policy) as client:
+                client.hedger.record_latency("/things/{id}", 0.01)
+                assert await client._get("/things/1") == {"from": "hedge"}
+                await asyncio.wait_for(first_attempt_cancelled.wait(), 5)
+
+            assert client.hedger.stats == {"requests": 1, "hedged": 1, "hedges_won": 1}
+
+        run_against_server([web.get("/things/1", handler)], test)
+
+    def test_identical_concurrent_gets_share_a_request(self):
+        async def test(base_url, request_log):
+            async with AsyncBaseAPIClient(base_url, "auth-token", single_flight=SingleFlight()) as client:
+                results = await asyncio.gather(*(client._get("/things/1") for _ in range(3)))
+
+            assert results == [{"id": 1}] * 3
+            assert len(request_log) == 1
+            assert client.single_flight.stats == {"calls": 3, "coalesced": 2, "in_flight": 0}
+            assert client.single_flight.key_stats() == {"/things/{id}": {"calls": 3, "coalesced": 2}}
+
+        run_against_server([web.get("/things/1", json_handler({"id": 1}))], test)
+
+    def test_deadline_limits_requests_and_retries(self):
+        async def slow_handler(request):
+            await asyncio.sleep(5)
+            return web.json_response({})
+
+        async def test(base_url, request_log):
+            async with AsyncBaseAPIClient(base_url, "auth-token") as client:
+                with deadline(0.2):
+                    with pytest.raises(DeadlineExceeded):
+                        await client._get("/slow")
+                    with pytest.raises(DeadlineExceeded):
+                        await client._get("/slow")
+
+            # the second request isn't sent, nor the first retried
+            assert len(request_log) == 1
+
+        run_against_server([web.get("/slow", slow_handler)], test)
+
+    def test_connection_error_raises_http_error(self):
+        async def test():
+            client = AsyncBaseAPIClient("http://127.0.0.1:1", "auth-token")
+            with mock.patch.object(AsyncBaseAPIClient, "_RETRIES", 1):
+                with pytest.raises(HTTPError) as e:
+                    await client._get("/thing")
+            await client.close()
+
+            assert e.value.status_code == REQUEST_ERROR_STATUS_CODE
+
+        asyncio.run(test())
+
+    def test_disabled_client_makes_no_requests(self):
+        async def test(base_url, request_log):
+            async with AsyncBaseAPIClient(base_url, "auth-token", enabled=False) as client:
+                assert await client._get("/thing") is None
+
+            assert request_log == []
+
+        run_against_server([web.get("/thing", json_handler({}))], test)
+
+    def test_response_cache(self):
+        async def test(base_url, request_log):
+            cache = ResponseCache({"/frameworks/{slug}": 60})
+            async with AsyncBaseAPIClient(base_url, "auth-token", cache=cache) as client:
+                assert await client._get("/frameworks/g-cloud-12") == {"slug": "g-cloud-12"}
+                assert await client._get("/frameworks/g-cloud-12") == {"slug": "g-cloud-12"}
+                await client._post("/frameworks/g-cloud-12", data={})
+                assert await client._get("/frameworks/g-cloud-12") == {"slug": "g-cloud-12"}
+
+            assert [method for method, *_ in request_log] == ["GET", "POST", "GET"]
+
+        run_against_server([
+            web.get("/frameworks/g-cloud-12", json_handler({"slug": "g-cloud-12"})),
+            web.post("/frameworks/g-cloud-12", json_handler({})),
+        ], test)
+
+    def test_revalidation_cache(self):
+        async def export(request):
+            if request.headers.get("If-None-Match") == '"v1"':
+                return web.Response(status=304)
+            return web.json_response({"suppliers": [1]}, headers={"ETag": '"v1"'})
+
+        async def test(base_url, request_log):
+            cache = RevalidationCache()
+            async with AsyncBaseAPIClient(base_url, "auth-token", revalidation_cache=cache) as client:
+                assert await client._get("/suppliers/export/g-cloud-12") == {"suppliers": [1]}
+                assert await client._get("/suppliers/export/g-cloud-12") == {"suppliers": [1]}
+
+            assert [headers.get("If-None-Match") for _, _, headers, _ in request_log] == [None, '"v1"']
+            assert cache.stats["not_modified"] == 1
+
+        run_against_server([web.get("/suppliers/export/g-cloud-12", export)], test)
+
+    def test_large_requests_compressed(self):
+        async def test(base_url, request_log):
+            async with AsyncBaseAPIClient(base_url, "auth-token", compress_requests_over=10) as client:
+                await client._post("/thing", data={"a": "b" * 100})
+
+            _, _, headers, body = request_log[0]
+            assert headers["Content-Encoding"] == "gzip"
+            assert json.loads(body) == {"a": "b" * 100}
+            assert client.transfer_stats.stats["compressed_requests"] == 1
+
+        run_against_server([web.post("/thing", json_handler({}))], test)
+
+    @mock.patch("dmapiclient.base.logger")
+    def test_quiet_client_logs_nothing(self, logger):
+        async def test(base_url, request_log):
+            async with AsyncBaseAPIClient(base_url, "auth-token", quiet=True) as client:
+                assert await client._get("/thing") == {"thing": 1}
+                with pytest.raises(HTTPError):
+                    await client._get("/missing")
+
+            assert logger.mock_calls == []
+
+        run_against_server([
+            web.get("/thing", json_handler({"thing": 1})),
+            web.get("/missing", json_handler({"error": "Not found"}, status=404)),
+        ], test)
+
+    def test_sync_context_manager_not_allowed(self):
+        with pytest.raises(TypeError):
+            with AsyncBaseAPIClient("http://baseurl", "auth-token"):
+                pass
+
+
+class TestAsyncDataAPIClient(object):
+    def test_shares_endpoint_definitions(self):
+        async def test(base_url, request_log):
+            async with AsyncDataAPIClient(base_url, "auth-token") as client:
+                assert await client.get_framework("g-cloud-12") == {"frameworks": {"slug": "g-cloud-12"}}
+
+            assert request_log[0][:2] == ("GET", "/frameworks/g-cloud-12")
+
+        run_against_server(
+            [web.get("/frameworks/g-cloud-12", json_handler({"frameworks": {"slug": "g-cloud-12"}}))],
+            test,
+        )
+
+    def test_get_service_returns_none_on_404(self):
+        async def test(base_url, request_log):
+            async with AsyncDataAPIClient(base_url, "auth-token") as client:
+                assert await client.get_service(123) is None
+
+        run_against_server([web.get("/services/123", json_handler({"error": "Not found"}, status=404))], test)
+
+    def test_get_user_by_email_address(self):
+        async def test(base_url, request_log):
+            async with AsyncDataAPIClient(base_url, "auth-token") as client:
+                assert await client.get_user(email_address="a@example.com") == {"users": {"id": 1}}
+
+            assert request_log[0][1] == "/users?email_address=a%40example.com"
+
+        run_against_server([web.get("/users", json_handler({"users": [{"id": 1}]}))], test)
+
+    def test_update_user(self):
+        async def test(base_url, request_log):
+            async with AsyncDataAPIClient(base_url, "auth-token") as client:
+                await client.update_user(123, role="supplier", updater="test@example.com")
+
+            assert json.loads(request_log[0][3]) == {"users": {"role": "supplier"}, "updated_by": "test@example.com"}
+
+        run_against_server([web.post("/users/123", json_handler({"users": {}}))], test)
+
+    def test_bulk_get_services(self):
+        routes = [
+            web.get("/services/1", json_handler({"services": {"id": 1}})),
+            web.get("/services/2", json_handler({"error": "Not found"}, status=404)),
+            web.get("/services/3", json_handler({"error": "Forbidden"}, status=403)),
+        ]
+
+        async def test(base_url, request_log):
+            async with AsyncDataAPIClient(base_url, "auth-token") as client:
+                result = await client.get_services([1, 2, 3], max_workers=2)
+
+            assert list(result.items()) == [(1, {"services": {"id": 1}}), (2, None)]
+            assert list(result.errors.keys()) == [3]
+            assert result.errors[3].status_code == 403
+
+        run_against_server(routes, test)
+
+    def test_audit_event_writer(self):
+        async def create(request):
+            payload = (await request.json())["auditEvents"]
+            if payload["objectId"] == "bad":
+                return web.json_response({"error": "Bad object"}, status=400)
+            return web.json_response({"auditEvents": payload}, status=201)
+
+        async def test(base_url, request_log):
+            async with AsyncDataAPIClient(base_url, "auth-token") as client:
+                async with client.audit_event_writer(batch_size=2) as writer:
+                    for object_id in ("1", "bad", "3"):
+                        await writer.add(AuditTypes.contact_update, "user", {}, "suppliers", object_id)
+                    assert len(request_log) == 2
+
+            assert len(request_log) == 3
+            assert writer.stats == {"added": 3, "written": 2, "failed": 1, "pending": 0}
+            assert writer.errors[1].message == "Bad object"
+
+        run_against_server([web.post("/audit-events", create)], test)
+
+    def test_audit_event_writer_flushes_in_background(self):
+        async def create(request):
+            return web.json_response({"auditEvents": (await request.json())["auditEvents"]}, status=201)
+
+        async def test(base_url, request_log):
+            async with AsyncDataAPIClient(base_url, "auth-token") as client:
+                async with client.audit_event_writer(flush_interval=0.05) as writer:
+                    await writer.add(AuditTypes.contact_update, "user", {}, "suppliers", "1")
+                    for _ in range(500):
+                        if writer.stats["written"]:
+                            break
+                        await asyncio.sleep(0.01)
+
+                    assert len(request_log) == 1
+
+                assert writer._flusher.done()
+
+        run_against_server([web.post("/audit-events", create)], test)
+
+    def test_bulk_acknowledge_audit_events(self):
+        async def find(request):
+            return web.json_response({"auditEvents": [
+                {"id": 1, "type": "update_service", "data": {"serviceId": "10"}},
+                {"id": 2, "type": "update_service", "data": {"serviceId": "10"}},
+                {"id": 3, "type": "contact_update", "data": {}},
+            ]})
+
+        async def test(base_url, request_log):
+            async with AsyncDataAPIClient(base_url, "auth-token") as client:
+                acknowledgement = await client.bulk_acknowledge_audit_events(acknowledged_by="user")
+
+            assert sorted((method, path, json.loads(body)) for method, path, _, body in request_log[1:]) == [
+                ("POST", "/audit-events/3/acknowledge", {"updated_by": "user"}),
+                ("POST", "/services/10/updates/acknowledge", {"latestAuditEventId": 2, "updated_by": "user"}),
+            ]
+            assert acknowledgement.stats["acknowledged"] == 3
+
+        run_against_server([
+            web.get("/audit-events", find),
+            web.post("/audit-events/3/acknowledge", json_handler({})),
+            web.post("/services/10/updates/acknowledge", json_handler({})),
+        ], test)
+
+    def test_iter_method_follows_next_links(self):
+        async def first_page(request):
+            if request.query.get("page") == "2":
+                return web.json_response({"services": [{"id": 3}], "links": {}})
+            return web.json_response({
+                "services": [{"id": 1}, {"id": 2}],
+                "links": {"next": str(request.url.with_query(page=2))},
+            })
+
+        async def test(base_url, request_log):
+            async with AsyncDataAPIClient(base_url, "auth-token") as client:
+                results = [service["id"] async for service in client.find_services_iter(framework="g-cloud-12")]
+
+            assert results == [1, 2, 3]
+
+        run_against_server([web.get("/services", first_page)], test)
+
+    def test_find_methods_project_fields(self):
+        async def test(base_url, request_log):
+            async with AsyncDataAPIClient(base_url, "auth-token") as client:
+                result = await client.find_services(framework="g-cloud-12", fields=["id"])
+                results = [service async for service in client.find_services_iter(fields=["id"])]
+
+            assert result == {"services": [{"id": "1"}], "links": {}}
+            assert results == [{"id": "1"}]
+
+        run_against_server([
+            web.get("/services", json_handler({"services": [{"id": "1", "lot": "cloud-hosting"}], "links": {}})),
+        ], test)
+
+    @pytest.mark.parametrize("option", (
+        {"prefetch": 2},
+        {"parallel": 2},
+        {"stream": True},
+        {"resume_from": {"method": "find_services", "url": None, "offset": 1}},
+        {"checkpoint": mock.Mock()},
+    ))
+    def test_iter_method_rejects_unsupported_options(self, option):
+        client = AsyncDataAPIClient("http://baseurl", "auth-token")
+
+        with pytest.raises(ValueError) as e:
+            client.find_services_iter(framework="g-cloud-12", **option)
+
+        assert str(e.value) == "{} isn't supported by the asyncio client's iterators".format(next(iter(option)))
+
+    def test_iter_method_yields_records(self):
+        async def test(base_url, request_log):
+            async with AsyncDataAPIClient(base_url, "auth-token") as client:
+                results = [
+                    (service.id, service.framework_slug)
+                    async for service in client.find_services_iter(framework="g-cloud-12", records=True)
+                ]
+
+            assert results == [("1", "g-cloud-12")]
+
+        run_against_server([
+            web.get("/services", json_handler({"services": [{"id": "1", "frameworkSlug": "g-cloud-12"}], "links": {}})),
+        ], test)
+
+
+class TestAsyncSearchAPIClient(object):
+    def test_delete_ignores_404(self):
+        async def test(base_url, request_log):
+            async with AsyncSearchAPIClient(base_url, "auth-token") as client:
+                assert await client.delete("g-cloud-12", "123") is None
+
+            assert request_log[0][:2] == ("DELETE", "/g-cloud-12/services/123")
+
+        run_against_server([web.delete("/g-cloud-12/services/123", json_handler({"error": "gone"}, status=404))], test)
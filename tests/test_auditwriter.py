@@ -0,0 +1,171 @@
+import time
+
+import mock
+import pytest
+
+from dmapiclient import DataAPIClient, HTTPError
+from dmapiclient.audit import AuditTypes
+from dmapiclient.auditwriter import AuditEventWriter
+
+
+@pytest.fixture
+def data_client():
+    return DataAPIClient('http://baseurl', 'auth-token', True)
+
+
+@pytest.fixture
+def audit_rmock(rmock):
+    """Create audit events, failing those about object "bad" """
+    def create(request, context):
+        payload = request.json()["auditEvents"]
+        if payload.get("objectId") == "bad":
+            context.status_code = 400
+            return {"error": "Bad object"}
+        context.status_code = 201
+        return {"auditEvents": dict(payload, id=len(rmock.request_history))}
+
+    rmock.post("http://baseurl/audit-events", json=create)
+    return rmock
+
+
+@pytest.fixture
+def no_background_flushing():
+    """Stop writers flushing in the background, for tests which move a fake clock on and flush explicitly"""
+    with mock.patch.object(AuditEventWriter, "_start_flusher"):
+        yield
+
+
+def sent_object_ids(rmock):
+    return [request.json()["auditEvents"]["objectId"] for request in rmock.request_history]
+
+
+class TestAuditEventWriter(object):
+    def test_events_sent_in_batches(self, data_client, audit_rmock):
+        writer = data_client.audit_event_writer(batch_size=3, max_workers=1)
+
+        for object_id in ("1", "2", "3", "4"):
+            writer.add(AuditTypes.update_service_status, "user", {"new_status": "published"}, "services", object_id)
+            if object_id == "2":
+                assert audit_rmock.call_count == 0
+
+        assert sent_object_ids(audit_rmock) == ["1", "2", "3"]
+        assert writer.stats == {"added": 4, "written": 3, "failed": 0, "pending": 1}
+        assert audit_rmock.request_history[0].json() == {
+            "auditEvents": {
+                "type": "update_service_status",
+                "user": "user",
+                "data": {"new_status": "published"},
+                "objectType": "services",
+                "objectId": "1",
+            },
+        }
+
+    def test_flush_returns_created_events_by_index(self, data_client, audit_rmock):
+        writer = data_client.audit_event_writer(max_workers=1)
+        writer.add(AuditTypes.contact_update, "user", object_type="suppliers", object_id="1")
+        writer.add(AuditTypes.contact_update, "user", object_type="suppliers", object_id="2")
+
+        result = writer.flush()
+
+        assert list(result.keys()) == [0, 1]
+        assert result[1]["auditEvents"]["objectId"] == "2"
+        assert writer.flush() == {}
+
+    def test_context_manager_flushes_on_exit(self, data_client, audit_rmock):
+        with data_client.audit_event_writer() as writer:
+            writer.add(AuditTypes.contact_update, "user", object_type="suppliers", object_id="1")
+            assert audit_rmock.call_count == 0
+
+        assert audit_rmock.call_count == 1
+        assert writer.stats["pending"] == 0
+
+    @pytest.mark.usefixtures("no_background_flushing")
+    def test_events_sent_once_oldest_has_waited_flush_interval(self, data_client, audit_rmock, clock):
+        writer = AuditEventWriter(data_client, flush_interval=5, max_workers=1, clock=clock)
+
+        writer.add(AuditTypes.contact_update, "user", object_type="suppliers", object_id="1")
+        clock.now += 4
+        writer.add(AuditTypes.contact_update, "user", object_type="suppliers", object_id="2")
+        assert audit_rmock.call_count == 0
+        clock.now += 1
+        writer.add(AuditTypes.contact_update, "user", object_type="suppliers", object_id="3")
+
+        assert sent_object_ids(audit_rmock) == ["1", "2", "3"]
+
+    @pytest.mark.usefixtures("no_background_flushing")
+    def test_waiting_events_flushed_when_due_without_more_being_added(self, data_client, audit_rmock, clock):
+        writer = AuditEventWriter(data_client, flush_interval=5, max_workers=1, clock=clock)
+        writer.add(AuditTypes.contact_update, "user", object_type="suppliers", object_id="1")
+        clock.now += 4
+        writer.add(AuditTypes.contact_update, "user", object_type="suppliers", object_id="2")
+
+        # as the background flusher does, after each wait
+        assert writer._flush_if_due() == {}
+        clock.now += 1
+        result = writer._flush_if_due()
+
+        assert list(result.keys()) == [0, 1]
+        assert sent_object_ids(audit_rmock) == ["1", "2"]
+        assert writer.stats["pending"] == 0
+
+    def test_waiting_events_flushed_in_background(self, data_client, audit_rmock):
+        with data_client.audit_event_writer(flush_interval=0.05, max_workers=1) as writer:
+            writer.add(AuditTypes.contact_update, "user", object_type="suppliers", object_id="1")
+            give_up_at = time.monotonic() + 5
+            while writer.stats["written"] < 1 and time.monotonic() < give_up_at:
+                time.sleep(0.01)
+
+            assert sent_object_ids(audit_rmock) == ["1"]
+
+        assert not writer._flusher.is_alive()
+
+    def test_background_flushing_stopped_on_close(self, data_client, audit_rmock):
+        writer = data_client.audit_event_writer(max_workers=1)
+        writer.add(AuditTypes.contact_update, "user", object_type="suppliers", object_id="1")
+
+        result = writer.close()
+
+        assert list(result.keys()) == [0]
+        assert not writer._flusher.is_alive()
+        writer.add(AuditTypes.contact_update, "user", object_type="suppliers", object_id="2")
+        # only sent by an explicit flush once closed
+        assert writer.stats["pending"] == 1
+
+    def test_failures_reported_per_event(self, data_client, audit_rmock):
+        with data_client.audit_event_writer(batch_size=2, max_workers=1) as writer:
+            for object_id in ("1", "bad", "3"):
+                writer.add(AuditTypes.contact_update, "user", object_type="suppliers", object_id=object_id)
+
+        assert sent_object_ids(audit_rmock) == ["1", "bad", "3"]
+        assert writer.stats == {"added": 3, "written": 2, "failed": 1, "pending": 0}
+        assert list(writer.errors) == [1]
+        [(index, payload, error)] = writer.failed_events
+        assert index == 1
+        assert payload["objectId"] == "bad"
+        assert isinstance(error, HTTPError)
+        assert error.message == "Bad object"
+
+    def test_invalid_audit_type_rejected_when_added(self, data_client):
+        writer = data_client.audit_event_writer()
+
+        with pytest.raises(TypeError):
+            writer.add("contact_update")
+        assert writer.stats["added"] == 0
+
+    @pytest.mark.parametrize("max_workers,expected_max_workers", ((None, 10), (3, 3)))
+    def test_concurrency_defaults_to_pool_size(self, data_client, max_workers, expected_max_workers):
+        writer = data_client.audit_event_writer(max_workers=max_workers)
+        writer.add(AuditTypes.contact_update, "user")
+
+        with mock.patch("dmapiclient.base.fetch_concurrently") as fetch_concurrently:
+            writer.flush()
+
+        assert fetch_concurrently.call_args[0][1:] == ({0: mock.ANY}, expected_max_workers)
+
+    def test_events_sent_concurrently(self, data_client, audit_rmock):
+        with data_client.audit_event_writer(batch_size=50, max_workers=4) as writer:
+            for object_id in range(100):
+                writer.add(AuditTypes.contact_update, "user", object_type="suppliers", object_id=str(object_id))
+
+        assert sorted(sent_object_ids(audit_rmock), key=int) == [str(object_id) for object_id in range(100)]
+        assert writer.stats["written"] == 100
@@ -1,7 +1,12 @@
 # -*- coding: utf-8 -*-
 from contextlib import contextmanager
 from itertools import chain
+import gzip
+import json
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from flask import request
 import requests
@@ -12,11 +17,22 @@ import mock
 from dmtestutils.comparisons import RestrictedAny
 
 from dmapiclient.base import BaseAPIClient
-from dmapiclient import HTTPError, InvalidResponse
+from dmapiclient.data import DataAPIClient
+from dmapiclient.cache import ResponseCache, RevalidationCache
+from dmapiclient import APIError, CircuitOpenError, DeadlineExceeded, HTTPError, InvalidResponse
+from dmapiclient.circuitbreaker import CircuitBreakerPolicy, reset_circuit_breakers
+from dmapiclient.deadlines import deadline
 from dmapiclient.errors import REQUEST_ERROR_STATUS_CODE
 from dmapiclient.exceptions import ImproperlyConfigured
+from dmapiclient.hedging import HedgingPolicy
+from dmapiclient.jsoncodec import StdlibJSONCodec
+from dmapiclient.metrics import InMemoryMetrics
+from dmapiclient.retries import RetryPolicy, _DeadlineRetry
+from dmapiclient.singleflight import SingleFlight
+from dmapiclient.transfer import SUPPORTED_ACCEPT_ENCODING
 
 from urllib3.exceptions import NewConnectionError, ProtocolError, ReadTimeoutError, MaxRetryError
+from urllib3.util.retry import Retry
 
 
 @pytest.yield_fixture
@@ -201,6 +217,46 @@ class TestBaseApiClient(object):
 
         assert rmock.last_request.headers.get("User-Agent").startswith("DM-API-Client/")
 
+    def test_static_headers_built_once(self, base_client, rmock):
+        rmock.get("http://baseurl/", json={})
+
+        first_headers = base_client._build_headers()
+        first_headers["Content-Encoding"] = "gzip"
+        base_client._request('GET', '/')
+
+        assert base_client._static_headers() is base_client._static_headers()
+        assert "Content-Encoding" not in base_client._static_headers()
+        assert "Content-Encoding" not in rmock.last_request.headers
+        assert rmock.last_request.headers["Authorization"] == "Bearer auth-token"
+
+    def test_static_headers_rebuilt_when_auth_token_changes(self, rmock, app):
+        rmock.get("http://baseurl/_status", json={"status": "ok"})
+        client = DataAPIClient("http://baseurl", "auth-token")
+        client.get_status()
+
+        app.config["DM_DATA_API_URL"] = "http://baseurl"
+        app.config["DM_DATA_API_AUTH_TOKEN"] = "rotated-token"
+        client.init_app(app)
+        client.get_status()
+
+        assert [request.headers["Authorization"] for request in rmock.request_history] == [
+            "Bearer auth-token",
+            "Bearer rotated-token",
+        ]
+
+    def test_onwards_request_headers_override_static_headers(self, base_client, rmock, app):
+        rmock.get("http://baseurl/_status", json={"status": "ok"})
+        with app.test_request_context('/'):
+            request.get_onwards_request_headers = mock.Mock(return_value={"user-agent": "Onwards/1.0"})
+            base_client.get_status()
+
+        base_client.get_status()
+
+        assert [request.headers["User-Agent"] for request in rmock.request_history] == [
+            "Onwards/1.0",
+            RestrictedAny(lambda user_agent: user_agent.startswith("DM-API-Client/")),
+        ]
+
     def test_request_always_uses_base_url_scheme(self, base_client, rmock):
         rmock.request(
             "GET",
@@ -457,3 +513,1031 @@ class TestBaseApiClient(object):
                 "api_status": 200,
             }),
         ]
+
+
+class TestBaseApiClientSessions(object):
+    def test_session_is_reused_between_requests(self, base_client, rmock):
+        rmock.get("http://baseurl/", json={}, status_code=200)
+
+        session = base_client._requests_retry_session()
+        base_client._request("GET", "/")
+        base_client._request("GET", "/")
+
+        assert base_client._requests_retry_session() is session
+        assert rmock.call_count == 2
+
+    def test_cookies_are_not_kept_between_requests(self, local_server):
+        cookies_sent = []
+
+        def handle(request_handler):
+            cookies_sent.append(request_handler.headers.get("Cookie"))
+            return 200, {"Content-Type": "application/json", "Set-Cookie": "session=secret; Path=/"}, b"{}"
+
+        local_server.handle = handle
+        client = BaseAPIClient(local_server.url, "auth-token", True)
+        client._request("GET", "/")
+        client._request("GET", "/")
+
+        assert cookies_sent == [None, None]
+        assert len(client._requests_retry_session().cookies) == 0
+
+    def test_separate_session_used_when_not_retrying_read_timeouts(self, base_client):
+        waiting_session = base_client._requests_retry_session(retry_read_timeouts=True)
+        nowait_session = base_client._requests_retry_session(retry_read_timeouts=False)
+
+        assert waiting_session is not nowait_session
+        assert waiting_session.get_adapter("http://baseurl/").max_retries.read == BaseAPIClient.RETRIES
+        assert nowait_session.get_adapter("http://baseurl/").max_retries.read == 0
+
+    def test_pool_size_defaults(self, base_client):
+        adapter = base_client._requests_retry_session().get_adapter("https://baseurl/")
+
+        assert base_client.pool_connections == requests.adapters.DEFAULT_POOLSIZE
+        assert base_client.pool_maxsize == requests.adapters.DEFAULT_POOLSIZE
+        assert adapter._pool_connections == requests.adapters.DEFAULT_POOLSIZE
+        assert adapter._pool_maxsize == requests.adapters.DEFAULT_POOLSIZE
+
+    def test_pool_size_can_be_configured(self):
+        client = BaseAPIClient("http://baseurl", "auth-token", pool_connections=2, pool_maxsize=25)
+        adapter = client._requests_retry_session().get_adapter("https://baseurl/")
+
+        assert client.pool_connections == 2
+        assert client.pool_maxsize == 25
+        assert adapter._pool_connections == 2
+        assert adapter._pool_maxsize == 25
+
+    def test_close_closes_sessions(self, base_client):
+        session = base_client._requests_retry_session()
+
+        with mock.patch.object(session, "close") as close:
+            base_client.close()
+
+        assert close.call_args_list == [mock.call()]
+        # a fresh session is created if the client is used again
+        assert base_client._requests_retry_session() is not session
+
+    def test_context_manager_closes_sessions(self):
+        with mock.patch.object(BaseAPIClient, "close") as close:
+            with BaseAPIClient("http://baseurl", "auth-token") as client:
+                assert isinstance(client, BaseAPIClient)
+                assert close.call_args_list == []
+
+        assert close.call_args_list == [mock.call()]
+
+    def test_sessions_are_dropped_but_not_closed_after_fork(self, base_client):
+        from dmapiclient.base import _reset_clients_after_fork
+
+        session = base_client._requests_retry_session()
+
+        with mock.patch.object(session, "close") as close:
+            _reset_clients_after_fork()
+
+        # closing would tear down sockets that are still in use by the parent process
+        assert close.call_args_list == []
+        assert base_client._requests_retry_session() is not session
+
+
+class RecordingCodec(StdlibJSONCodec):
+    name = "recording"
+
+    def __init__(self):
+        self.dumped = []
+        self.loaded = []
+
+    def dumps(self, obj):
+        self.dumped.append(obj)
+        return super().dumps(obj)
+
+    def loads(self, body):
+        self.loaded.append(body)
+        return super().loads(body)
+
+
+class TestBaseApiClientCodec(object):
+    @pytest.fixture
+    def codec(self):
+        return RecordingCodec()
+
+    @pytest.fixture
+    def codec_client(self, codec):
+        return BaseAPIClient('http://baseurl', 'auth-token', True, codec=codec)
+
+    def test_default_codec(self, base_client):
+        assert base_client.codec is not None
+
+    def test_codec_encodes_request_bodies(self, codec_client, codec, rmock):
+        rmock.post("http://baseurl/thing", json={})
+
+        codec_client._post("/thing", data={"a": "b"})
+
+        assert codec.dumped == [{"a": "b"}]
+        assert rmock.last_request.json() == {"a": "b"}
+        assert rmock.last_request.headers["Content-type"] == "application/json"
+
+    def test_no_body_sent_without_data(self, codec_client, codec, rmock):
+        rmock.get("http://baseurl/thing", json={})
+
+        codec_client._get("/thing")
+
+        assert codec.dumped == []
+        assert rmock.last_request.body is None
+
+    def test_codec_decodes_responses(self, codec_client, codec, rmock):
+        rmock.get("http://baseurl/thing", json={"thing": 1})
+
+        assert codec_client._get("/thing") == {"thing": 1}
+        assert codec.loaded == [b'{"thing": 1}']
+
+    def test_codec_decodes_error_messages(self, codec_client, codec, rmock):
+        rmock.get("http://baseurl/thing", json={"error": "Not found"}, status_code=404)
+
+        with pytest.raises(HTTPError) as e:
+            codec_client._get("/thing")
+
+        assert e.value.message == "Not found"
+        assert codec.loaded[-1] == b'{"error": "Not found"}'
+
+    def test_invalid_response_with_codec(self, codec_client, rmock):
+        rmock.get("http://baseurl/thing", text="<html></html>")
+
+        with pytest.raises(InvalidResponse) as e:
+            codec_client._get("/thing")
+
+        assert e.value.message == "No JSON object could be decoded"
+
+
+class TestBaseApiClientCompression(object):
+    @pytest.fixture
+    def compressing_client(self):
+        return BaseAPIClient('http://baseurl', 'auth-token', True, compress_requests_over=100, codec=StdlibJSONCodec())
+
+    def test_accept_encoding_negotiated(self, base_client, rmock):
+        rmock.get("http://baseurl/thing", json={})
+
+        base_client._get("/thing")
+
+        assert rmock.last_request.headers["Accept-Encoding"] == SUPPORTED_ACCEPT_ENCODING
+
+    def test_requests_not_compressed_by_default(self, base_client, rmock):
+        rmock.post("http://baseurl/thing", json={})
+
+        base_client._post("/thing", data={"a": "b" * 1000})
+
+        assert "Content-Encoding" not in rmock.last_request.headers
+        assert rmock.last_request.json() == {"a": "b" * 1000}
+
+    def test_large_requests_compressed(self, compressing_client, rmock):
+        rmock.post("http://baseurl/thing", json={})
+        data = {"declaration": {"question{}".format(i): "answer" for i in range(20)}}
+
+        compressing_client._post("/thing", data=data)
+
+        assert rmock.last_request.headers["Content-Encoding"] == "gzip"
+        assert json.loads(gzip.decompress(rmock.last_request.body)) == data
+        stats = compressing_client.transfer_stats.stats
+        assert stats["compressed_requests"] == 1
+        assert stats["request_bytes"] == len(json.dumps(data))
+        assert stats["request_wire_bytes"] == len(rmock.last_request.body)
+        assert stats["request_wire_bytes"] < stats["request_bytes"]
+
+    def test_small_requests_not_compressed(self, compressing_client, rmock):
+        rmock.post("http://baseurl/thing", json={})
+
+        compressing_client._post("/thing", data={"a": "b"})
+
+        assert "Content-Encoding" not in rmock.last_request.headers
+        assert rmock.last_request.body == b'{"a": "b"}'
+        assert compressing_client.transfer_stats.stats["compressed_requests"] == 0
+
+    def test_compressed_responses_are_decoded_and_measured(self, base_client, rmock):
+        body = json.dumps({"services": [{"id": i, "lot": "cloud-hosting"} for i in range(100)]}).encode("utf-8")
+        compressed_body = gzip.compress(body)
+        rmock.get("http://baseurl/services", content=compressed_body, headers={"Content-Encoding": "gzip"})
+
+        assert base_client._get("/services") == json.loads(body)
+
+        stats = base_client.transfer_stats.stats
+        assert stats["requests"] == 1
+        assert stats["response_bytes"] == len(body)
+        assert stats["response_wire_bytes"] == len(compressed_body)
+        assert stats["bytes_saved"] == len(body) - len(compressed_body)
+
+
+class TestBaseApiClientMetrics(object):
+    @pytest.fixture
+    def metrics(self):
+        return InMemoryMetrics()
+
+    @pytest.fixture
+    def metrics_client(self, metrics):
+        return DataAPIClient('http://baseurl', 'auth-token', True, metrics=metrics, codec=StdlibJSONCodec())
+
+    def test_requests_recorded_by_endpoint_template(self, metrics_client, metrics, rmock):
+        rmock.get("http://baseurl/services/123", json={"services": {}})
+        rmock.get("http://baseurl/services/456", json={"services": {}})
+
+        metrics_client.get_service(123)
+        metrics_client.get_service(456)
+
+        snapshot = metrics.snapshot()
+        assert list(snapshot) == [("DataAPIClient", "GET", "/services/{service_id}")]
+        assert snapshot["DataAPIClient", "GET", "/services/{service_id}"]["requests"] == 2
+        assert snapshot["DataAPIClient", "GET", "/services/{service_id}"]["status_codes"] == {200: 2}
+        assert snapshot["DataAPIClient", "GET", "/services/{service_id}"]["response_bytes"] == 2 * len(
+            b'{"services": {}}'
+        )
+
+    def test_request_bytes_recorded(self, metrics_client, metrics, rmock):
+        rmock.post("http://baseurl/users/auth", json={"users": {}})
+
+        metrics_client.authenticate_user("user@example.com", "password")
+
+        snapshot = metrics.snapshot()["DataAPIClient", "POST", "/users/auth"]
+        assert snapshot["request_bytes"] == len(rmock.last_request.body)
+
+    def test_failures_recorded(self, metrics_client, metrics, rmock):
+        rmock.get("http://baseurl/briefs/1", json={"error": "Not found"}, status_code=404)
+
+        with pytest.raises(HTTPError):
+            metrics_client.get_brief(1)
+
+        assert metrics.snapshot()["DataAPIClient", "GET", "/briefs/{brief_id}"]["status_codes"] == {404: 1}
+
+    @mock.patch('dmapiclient.base.BaseAPIClient._RETRIES', 2)
+    @mock.patch('dmapiclient.base.BaseAPIClient._RETRIES_BACKOFF_FACTOR', 0)
+    @mock.patch('urllib3.connectionpool.HTTPConnectionPool._make_request')
+    def test_connection_failures_recorded_with_retries(self, _make_request, metrics_client, metrics):
+        _make_request.side_effect = ProtocolError(mock.Mock(), "I'm a message")
+
+        with pytest.raises(HTTPError):
+            metrics_client.get_framework("g-cloud-12")
+
+        snapshot = metrics.snapshot()["DataAPIClient", "GET", "/frameworks/{framework_slug}"]
+        assert snapshot["status_codes"] == {REQUEST_ERROR_STATUS_CODE: 1}
+        assert snapshot["retries"] == 2
+
+    def test_retries_counted_from_urllib3_history(self, base_client):
+        retries = Retry(total=3).increment(method="GET", url="/", error=ProtocolError())
+        retries = retries.increment(method="GET", url="/", error=ProtocolError())
+
+        assert base_client._count_retries(mock.Mock(raw=mock.Mock(retries=retries))) == 2
+        assert base_client._count_retries(None) == 0
+
+    def test_nothing_recorded_without_metrics(self, base_client, rmock):
+        rmock.get("http://baseurl/thing", json={})
+
+        with mock.patch.object(base_client, "_endpoint_normaliser") as _endpoint_normaliser:
+            base_client._get("/thing")
+
+        assert _endpoint_normaliser.called is False
+
+
+class TestBaseApiClientRetryPolicy(object):
+    @mock.patch('urllib3.connectionpool.HTTPConnectionPool._make_request')
+    def test_retries_limited_by_budget(self, _make_request, rmock):
+        rmock.get("http://baseurl/_status", json={"status": "ok"})
+        client = BaseAPIClient(
+            "http://baseurl",
+            "auth-token",
+            retry_policy=RetryPolicy(5, backoff_factor=0, budget_ratio=1, budget_min_retries_per_second=0),
+            metrics=InMemoryMetrics(),
+        )
+        client.get_status()
+        client.get_status()
+        rmock.stop()
+        _make_request.side_effect = ProtocolError(mock.Mock(), "I'm a message")
+
+        with pytest.raises(HTTPError) as e:
+            client._get("/thing")
+
+        # two successes bought two retries
+        assert _make_request.call_count == 3
+        assert e.value.status_code == REQUEST_ERROR_STATUS_CODE
+        assert client.retry_budget.stats == {"successes": 2, "retries": 2, "denied": 1}
+        assert client.metrics.snapshot()["BaseAPIClient", "GET", "/thing"]["retries"] == 2
+
+    @mock.patch('urllib3.connectionpool.HTTPConnectionPool._make_request')
+    def test_retries_overridden_by_endpoint(self, _make_request):
+        client = BaseAPIClient(
+            "http://baseurl",
+            "auth-token",
+            retry_policy=RetryPolicy(
+                3,
+                backoff_factor=0,
+                budget_ratio=None,
+                overrides={"/exports/{slug}": RetryPolicy(0)},
+            ),
+        )
+        _make_request.side_effect = ProtocolError(mock.Mock(), "I'm a message")
+
+        with pytest.raises(HTTPError):
+            client._get("/things/1")
+        assert _make_request.call_count == 4
+
+        _make_request.reset_mock()
+        with pytest.raises(HTTPError):
+            client._get("/exports/g-cloud-12")
+        assert _make_request.call_count == 1
+
+    def test_session_per_policy(self):
+        export_policy = RetryPolicy(0)
+        client = BaseAPIClient(
+            "http://baseurl", "auth-token", retry_policy=RetryPolicy(overrides={"/exports/{slug}": export_policy}),
+        )
+
+        default_session = client._requests_retry_session(retry_policy=client._retry_policy_for("http://baseurl/a"))
+        export_session = client._requests_retry_session(
+            retry_policy=client._retry_policy_for("http://baseurl/exports/g-cloud-12"),
+        )
+
+        assert default_session is not export_session
+        assert default_session.get_adapter("http://baseurl/").max_retries.total == 5
+        assert export_session.get_adapter("http://baseurl/").max_retries.total == 0
+        assert export_session.get_adapter("http://baseurl/").max_retries.budget is client.retry_budget
+        assert client._requests_retry_session(retry_policy=export_policy) is export_session
+
+    def test_default_retries_unchanged_without_policy(self, base_client):
+        assert base_client.retry_policy is None
+        assert base_client.retry_budget is None
+        assert type(base_client._requests_retry_session().get_adapter("http://baseurl/").max_retries) is Retry
+
+
+class TestBaseApiClientCircuitBreaker(object):
+    @pytest.fixture(autouse=True)
+    def reset_circuit_breakers(self):
+        reset_circuit_breakers()
+        yield
+        reset_circuit_breakers()
+
+    @pytest.fixture
+    def policy(self):
+        return CircuitBreakerPolicy(2, reset_timeout=30)
+
+    def test_fails_fast_once_open(self, policy, rmock):
+        rmock.get("http://baseurl/search", json={"error": "Down"}, status_code=500)
+        client = BaseAPIClient("http://baseurl", "auth-token", circuit_breaker=policy)
+
+        for _ in range(2):
+            with pytest.raises(HTTPError) as e:
+                client._get("/search")
+            assert not isinstance(e.value, CircuitOpenError)
+
+        with pytest.raises(CircuitOpenError) as e:
+            client._get("/search")
+
+        assert rmock.call_count == 2
+        assert isinstance(e.value, APIError)
+        assert e.value.status_code == REQUEST_ERROR_STATUS_CODE
+        assert e.value.message.startswith("Not sending request as http://baseurl has been failing")
+        assert client.circuit_breaker.stats["rejected"] == 1
+
+    def test_shared_by_clients_of_same_base_url(self, policy, rmock):
+        rmock.get("http://baseurl/search", json={"error": "Down"}, status_code=503)
+        rmock.get("http://otherurl/search", json={})
+        clients = [
+            BaseAPIClient("http://baseurl", "auth-token", circuit_breaker=policy),
+            DataAPIClient("http://baseurl", "auth-token", circuit_breaker=policy),
+        ]
+        other_client = BaseAPIClient("http://otherurl", "auth-token", circuit_breaker=policy)
+
+        for client in clients:
+            with pytest.raises(HTTPError):
+                client._get("/search")
+
+        assert clients[0].circuit_breaker is clients[1].circuit_breaker
+        for client in clients:
+            with pytest.raises(CircuitOpenError):
+                client._get("/search")
+        assert other_client._get("/search") == {}
+
+    @mock.patch("dmapiclient.circuitbreaker.logger")
+    def test_ignored_policy_warned_about_once(self, logger, policy, rmock):
+        rmock.get("http://baseurl/search", json={})
+        BaseAPIClient("http://baseurl", "auth-token", circuit_breaker=CircuitBreakerPolicy())._get("/search")
+        client = BaseAPIClient("http://baseurl", "auth-token", circuit_breaker=policy)
+
+        for _ in range(5):
+            client._get("/search")
+
+        assert len(logger.warning.mock_calls) == 1
+        assert client.circuit_breaker.policy == CircuitBreakerPolicy()
+
+    def test_circuit_breaker_follows_base_url(self, policy, app):
+        client = DataAPIClient("http://baseurl", "auth-token", circuit_breaker=policy)
+        circuit_breaker = client.circuit_breaker
+
+        app.config["DM_DATA_API_URL"] = "http://otherurl"
+        app.config["DM_DATA_API_AUTH_TOKEN"] = "auth-token"
+        client.init_app(app)
+
+        assert client.circuit_breaker is not circuit_breaker
+        assert client.circuit_breaker.name == "http://otherurl"
+
+    def test_client_errors_dont_open_circuit(self, policy, rmock):
+        rmock.get("http://baseurl/services/1", json={"error": "Not found"}, status_code=404)
+        client = BaseAPIClient("http://baseurl", "auth-token", circuit_breaker=policy)
+
+        for _ in range(3):
+            with pytest.raises(HTTPError) as e:
+                client._get("/services/1")
+            assert e.value.status_code == 404
+
+        assert client.circuit_breaker.state == "closed"
+
+    @mock.patch('urllib3.connectionpool.HTTPConnectionPool._make_request')
+    @mock.patch('dmapiclient.base.BaseAPIClient._RETRIES', 1)
+    @mock.patch('dmapiclient.base.BaseAPIClient._RETRIES_BACKOFF_FACTOR', 0)
+    def test_connection_failures_open_circuit(self, _make_request, policy):
+        _make_request.side_effect = NewConnectionError(mock.Mock(), "I'm a message")
+        client = BaseAPIClient("http://baseurl", "auth-token", circuit_breaker=policy)
+
+        for _ in range(2):
+            with pytest.raises(HTTPError):
+                client._get("/search")
+        with pytest.raises(CircuitOpenError):
+            client._get("/search")
+
+        assert _make_request.call_count == 4
+
+    def test_no_circuit_breaker_by_default(self, base_client):
+        assert base_client.circuit_breaker is None
+
+
+class TestBaseApiClientHedging(object):
+    @staticmethod
+    def _hedging_client(base_url):
+        client = DataAPIClient(
+            base_url,
+            "auth-token",
+            hedging=HedgingPolicy(min_samples=1, min_delay=0, max_hedge_ratio=1),
+        )
+        client.hedger.record_latency("/services/{service_id}", 0.01)
+        return client
+
+    @pytest.fixture
+    def hedging_client(self):
+        with self._hedging_client("http://baseurl") as client:
+            yield client
+
+    @pytest.fixture
+    def served_hedging_client(self, local_server):
+        # requests-mock sends one request at a time, so can't show the two attempts at a request racing
+        with self._hedging_client(local_server.url) as client:
+            yield client
+
+    @pytest.fixture
+    def attempts(self, local_server):
+        """Answer each attempt at a request to ``local_server`` with the function for its turn, by attempt number"""
+        responders = []
+        lock = threading.Lock()
+        attempts_made = []
+
+        def handle(request_handler):
+            with lock:
+                attempt = len(attempts_made)
+                attempts_made.append(request_handler.path)
+            status, body = responders[attempt]()
+            return status, {"Content-Type": "application/json"}, json.dumps(body).encode("utf-8")
+
+        local_server.handle = handle
+        yield responders
+        assert len(attempts_made) <= len(responders)
+
+    def test_slow_requests_hedged(self, served_hedging_client, attempts):
+        release_first_attempt = threading.Event()
+
+        def first_attempt():
+            release_first_attempt.wait(5)
+            return 200, {"services": {"from": "first attempt"}}
+
+        attempts.extend([first_attempt, lambda: (200, {"services": {"from": "hedge"}})])
+
+        start_time = time.perf_counter()
+        try:
+            assert served_hedging_client.get_service(1) == {"services": {"from": "hedge"}}
+            # without waiting for the first attempt
+            assert time.perf_counter() - start_time < 1
+        finally:
+            release_first_attempt.set()
+        assert served_hedging_client.hedger.stats == {"requests": 1, "hedged": 1, "hedges_won": 1}
+
+    def test_fast_requests_not_hedged(self, hedging_client, rmock):
+        rmock.get("http://baseurl/services/1", json={"services": {}})
+        hedging_client.hedger.record_latency("/services/{service_id}", 5)
+
+        assert hedging_client.get_service(1) == {"services": {}}
+        assert rmock.call_count == 1
+        assert hedging_client.hedger.stats["hedged"] == 0
+
+    @mock.patch('dmapiclient.base.BaseAPIClient._RETRIES', 0)
+    def test_hedge_used_if_first_attempt_fails(self, served_hedging_client, attempts):
+        hedge_started = threading.Event()
+
+        def first_attempt():
+            hedge_started.wait(5)
+            return 500, {"error": "Oops"}
+
+        def hedge():
+            hedge_started.set()
+            # giving the first attempt time to fail
+            time.sleep(0.1)
+            return 200, {"services": {"from": "hedge"}}
+
+        attempts.extend([first_attempt, hedge])
+
+        assert served_hedging_client.get_service(1) == {"services": {"from": "hedge"}}
+        assert served_hedging_client.hedger.stats["hedges_won"] == 1
+
+    @mock.patch('dmapiclient.base.BaseAPIClient._RETRIES', 0)
+    def test_first_error_raised_if_both_fail(self, served_hedging_client, attempts):
+        hedge_started = threading.Event()
+
+        def first_attempt():
+            hedge_started.wait(5)
+            return 500, {"error": "First"}
+
+        def hedge():
+            hedge_started.set()
+            return 503, {"error": "Hedge"}
+
+        attempts.extend([first_attempt, hedge])
+
+        with pytest.raises(HTTPError) as e:
+            served_hedging_client.get_service(1)
+        assert e.value.message == "First"
+
+    def test_requests_not_hedged_while_every_hedging_thread_is_busy(self, served_hedging_client, attempts):
+        release_first_attempt = threading.Event()
+
+        def first_attempt():
+            release_first_attempt.wait(0.2)
+            return 200, {"services": {"from": "first attempt"}}
+
+        attempts.append(first_attempt)
+        _, free_threads = served_hedging_client._get_hedging_executor()
+        while free_threads.acquire(blocking=False):
+            pass
+
+        assert served_hedging_client.get_service(1) == {"services": {"from": "first attempt"}}
+        assert served_hedging_client.hedger.stats == {"requests": 1, "hedged": 0, "hedges_won": 0}
+
+    def test_hedging_threads_can_be_limited(self):
+        client = DataAPIClient("http://baseurl", "auth-token", hedging=HedgingPolicy(max_workers=3))
+        executor, _ = client._get_hedging_executor()
+
+        assert executor._max_workers == 3
+
+    def test_requests_sent_on_callers_thread_while_no_hedge_could_be_sent(self, rmock):
+        rmock.get("http://baseurl/services/1", json={"services": {}})
+        client = DataAPIClient("http://baseurl", "auth-token", hedging=HedgingPolicy(min_samples=1, min_delay=0))
+        client.hedger.record_latency("/services/{service_id}", 0.01)
+
+        with mock.patch.object(client, "_get_hedging_executor") as _get_hedging_executor:
+            for _ in range(10):
+                client.get_service(1)
+
+        # with the default max_hedge_ratio of 5%, none of the first 10 requests could have been hedged
+        assert _get_hedging_executor.called is False
+        assert client.hedger.stats == {"requests": 10, "hedged": 0, "hedges_won": 0}
+
+    def test_unsafe_methods_not_hedged(self, hedging_client, rmock):
+        rmock.post("http://baseurl/services/1", json={"services": {}})
+
+        with mock.patch.object(hedging_client, "_get_hedging_executor") as _get_hedging_executor:
+            hedging_client._post("/services/1", {})
+
+        assert _get_hedging_executor.called is False
+        assert hedging_client.hedger.stats["requests"] == 0
+
+    def test_first_requests_timed(self, rmock):
+        rmock.get("http://baseurl/services/1", json={"services": {}})
+        client = DataAPIClient("http://baseurl", "auth-token", hedging=HedgingPolicy(min_samples=2, max_hedge_ratio=1))
+
+        client.get_service(1)
+        assert client.hedger.delay_for("/services/{service_id}") is None
+        client.get_service(1)
+        assert client.hedger.delay_for("/services/{service_id}") is not None
+
+
+class TestBaseApiClientSingleFlight(object):
+    @pytest.fixture
+    def single_flight_client(self):
+        client = DataAPIClient("http://baseurl", "auth-token", single_flight=SingleFlight())
+        yield client
+        client.close()
+
+    @pytest.fixture
+    def served_client(self, local_server):
+        # requests-mock sends one request at a time, so identical requests through it are never in flight together
+        client = DataAPIClient(local_server.url, "auth-token", single_flight=SingleFlight())
+        yield client
+        client.close()
+
+    def get_concurrently(self, single_flight, local_server, gets, *, status_code=200, body):
+        """Call each of ``gets`` concurrently, with requests to ``local_server`` held until every one has been called.
+
+        Returns the result of each call, and the paths requested.
+        """
+        release = threading.Event()
+        lock = threading.Lock()
+        requested = []
+
+        def handle(request_handler):
+            with lock:
+                requested.append(request_handler.path)
+            release.wait(5)
+            return status_code, {"Content-Type": "application/json"}, json.dumps(body).encode("utf-8")
+
+        local_server.handle = handle
+
+        def call(get):
+            try:
+                return get()
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(len(gets)) as executor:
+            futures = [executor.submit(call, get) for get in gets]
+            while single_flight.stats["calls"] < len(gets):
+                time.sleep(0.001)
+            release.set()
+            return [future.result() for future in futures], requested
+
+    def test_identical_concurrent_gets_share_a_request(self, served_client, local_server):
+        results, requested = self.get_concurrently(
+            served_client.single_flight, local_server,
+            [lambda: served_client.get_service(1)] * 3,
+            body={"services": {"id": 1}},
+        )
+
+        assert results == [{"services": {"id": 1}}] * 3
+        assert requested == ["/services/1"]
+        # each caller gets its own copy
+        assert len({id(result) for result in results}) == 3
+        assert served_client.single_flight.key_stats() == {
+            "/services/{service_id}": {"calls": 3, "coalesced": 2},
+        }
+
+    @mock.patch('dmapiclient.base.BaseAPIClient._RETRIES', 0)
+    def test_errors_raised_to_every_caller(self, served_client, local_server):
+        results, requested = self.get_concurrently(
+            served_client.single_flight, local_server,
+            [lambda: served_client.get_service(1)] * 3,
+            status_code=500, body={"error": "Oops"},
+        )
+
+        assert [(type(result), result.message) for result in results] == [(HTTPError, "Oops")] * 3
+        assert requested == ["/services/1"]
+
+    def test_waiting_gets_keep_to_their_own_deadline(self, served_client, local_server):
+        release = threading.Event()
+
+        def handle(request_handler):
+            release.wait(2)
+            return 200, {"Content-Type": "application/json"}, b'{"services": {}}'
+
+        local_server.handle = handle
+
+        with ThreadPoolExecutor(1) as executor:
+            leader = executor.submit(served_client.get_service, 1)
+            while served_client.single_flight.stats["in_flight"] < 1:
+                time.sleep(0.001)
+
+            start_time = time.perf_counter()
+            with deadline(0.3), pytest.raises(DeadlineExceeded):
+                served_client.get_service(1)
+            assert time.perf_counter() - start_time < 1
+
+            release.set()
+            assert leader.result() == {"services": {}}
+
+    def test_gets_with_different_auth_tokens_not_shared(self, local_server):
+        single_flight = SingleFlight()
+        client = DataAPIClient(local_server.url, "auth-token", single_flight=single_flight)
+        other_client = DataAPIClient(local_server.url, "other-auth-token", single_flight=single_flight)
+
+        try:
+            results, requested = self.get_concurrently(
+                single_flight, local_server,
+                [lambda: client.get_service(1), lambda: other_client.get_service(1)],
+                body={"services": {}},
+            )
+        finally:
+            client.close()
+            other_client.close()
+
+        assert requested == ["/services/1"] * 2
+        assert single_flight.stats["coalesced"] == 0
+
+    def test_stats_kept_by_endpoint(self, single_flight_client, rmock):
+        rmock.get("http://baseurl/services/1", json={"services": {"id": 1}})
+        rmock.get("http://baseurl/services/2", json={"services": {"id": 2}})
+
+        single_flight_client.get_service(1)
+        single_flight_client.get_service(2)
+
+        assert rmock.call_count == 2
+        assert single_flight_client.single_flight.key_stats() == {
+            "/services/{service_id}": {"calls": 2, "coalesced": 0},
+        }
+
+    def test_other_methods_not_shared(self, single_flight_client, rmock):
+        rmock.post("http://baseurl/services/1", json={})
+        rmock.get("http://baseurl/services/1", json={}, status_code=202)
+
+        single_flight_client._post("/services/1", {})
+        single_flight_client._get("/services/1", client_wait_for_response=False)
+
+        assert single_flight_client.single_flight.stats["calls"] == 0
+
+
+class TestBaseApiClientDeadlines(object):
+    def test_timeouts_cut_to_time_left(self, base_client, rmock):
+        rmock.get("http://baseurl/", json={})
+
+        with deadline(10):
+            base_client._get("/")
+
+        connect_timeout, read_timeout = rmock.last_request.timeout
+        assert 9 < connect_timeout <= 10
+        assert 9 < read_timeout <= 10
+
+    def test_timeouts_unchanged_without_deadline(self, base_client, rmock):
+        rmock.get("http://baseurl/", json={})
+
+        base_client._get("/")
+
+        assert rmock.last_request.timeout == base_client.timeout
+
+    def test_passed_deadline_fails_fast(self, base_client, rmock):
+        with deadline(0):
+            with pytest.raises(DeadlineExceeded) as e:
+                base_client._get("/")
+
+        assert e.value.message == "Not sending request as its deadline has passed"
+        assert rmock.called is False
+
+    def test_failure_after_deadline_passed_raises_deadline_exceeded(self, base_client, rmock):
+        def time_out(request, context):
+            time.sleep(0.02)
+            raise requests.exceptions.ReadTimeout()
+
+        rmock.get("http://baseurl/", json=time_out)
+
+        with deadline(0.01):
+            with pytest.raises(DeadlineExceeded):
+                base_client._get("/")
+
+    def test_failure_before_deadline_raises_http_error(self, base_client, rmock):
+        rmock.get("http://baseurl/", status_code=500, json={"error": "Oops"})
+
+        with deadline(10):
+            with pytest.raises(HTTPError) as e:
+                base_client._get("/")
+
+        assert not isinstance(e.value, DeadlineExceeded)
+        assert e.value.message == "Oops"
+
+    def test_deadline_aware_retries_only_used_with_deadline(self, base_client):
+        deadline_session = base_client._requests_retry_session(deadline=True)
+
+        assert deadline_session is not base_client._requests_retry_session()
+        assert type(deadline_session.get_adapter("http://baseurl/").max_retries) is _DeadlineRetry
+        assert deadline_session.get_adapter("http://baseurl/").max_retries.total == 5
+
+    def test_deadline_given_up_on_not_a_circuit_failure(self, rmock):
+        reset_circuit_breakers()
+        client = BaseAPIClient("http://baseurl", "auth-token", circuit_breaker=CircuitBreakerPolicy(1))
+        rmock.get("http://baseurl/", exc=requests.exceptions.ReadTimeout)
+
+        # the deadline passes while the request is in flight
+        with mock.patch("dmapiclient.deadlines.remaining", side_effect=[1., -1.]):
+            with pytest.raises(DeadlineExceeded):
+                client._get("/")
+
+        assert client.circuit_breaker.stats["consecutive_failures"] == 0
+        reset_circuit_breakers()
+
+
+class TestBaseApiClientRequestLogging(object):
+    @pytest.fixture
+    def api_logger(self):
+        api_logger = logging.getLogger("dmapiclient.base")
+        original_level = api_logger.level
+        yield api_logger
+        api_logger.setLevel(original_level)
+
+    def test_disabled_levels_not_logged(self, base_client, rmock, api_logger):
+        rmock.get("http://baseurl/thing", json={})
+        api_logger.setLevel(logging.WARNING)
+
+        with mock.patch.object(api_logger, "log") as log:
+            base_client._get("/thing")
+
+        assert log.called is False
+
+    def test_failure_message_not_built_when_level_disabled(self, base_client, rmock, api_logger):
+        rmock.get("http://baseurl/thing", json={"error": "Not found"}, status_code=404)
+        api_logger.setLevel(logging.WARNING)
+
+        with mock.patch.object(api_logger, "log") as log, \
+                mock.patch.object(HTTPError, "message", new_callable=mock.PropertyMock) as message:
+            with pytest.raises(HTTPError):
+                base_client._get("/thing")
+
+        assert log.called is False
+        assert message.called is False
+
+    def test_enabled_failures_still_logged(self, base_client, rmock, api_logger):
+        rmock.get("http://baseurl/thing", json={"error": "Oops"}, status_code=500)
+        api_logger.setLevel(logging.WARNING)
+
+        with mock.patch.object(api_logger, "log") as log:
+            with pytest.raises(HTTPError):
+                base_client._get("/thing")
+
+        assert log.call_args_list == [
+            mock.call(logging.WARNING, "API {api_method} request on {api_url} failed with {api_status} '{api_error}'",
+                      extra={
+                          "api_method": "GET",
+                          "api_url": "http://baseurl/thing",
+                          "api_status": 500,
+                          "api_error": mock.ANY,
+                          "api_time": mock.ANY,
+                      }),
+        ]
+
+    @pytest.mark.parametrize("response_status", (200, 500))
+    @mock.patch("dmapiclient.base.logger")
+    def test_quiet_client_logs_nothing(self, logger, response_status, rmock, app):
+        client = BaseAPIClient("http://baseurl", "auth-token", True, quiet=True)
+        rmock.get("http://baseurl/thing", json={}, status_code=response_status)
+        app.config["DM_SPAN_ID_HEADERS"] = ("X-Brian-Tweedy",)
+
+        with app.test_request_context('/'), mock.patch.object(client, "_child_span_id") as _child_span_id:
+            request.get_onwards_request_headers = mock.Mock(return_value={"X-Brian-Tweedy": "Amiens Street"})
+            try:
+                client._get("/thing")
+            except HTTPError:
+                pass
+
+        assert client.quiet is True
+        assert logger.mock_calls == []
+        assert _child_span_id.called is False
+        assert rmock.last_request.headers["X-Brian-Tweedy"] == "Amiens Street"
+
+
+class TestBaseApiClientResponseCache(object):
+    @pytest.fixture
+    def cache(self):
+        return ResponseCache({"/frameworks": 60, "/frameworks/{slug}": 60})
+
+    @pytest.fixture
+    def cached_client(self, cache):
+        return BaseAPIClient('http://baseurl', 'auth-token', True, cache=cache)
+
+    def test_cacheable_get_served_from_cache(self, cached_client, cache, rmock):
+        rmock.get("http://baseurl/frameworks/g-cloud-12", json={"frameworks": {"slug": "g-cloud-12"}})
+
+        first = cached_client._get("/frameworks/g-cloud-12")
+        first["frameworks"]["mutated"] = True
+        second = cached_client._get("/frameworks/g-cloud-12")
+
+        assert rmock.call_count == 1
+        # each caller gets its own copy of the response
+        assert second == {"frameworks": {"slug": "g-cloud-12"}}
+        assert cache.stats["hits"] == 1
+        assert cache.stats["misses"] == 1
+
+    def test_other_gets_not_cached(self, cached_client, cache, rmock):
+        rmock.get("http://baseurl/frameworks/g-cloud-12/stats", json={})
+
+        cached_client._get("/frameworks/g-cloud-12/stats")
+        cached_client._get("/frameworks/g-cloud-12/stats")
+
+        assert rmock.call_count == 2
+        assert cache.stats["entries"] == 0
+
+    def test_query_strings_are_cached_separately(self, cached_client, rmock):
+        rmock.get("http://baseurl/frameworks?a=1", json={"a": 1})
+        rmock.get("http://baseurl/frameworks?a=2", json={"a": 2})
+
+        assert cached_client._get("/frameworks", params={"a": 1}) == {"a": 1}
+        assert cached_client._get("/frameworks", params={"a": 2}) == {"a": 2}
+        assert cached_client._get("/frameworks", params={"a": 1}) == {"a": 1}
+
+        assert rmock.call_count == 2
+
+    def test_clients_with_different_tokens_dont_share_entries(self, cached_client, cache, rmock):
+        rmock.get("http://baseurl/frameworks", json={})
+        other_client = BaseAPIClient('http://baseurl', 'other-token', True, cache=cache)
+
+        cached_client._get("/frameworks")
+        other_client._get("/frameworks")
+
+        assert rmock.call_count == 2
+
+    @pytest.mark.parametrize("method", ("POST", "PUT", "PATCH", "DELETE"))
+    def test_writes_invalidate_related_entries(self, cached_client, rmock, method):
+        rmock.get("http://baseurl/frameworks", json={})
+        rmock.get("http://baseurl/frameworks/g-cloud-12", json={})
+        rmock.request(method, "http://baseurl/frameworks/g-cloud-12", json={})
+
+        cached_client._get("/frameworks")
+        cached_client._get("/frameworks/g-cloud-12")
+        cached_client._request(method, "/frameworks/g-cloud-12", data={})
+        cached_client._get("/frameworks")
+        cached_client._get("/frameworks/g-cloud-12")
+
+        assert [request.method for request in rmock.request_history] == ["GET", "GET", method, "GET", "GET"]
+
+    def test_failed_writes_still_invalidate(self, cached_client, rmock):
+        rmock.get("http://baseurl/frameworks/g-cloud-12", json={})
+        rmock.post("http://baseurl/frameworks/g-cloud-12", json={"error": "nope"}, status_code=400)
+
+        cached_client._get("/frameworks/g-cloud-12")
+        with pytest.raises(HTTPError):
+            cached_client._post("/frameworks/g-cloud-12", data={})
+        cached_client._get("/frameworks/g-cloud-12")
+
+        assert rmock.call_count == 3
+
+    def test_errors_are_not_cached(self, cached_client, cache, rmock):
+        rmock.get("http://baseurl/frameworks/g-cloud-12", json={"error": "Not found"}, status_code=404)
+
+        for _ in range(2):
+            with pytest.raises(HTTPError):
+                cached_client._get("/frameworks/g-cloud-12")
+
+        assert rmock.call_count == 2
+        assert cache.stats["entries"] == 0
+
+    def test_invalid_responses_are_not_cached(self, cached_client, cache, rmock):
+        rmock.get("http://baseurl/frameworks/g-cloud-12", text="not json")
+
+        with pytest.raises(InvalidResponse):
+            cached_client._get("/frameworks/g-cloud-12")
+
+        assert cache.stats["entries"] == 0
+
+
+class TestBaseApiClientRevalidationCache(object):
+    @pytest.fixture
+    def cache(self):
+        return RevalidationCache(["/suppliers/export/{framework_slug}"])
+
+    @pytest.fixture
+    def revalidating_client(self, cache):
+        return BaseAPIClient('http://baseurl', 'auth-token', True, revalidation_cache=cache)
+
+    def test_first_request_is_unconditional(self, revalidating_client, rmock):
+        rmock.get("http://baseurl/suppliers/export/g-cloud-12", json={"suppliers": []}, headers={"ETag": '"v1"'})
+
+        assert revalidating_client._get("/suppliers/export/g-cloud-12") == {"suppliers": []}
+        assert "If-None-Match" not in rmock.last_request.headers
+
+    def test_sends_validators_and_uses_stored_body_when_not_modified(self, revalidating_client, cache, rmock):
+        rmock.get("http://baseurl/suppliers/export/g-cloud-12", [
+            {"json": {"suppliers": [1]}, "headers": {"ETag": '"v1"', "Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT"}},
+            {"status_code": 304},
+        ])
+
+        revalidating_client._get("/suppliers/export/g-cloud-12")
+        assert revalidating_client._get("/suppliers/export/g-cloud-12") == {"suppliers": [1]}
+
+        assert rmock.last_request.headers["If-None-Match"] == '"v1"'
+        assert rmock.last_request.headers["If-Modified-Since"] == "Wed, 21 Oct 2015 07:28:00 GMT"
+        assert cache.stats["not_modified"] == 1
+        assert cache.stats["bytes_saved"] == len(b'{"suppliers": [1]}')
+
+    def test_modified_response_replaces_stored_body(self, revalidating_client, cache, rmock):
+        rmock.get("http://baseurl/suppliers/export/g-cloud-12", [
+            {"json": {"suppliers": [1]}, "headers": {"ETag": '"v1"'}},
+            {"json": {"suppliers": [2]}, "headers": {"ETag": '"v2"'}},
+            {"status_code": 304},
+        ])
+
+        revalidating_client._get("/suppliers/export/g-cloud-12")
+        assert revalidating_client._get("/suppliers/export/g-cloud-12") == {"suppliers": [2]}
+        assert revalidating_client._get("/suppliers/export/g-cloud-12") == {"suppliers": [2]}
+
+        assert rmock.last_request.headers["If-None-Match"] == '"v2"'
+        assert cache.stats["modified"] == 1
+
+    def test_other_endpoints_are_not_revalidated(self, revalidating_client, cache, rmock):
+        rmock.get("http://baseurl/suppliers", json={}, headers={"ETag": '"v1"'})
+
+        revalidating_client._get("/suppliers")
+        revalidating_client._get("/suppliers")
+
+        assert "If-None-Match" not in rmock.last_request.headers
+        assert cache.stats["entries"] == 0
+
+    def test_clients_with_different_tokens_dont_share_entries(self, revalidating_client, cache, rmock):
+        rmock.get("http://baseurl/suppliers/export/g-cloud-12", json={}, headers={"ETag": '"v1"'})
+        other_client = BaseAPIClient('http://baseurl', 'other-token', True, revalidation_cache=cache)
+
+        revalidating_client._get("/suppliers/export/g-cloud-12")
+        other_client._get("/suppliers/export/g-cloud-12")
+
+        assert "If-None-Match" not in rmock.last_request.headers
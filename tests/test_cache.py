@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from dmapiclient.cache import ResponseCache, RevalidationCache, ValidatedResponse
+from dmapiclient.routes import EndpointTemplate, url_path
+
+
+class TestEndpointTemplate(object):
+    @pytest.mark.parametrize("template,path,expected", (
+        ("/frameworks", "/frameworks", True),
+        ("/frameworks", "/frameworks/", True),
+        ("/frameworks", "/frameworks/g-cloud-12", False),
+        ("/frameworks/{slug}", "/frameworks/g-cloud-12", True),
+        ("/frameworks/{slug}", "/frameworks", False),
+        ("/frameworks/{slug}", "/frameworks/g-cloud-12/stats", False),
+        ("/frameworks/{slug}/stats", "/frameworks/g-cloud-12/stats", True),
+        ("/suppliers/{}/frameworks", "/suppliers/123/frameworks", True),
+        ("/suppliers/{}/frameworks", "/suppliers/frameworks", False),
+    ))
+    def test_matches(self, template, path, expected):
+        assert EndpointTemplate(template).matches(path) is expected
+
+
+class TestUrlPath(object):
+    @pytest.mark.parametrize("url,base_url,expected", (
+        ("http://baseurl/frameworks?page=2", "http://baseurl", "/frameworks"),
+        ("http://baseurl", "http://baseurl", "/"),
+        ("http://baseurl/api/frameworks", "http://baseurl/api/", "/frameworks"),
+        ("http://baseurl/apiary/frameworks", "http://baseurl/api", "/apiary/frameworks"),
+        ("http://baseurl/frameworks", None, "/frameworks"),
+    ))
+    def test_url_path(self, url, base_url, expected):
+        assert url_path(url, base_url) == expected
+
+
+class TestResponseCache(object):
+    def test_ttl_for(self):
+        cache = ResponseCache({"/frameworks": 10, "/frameworks/{slug}": 20})
+
+        assert cache.ttl_for("/frameworks") == 10
+        assert cache.ttl_for("/frameworks/g-cloud-12") == 20
+        assert cache.ttl_for("/frameworks/g-cloud-12/stats") is None
+
+    def test_get_and_set(self, clock):
+        cache = ResponseCache({}, clock=clock)
+
+        assert cache.get("a") is None
+        cache.set("a", "/a", b"{}", 10)
+        assert cache.get("a") == b"{}"
+
+        assert cache.stats == {
+            "hits": 1, "misses": 1, "evictions": 0, "invalidations": 0, "entries": 1, "bytes": 2,
+        }
+
+    def test_entries_expire(self, clock):
+        cache = ResponseCache({}, clock=clock)
+        cache.set("a", "/a", b"{}", 10)
+
+        clock.now += 9.9
+        assert cache.get("a") == b"{}"
+        clock.now += 0.1
+        assert cache.get("a") is None
+        assert cache.stats["entries"] == 0
+
+    def test_least_recently_used_evicted_beyond_max_entries(self, clock):
+        cache = ResponseCache({}, max_entries=2, clock=clock)
+        cache.set("a", "/a", b"1", 10)
+        cache.set("b", "/b", b"2", 10)
+        cache.get("a")
+        cache.set("c", "/c", b"3", 10)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == b"1"
+        assert cache.get("c") == b"3"
+        assert cache.stats["evictions"] == 1
+
+    def test_bounded_by_bytes(self, clock):
+        cache = ResponseCache({}, max_bytes=10, clock=clock)
+        cache.set("a", "/a", b"1234", 10)
+        cache.set("b", "/b", b"5678", 10)
+        cache.set("c", "/c", b"90ab", 10)
+
+        assert cache.get("a") is None
+        assert cache.stats["bytes"] == 8
+
+        # too big to ever be held
+        cache.set("d", "/d", b"x" * 11, 10)
+        assert cache.get("d") is None
+        assert cache.stats["bytes"] == 8
+
+    def test_replacing_an_entry_updates_size(self, clock):
+        cache = ResponseCache({}, clock=clock)
+        cache.set("a", "/a", b"1234", 10)
+        cache.set("a", "/a", b"12", 10)
+
+        assert cache.stats["bytes"] == 2
+        assert cache.stats["entries"] == 1
+
+    def test_invalidate_drops_overlapping_paths(self, clock):
+        cache = ResponseCache({}, clock=clock)
+        for path in ("/frameworks", "/frameworks/g-cloud-12", "/frameworks/g-cloud-12/stats", "/frameworks/g-cloud-11",
+                     "/frameworks/g-cloud-120"):
+            cache.set(path, path, b"{}", 10)
+
+        cache.invalidate("/frameworks/g-cloud-12")
+
+        assert [path for path in ("/frameworks", "/frameworks/g-cloud-12", "/frameworks/g-cloud-12/stats",
+                                  "/frameworks/g-cloud-11", "/frameworks/g-cloud-120") if cache.get(path)] == [
+            "/frameworks/g-cloud-11", "/frameworks/g-cloud-120",
+        ]
+        assert cache.stats["invalidations"] == 3
+
+    def test_clear(self, clock):
+        cache = ResponseCache({}, clock=clock)
+        cache.set("a", "/a", b"{}", 10)
+        cache.clear()
+
+        assert cache.get("a") is None
+        assert cache.stats["bytes"] == 0
+
+
+class TestValidatedResponse(object):
+    @pytest.mark.parametrize("etag,last_modified,expected", (
+        ('"abc"', None, {"If-None-Match": '"abc"'}),
+        (None, "Wed, 21 Oct 2015 07:28:00 GMT", {"If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT"}),
+        ('"abc"', "Wed, 21 Oct 2015 07:28:00 GMT", {
+            "If-None-Match": '"abc"',
+            "If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT",
+        }),
+    ))
+    def test_conditional_headers(self, etag, last_modified, expected):
+        assert ValidatedResponse(b"{}", etag, last_modified).conditional_headers == expected
+
+
+class TestRevalidationCache(object):
+    def test_handles_everything_by_default(self):
+        assert RevalidationCache().handles("/anything/at/all")
+
+    def test_handles_only_given_endpoints(self):
+        cache = RevalidationCache(["/suppliers/export/{framework_slug}"])
+
+        assert cache.handles("/suppliers/export/g-cloud-12")
+        assert not cache.handles("/suppliers")
+
+    def test_store_and_get(self):
+        cache = RevalidationCache()
+        cache.store("a", b'{"a": 1}', '"etag"', None)
+
+        validated = cache.get("a")
+        assert (validated.body, validated.etag, validated.last_modified) == (b'{"a": 1}', '"etag"', None)
+        assert cache.get("b") is None
+
+    def test_responses_without_validators_are_not_stored(self):
+        cache = RevalidationCache()
+        cache.store("a", b'{"a": 1}', '"etag"', None)
+        cache.store("a", b'{"a": 2}', None, None)
+
+        assert cache.get("a") is None
+        assert cache.stats["entries"] == 0
+
+    def test_stats(self):
+        cache = RevalidationCache()
+        cache.store("a", b"12345", '"1"', None)
+        cache.record_not_modified(cache.get("a"))
+        cache.record_not_modified(cache.get("a"))
+        cache.store("a", b"123", '"2"', None)
+
+        assert cache.stats == {"not_modified": 2, "modified": 1, "bytes_saved": 10, "entries": 1, "bytes": 3}
+
+    def test_bounded_by_entries(self):
+        cache = RevalidationCache(max_entries=2)
+        for key in ("a", "b", "c"):
+            cache.store(key, b"{}", '"etag"', None)
+
+        assert cache.get("a") is None
+        assert cache.stats["entries"] == 2
+
+    def test_clear(self):
+        cache = RevalidationCache()
+        cache.store("a", b"{}", '"etag"', None)
+        cache.clear()
+
+        assert cache.get("a") is None
+        assert cache.stats["bytes"] == 0
@@ -0,0 +1,31 @@
+from dmapiclient.checkpoints import FileCheckpointStore
+
+
+class TestFileCheckpointStore(object):
+    def test_load_without_checkpoint(self, tmp_path):
+        assert FileCheckpointStore(str(tmp_path / "checkpoint.json")).load() is None
+
+    def test_save_and_load(self, tmp_path):
+        store = FileCheckpointStore(str(tmp_path / "checkpoint.json"))
+        cursor = {"method": "find_services", "url": "http://baseurl/services?page=2", "offset": 3}
+        store.save(cursor)
+
+        assert FileCheckpointStore(str(tmp_path / "checkpoint.json")).load() == cursor
+        assert [path.name for path in tmp_path.iterdir()] == ["checkpoint.json"]
+
+    def test_save_replaces_checkpoint(self, tmp_path):
+        store = FileCheckpointStore(str(tmp_path / "checkpoint.json"))
+        store.save({"method": "find_services", "url": None, "offset": 1})
+        store.save({"method": "find_services", "url": "http://baseurl/services?page=2", "offset": 0})
+
+        assert store.load() == {"method": "find_services", "url": "http://baseurl/services?page=2", "offset": 0}
+
+    def test_clear(self, tmp_path):
+        store = FileCheckpointStore(str(tmp_path / "checkpoint.json"))
+        store.save({"method": "find_services", "url": None, "offset": 1})
+        store.clear()
+
+        assert store.load() is None
+        assert list(tmp_path.iterdir()) == []
+        # clearing again is fine
+        store.clear()
@@ -0,0 +1,155 @@
+import mock
+import pytest
+
+from dmapiclient.circuitbreaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitBreakerPolicy,
+    circuit_breaker_for,
+    reset_circuit_breakers,
+)
+from dmapiclient.errors import HTTPError
+
+
+@pytest.fixture
+def circuit_breaker(clock):
+    return CircuitBreaker("http://baseurl", CircuitBreakerPolicy(3, reset_timeout=10), clock=clock)
+
+
+def fail(circuit_breaker, times):
+    for _ in range(times):
+        assert circuit_breaker.allow_request() is True
+        circuit_breaker.record_failure()
+
+
+class TestCircuitBreaker(object):
+    def test_opens_after_consecutive_failures(self, circuit_breaker):
+        fail(circuit_breaker, 2)
+        assert circuit_breaker.state == CLOSED
+
+        fail(circuit_breaker, 1)
+        assert circuit_breaker.state == OPEN
+        assert circuit_breaker.allow_request() is False
+        assert circuit_breaker.stats == {
+            "state": OPEN,
+            "consecutive_failures": 3,
+            "rejected": 1,
+            "times_opened": 1,
+        }
+
+    def test_successes_reset_failure_count(self, circuit_breaker):
+        fail(circuit_breaker, 2)
+        circuit_breaker.record_success()
+        fail(circuit_breaker, 2)
+
+        assert circuit_breaker.state == CLOSED
+
+    def test_half_open_after_reset_timeout(self, circuit_breaker, clock):
+        fail(circuit_breaker, 3)
+        clock.now += 6
+        assert circuit_breaker.retry_in == 4
+        clock.now += 4
+
+        assert circuit_breaker.state == HALF_OPEN
+        assert circuit_breaker.retry_in == 0
+        # only one trial request at a time
+        assert circuit_breaker.allow_request() is True
+        assert circuit_breaker.allow_request() is False
+
+    def test_successful_trial_closes(self, circuit_breaker, clock):
+        fail(circuit_breaker, 3)
+        clock.now += 10
+        assert circuit_breaker.allow_request() is True
+
+        circuit_breaker.record_success()
+
+        assert circuit_breaker.state == CLOSED
+        assert all(circuit_breaker.allow_request() for _ in range(5))
+
+    def test_failed_trial_reopens(self, circuit_breaker, clock):
+        fail(circuit_breaker, 3)
+        clock.now += 10
+        fail(circuit_breaker, 1)
+
+        assert circuit_breaker.state == OPEN
+        assert circuit_breaker.retry_in == 10
+        assert circuit_breaker.stats["times_opened"] == 2
+
+    def test_unknown_trial_outcome_frees_trial(self, circuit_breaker, clock):
+        fail(circuit_breaker, 3)
+        clock.now += 10
+        assert circuit_breaker.allow_request() is True
+
+        circuit_breaker.record_unknown()
+
+        assert circuit_breaker.state == HALF_OPEN
+        assert circuit_breaker.allow_request() is True
+
+    def test_lost_trial_outcome_eventually_ignored(self, circuit_breaker, clock):
+        fail(circuit_breaker, 3)
+        clock.now += 10
+        assert circuit_breaker.allow_request() is True
+        clock.now += 9
+        assert circuit_breaker.allow_request() is False
+        clock.now += 1
+
+        assert circuit_breaker.allow_request() is True
+
+    @mock.patch("dmapiclient.circuitbreaker.logger")
+    def test_state_changes_logged(self, logger, circuit_breaker, clock):
+        fail(circuit_breaker, 3)
+        clock.now += 10
+        circuit_breaker.allow_request()
+        circuit_breaker.record_success()
+
+        assert logger.mock_calls == [
+            mock.call.warning(
+                "Circuit breaker for {circuit_name} opened after {circuit_failures} consecutive failures",
+                extra={"circuit_name": "http://baseurl", "circuit_failures": 3},
+            ),
+            mock.call.info("Circuit breaker for {circuit_name} closed", extra={"circuit_name": "http://baseurl"}),
+        ]
+
+
+class TestCircuitBreakerPolicy(object):
+    @pytest.mark.parametrize("status_code,is_failure", ((None, True), (500, True), (503, True), (404, False)))
+    def test_is_failure(self, status_code, is_failure):
+        response = None if status_code is None else mock.Mock(status_code=status_code)
+
+        assert CircuitBreakerPolicy().is_failure(HTTPError(response)) is is_failure
+
+    def test_equality(self):
+        assert CircuitBreakerPolicy(3, reset_timeout=10) == CircuitBreakerPolicy(3, reset_timeout=10)
+        assert CircuitBreakerPolicy(3, reset_timeout=10) != CircuitBreakerPolicy(3, reset_timeout=20)
+        assert CircuitBreakerPolicy(failure_status_codes=[503]) != CircuitBreakerPolicy()
+
+
+@mock.patch("dmapiclient.circuitbreaker.logger")
+def test_circuit_breakers_shared_by_base_url(logger):
+    reset_circuit_breakers()
+    policy = CircuitBreakerPolicy()
+
+    circuit_breaker = circuit_breaker_for("http://search-api", policy)
+
+    assert circuit_breaker_for("http://search-api", CircuitBreakerPolicy()) is circuit_breaker
+    assert logger.mock_calls == []
+    assert circuit_breaker_for("http://search-api", CircuitBreakerPolicy(1)) is circuit_breaker
+    assert circuit_breaker.policy is policy
+    assert logger.mock_calls == [
+        mock.call.warning(
+            "Circuit breaker for {circuit_name} already uses {policy}, not {ignored_policy}",
+            extra={
+                "circuit_name": "http://search-api",
+                "policy": "CircuitBreakerPolicy(5, reset_timeout=30.0, half_open_max_calls=1, "
+                          "failure_status_codes=(500, 502, 503, 504))",
+                "ignored_policy": "CircuitBreakerPolicy(1, reset_timeout=30.0, half_open_max_calls=1, "
+                                  "failure_status_codes=(500, 502, 503, 504))",
+            },
+        ),
+    ]
+    assert circuit_breaker_for("http://data-api", policy) is not circuit_breaker
+
+    reset_circuit_breakers()
+    assert circuit_breaker_for("http://search-api", policy) is not circuit_breaker
@@ -0,0 +1,105 @@
+import io
+import subprocess
+import sys
+
+import pytest
+
+from dmapiclient.columnar import ColumnSchema
+
+
+SUPPLIERS = [
+    {"id": 1, "name": "One", "contactInformation": [{"email": "one@example.com"}], "lots": ["cloud-hosting"]},
+    {"id": 2, "name": "Two", "contactInformation": []},
+    {"id": 3, "name": "Three", "contactInformation": [{"email": "three@example.com"}], "lots": []},
+]
+
+
+@pytest.fixture
+def schema():
+    return ColumnSchema({"id": "id", "email": "contactInformation.0.email", "lots": "lots"})
+
+
+class TestColumnSchema(object):
+    def test_row(self, schema):
+        assert schema.names == ["id", "email", "lots"]
+        assert schema.row(SUPPLIERS[0]) == [1, "one@example.com", ["cloud-hosting"]]
+        assert schema.row(SUPPLIERS[1]) == [2, None, None]
+
+    def test_paths_as_names(self):
+        schema = ColumnSchema(["id", "contactInformation.0.email"], default="")
+        assert schema.names == ["id", "contactInformation.0.email"]
+        assert schema.row({"id": 1, "contactInformation": "not a list"}) == [1, ""]
+
+    def test_chunks(self, schema):
+        assert list(schema.chunks(iter(SUPPLIERS), chunk_size=2)) == [
+            {"id": [1, 2], "email": ["one@example.com", None], "lots": [["cloud-hosting"], None]},
+            {"id": [3], "email": ["three@example.com"], "lots": [[]]},
+        ]
+
+    def test_chunks_are_built_as_models_are_consumed(self, schema):
+        consumed = []
+
+        def models():
+            for supplier in SUPPLIERS:
+                consumed.append(supplier["id"])
+                yield supplier
+
+        chunks = schema.chunks(models(), chunk_size=2)
+        next(chunks)
+        assert consumed == [1, 2]
+
+    def test_chunks_without_models(self, schema):
+        assert list(schema.chunks(iter([]))) == []
+
+    def test_write_csv(self, schema):
+        f = io.StringIO()
+        assert schema.write_csv(iter(SUPPLIERS), f, chunk_size=2) == 3
+        assert f.getvalue().splitlines() == [
+            'id,email,lots',
+            '1,one@example.com,"[""cloud-hosting""]"',
+            '2,,',
+            '3,three@example.com,[]',
+        ]
+
+    def test_write_csv_chunks(self, schema, tmp_path):
+        paths = schema.write_csv_chunks(iter(SUPPLIERS), str(tmp_path / "suppliers-{:02d}.csv"), chunk_size=2)
+
+        assert paths == [str(tmp_path / "suppliers-00.csv"), str(tmp_path / "suppliers-01.csv")]
+        with open(paths[1]) as f:
+            assert f.read().splitlines() == ["id,email,lots", "3,three@example.com,[]"]
+
+    def test_record_batches(self, schema):
+        pyarrow = pytest.importorskip("pyarrow")
+        arrow_schema = pyarrow.schema([
+            ("id", pyarrow.int64()), ("email", pyarrow.string()), ("lots", pyarrow.list_(pyarrow.string())),
+        ])
+
+        batches = list(schema.record_batches(iter(SUPPLIERS), chunk_size=2, arrow_schema=arrow_schema))
+
+        assert [batch.num_rows for batch in batches] == [2, 1]
+        assert all(batch.schema == arrow_schema for batch in batches)
+        assert batches[0].to_pydict()["email"] == ["one@example.com", None]
+
+    def test_write_parquet(self, schema, tmp_path):
+        pytest.importorskip("pyarrow")
+        import pyarrow.parquet
+
+        path = str(tmp_path / "suppliers.parquet")
+        assert schema.write_parquet(iter(SUPPLIERS), path, chunk_size=2) == 3
+        assert pyarrow.parquet.read_table(path).to_pydict()["id"] == [1, 2, 3]
+
+    def test_pyarrow_not_imported_with_module(self):
+        subprocess.run(
+            [sys.executable, "-c", "import sys, dmapiclient.columnar; assert 'pyarrow' not in sys.modules"],
+            check=True,
+        )
+
+    @pytest.mark.parametrize("export", ("record_batches", "write_parquet"))
+    def test_arrow_exports_need_pyarrow(self, schema, export, monkeypatch, tmp_path):
+        monkeypatch.setitem(sys.modules, "pyarrow", None)
+
+        with pytest.raises(ImportError, match="install the 'arrow' extra"):
+            if export == "record_batches":
+                next(schema.record_batches(iter(SUPPLIERS)))
+            else:
+                schema.write_parquet(iter(SUPPLIERS), str(tmp_path / "suppliers.parquet"))
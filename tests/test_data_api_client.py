@@ -1,11 +1,12 @@
 # -*- coding: utf-8 -*-
-from flask import json
+from flask import json, request
 import pytest
 import mock
 
 from dmapiclient import DataAPIClient
-from dmapiclient import APIError, HTTPError
+from dmapiclient import APIError, HTTPError, InvalidResponse, ResponseCache
 from dmapiclient.audit import AuditTypes
+from dmapiclient.records import AuditEvent
 
 
 @pytest.fixture
@@ -50,6 +51,25 @@ class TestDataApiClient(object):
             'updated_by': 'testuser@example.com',
             'declaration': {'question': 'answer'}}
 
+    def test_read_mostly_endpoints_can_be_cached(self, rmock):
+        data_client = DataAPIClient(
+            'http://baseurl', 'auth-token', cache=ResponseCache(DataAPIClient.READ_MOSTLY_ENDPOINT_TTLS),
+        )
+        rmock.get("http://baseurl/frameworks", json={"frameworks": []}, status_code=200)
+        rmock.get("http://baseurl/frameworks/g-cloud-12", json={"frameworks": {}}, status_code=200)
+        rmock.get("http://baseurl/frameworks/g-cloud-12/stats", json={"stats": {}}, status_code=200)
+        rmock.get("http://baseurl/buyer-email-domains", json={"buyerEmailDomains": []}, status_code=200)
+        rmock.get("http://baseurl/suppliers/123/frameworks", json={"frameworkInterest": []}, status_code=200)
+
+        for _ in range(2):
+            data_client.find_frameworks()
+            data_client.get_framework("g-cloud-12")
+            data_client.get_framework_stats("g-cloud-12")
+            data_client.get_buyer_email_domains()
+            data_client.get_supplier_frameworks(123)
+
+        assert rmock.call_count == 5
+
     def test_value_error_is_raised_if_no_user_in_constructor_or_method_call(self, data_client, rmock):
         rmock.patch(
             "http://baseurl/suppliers/123/frameworks/g-cloud-7/declaration",
@@ -2738,6 +2758,104 @@ class TestDataAPIClientIterMethods(object):
         assert results[0]['id'] == 1
         assert results[1]['id'] == 2
 
+    def test_iter_prefetch(self, data_client, rmock):
+        self._test_find_iter(
+            data_client, rmock,
+            method_name='find_services_iter',
+            model_name='services',
+            url_path='services',
+            iter_kwargs={'prefetch': 2},
+        )
+
+    def test_iter_prefetch_propagates_request_context(self, data_client, rmock, app):
+        rmock.get(
+            'http://baseurl/services',
+            json={'links': {'next': 'http://baseurl/services?page=2'}, 'services': [{'id': 1}]},
+            status_code=200)
+        rmock.get(
+            'http://baseurl/services?page=2',
+            json={'links': {}, 'services': [{'id': 2}]},
+            status_code=200)
+
+        with app.test_request_context('/'):
+            request.get_onwards_request_headers = mock.Mock(return_value={"X-Onwards": "yes"})
+            results = list(data_client.find_services_iter(prefetch=1))
+
+        assert [result['id'] for result in results] == [1, 2]
+        assert [req.headers.get("X-Onwards") for req in rmock.request_history] == ["yes", "yes"]
+
+    @pytest.mark.parametrize("ordered", (True, False))
+    def test_iter_parallel(self, data_client, rmock, ordered):
+        for page in range(1, 5):
+            rmock.get(
+                'http://baseurl/briefs?status=live' + ('&page={}'.format(page) if page > 1 else ''),
+                json={
+                    'links': dict(
+                        {'next': 'http://baseurl/briefs?status=live&page={}'.format(page + 1)} if page < 4 else {},
+                        last='http://baseurl/briefs?status=live&page=4',
+                    ),
+                    'briefs': [{'id': page * 10 + 1}, {'id': page * 10 + 2}],
+                },
+                status_code=200)
+
+        results = [
+            brief['id'] for brief in data_client.find_briefs_iter(status='live', parallel=3, ordered=ordered)
+        ]
+
+        if ordered:
+            assert results == [11, 12, 21, 22, 31, 32, 41, 42]
+        else:
+            assert sorted(results) == [11, 12, 21, 22, 31, 32, 41, 42]
+        assert rmock.call_count == 4
+
+    def test_iter_parallel_and_prefetch_cannot_be_combined(self, data_client):
+        with pytest.raises(ValueError):
+            next(data_client.find_briefs_iter(parallel=2, prefetch=2))
+
+    def test_iter_stream(self, data_client, rmock):
+        self._test_find_iter(
+            data_client, rmock,
+            method_name='find_services_iter',
+            model_name='services',
+            url_path='services',
+            iter_kwargs={'stream': True},
+        )
+
+    def test_export_suppliers_iter_stream(self, data_client, rmock):
+        rmock.get(
+            'http://baseurl/suppliers/export/g-cloud-12',
+            json={'suppliers': [{'supplier_id': 1}, {'supplier_id': 2}]},
+            status_code=200)
+
+        suppliers = data_client.export_suppliers_iter('g-cloud-12', stream=True)
+
+        assert rmock.called is False
+        assert list(suppliers) == [{'supplier_id': 1}, {'supplier_id': 2}]
+        assert rmock.call_count == 1
+        assert data_client.transfer_stats.stats['response_bytes'] == len(
+            b'{"suppliers": [{"supplier_id": 1}, {"supplier_id": 2}]}'
+        )
+
+    def test_iter_stream_invalid_response(self, data_client, rmock):
+        rmock.get('http://baseurl/users/export/g-cloud-12', text='{"users": [{"id": 1}, ', status_code=200)
+
+        users = data_client.export_users_iter('g-cloud-12', stream=True)
+
+        assert next(users) == {'id': 1}
+        with pytest.raises(InvalidResponse):
+            next(users)
+
+    def test_iter_stream_error_response(self, data_client, rmock):
+        rmock.get('http://baseurl/users/export/g-cloud-12', json={'error': 'Not found'}, status_code=404)
+
+        with pytest.raises(HTTPError) as e:
+            list(data_client.export_users_iter('g-cloud-12', stream=True))
+        assert e.value.status_code == 404
+
+    def test_iter_stream_cannot_be_combined_with_prefetch(self, data_client):
+        with pytest.raises(ValueError):
+            next(data_client.export_users_iter('g-cloud-12', stream=True, prefetch=2))
+
     def test_find_users_iter(self, data_client, rmock):
         self._test_find_iter(
             data_client, rmock,
@@ -2948,3 +3066,247 @@ class TestDataAPIClientIterMethods(object):
             url_path="buyer-email-domains",
             iter_kwargs={},
         )
+
+    def _mock_service_pages(self, rmock):
+        rmock.get(
+            'http://baseurl/services',
+            json={'links': {'next': 'http://baseurl/services?page=2'}, 'services': [{'id': 1}, {'id': 2}]},
+            status_code=200)
+        rmock.get(
+            'http://baseurl/services?page=2',
+            json={'links': {'next': 'http://baseurl/services?page=3'}, 'services': [{'id': 3}, {'id': 4}]},
+            status_code=200)
+        rmock.get(
+            'http://baseurl/services?page=3',
+            json={'links': {}, 'services': [{'id': 5}]},
+            status_code=200)
+
+    def test_iter_cursor(self, data_client, rmock):
+        self._mock_service_pages(rmock)
+        services = data_client.find_services_iter()
+
+        assert services.cursor == {'method': 'find_services', 'url': None, 'offset': 0}
+        next(services)
+        assert services.cursor == {'method': 'find_services', 'url': None, 'offset': 1}
+        next(services)
+        assert services.cursor == {'method': 'find_services', 'url': 'http://baseurl/services?page=2', 'offset': 0}
+        next(services)
+        assert services.cursor == {'method': 'find_services', 'url': 'http://baseurl/services?page=2', 'offset': 1}
+        assert json.loads(json.dumps(services.cursor)) == services.cursor
+
+        assert [service['id'] for service in services] == [4, 5]
+        assert services.cursor is None
+
+    @pytest.mark.parametrize('stream', (False, True))
+    def test_iter_resume_from_cursor(self, data_client, rmock, stream):
+        self._mock_service_pages(rmock)
+        services = data_client.find_services_iter(stream=stream)
+        assert [next(services)['id'] for _ in range(3)] == [1, 2, 3]
+        cursor = services.cursor
+        services.close()
+
+        requests_made = len(rmock.request_history)
+        resumed = data_client.find_services_iter(stream=stream, resume_from=cursor)
+        assert [service['id'] for service in resumed] == [4, 5]
+        assert [r.url for r in rmock.request_history[requests_made:]] == [
+            'http://baseurl/services?page=2',
+            'http://baseurl/services?page=3',
+        ]
+
+    def test_iter_resume_from_first_page(self, data_client, rmock):
+        self._mock_service_pages(rmock)
+        resumed = data_client.find_services_iter(
+            resume_from={'method': 'find_services', 'url': None, 'offset': 1},
+        )
+        assert [service['id'] for service in resumed] == [2, 3, 4, 5]
+
+    def test_iter_checkpoint_saved_at_page_boundaries_and_cleared(self, data_client, rmock):
+        self._mock_service_pages(rmock)
+        checkpoint = mock.Mock(**{'load.return_value': None})
+        services = data_client.find_services_iter(checkpoint=checkpoint)
+
+        assert [next(services)['id'] for _ in range(2)] == [1, 2]
+        assert checkpoint.save.call_args_list == []
+        next(services)
+        assert checkpoint.save.call_args_list == [
+            mock.call({'method': 'find_services', 'url': 'http://baseurl/services?page=2', 'offset': 0}),
+        ]
+        assert checkpoint.clear.called is False
+
+        assert [service['id'] for service in services] == [4, 5]
+        assert checkpoint.save.call_args_list[-1] == mock.call(
+            {'method': 'find_services', 'url': 'http://baseurl/services?page=3', 'offset': 0},
+        )
+        assert checkpoint.clear.call_args_list == [mock.call()]
+
+    def test_iter_resumes_from_checkpoint(self, data_client, rmock):
+        self._mock_service_pages(rmock)
+        checkpoint = mock.Mock(**{'load.return_value': {
+            'method': 'find_services', 'url': 'http://baseurl/services?page=3', 'offset': 0,
+        }})
+
+        assert [service['id'] for service in data_client.find_services_iter(checkpoint=checkpoint)] == [5]
+        assert [r.url for r in rmock.request_history] == ['http://baseurl/services?page=3']
+
+    def test_iter_resume_from_another_methods_cursor(self, data_client, rmock):
+        with pytest.raises(ValueError):
+            data_client.find_services_iter(resume_from={'method': 'find_briefs', 'url': None, 'offset': 0})
+        assert rmock.called is False
+
+    def test_iter_parallel_cannot_be_resumed(self, data_client, rmock):
+        with pytest.raises(ValueError):
+            data_client.find_services_iter(parallel=2, checkpoint=mock.Mock())
+        with pytest.raises(ValueError):
+            data_client.find_services_iter(
+                parallel=2, resume_from={'method': 'find_services', 'url': None, 'offset': 0},
+            )
+        assert rmock.called is False
+
+    @pytest.mark.parametrize('stream', (False, True))
+    def test_iter_records(self, data_client, rmock, stream):
+        rmock.get(
+            'http://baseurl/audit-events',
+            json={
+                'links': {},
+                'auditEvents': [{'id': 1, 'type': 'update_service', 'createdAt': '2026-01-01', 'data': {'a': 1}}],
+            },
+            status_code=200)
+
+        audit_events = list(data_client.find_audit_events_iter(stream=stream, records=True))
+
+        assert [type(audit_event) for audit_event in audit_events] == [AuditEvent]
+        assert audit_events[0].created_at == '2026-01-01'
+        assert audit_events[0]['data'] == {'a': 1}
+
+    def test_iter_records_cursor(self, data_client, rmock):
+        self._mock_service_pages(rmock)
+        services = data_client.find_services_iter(records=True)
+        next(services)
+        assert services.cursor == {'method': 'find_services', 'url': None, 'offset': 1}
+
+    def test_iter_records_without_record_type(self, data_client, rmock):
+        with pytest.raises(ValueError):
+            data_client.find_outcomes_iter(records=True)
+        assert rmock.called is False
+
+    def test_find_method_projects_fields(self, data_client, rmock):
+        rmock.get(
+            'http://baseurl/services?framework=g-cloud-12',
+            json={'services': [{'id': '1', 'lot': 'cloud-hosting', 'status': 'published'}], 'links': {}},
+            status_code=200)
+
+        result = data_client.find_services(framework='g-cloud-12', fields=['id', 'lot'])
+
+        assert result == {'services': [{'id': '1', 'lot': 'cloud-hosting'}], 'links': {}}
+        assert rmock.last_request.qs == {'framework': ['g-cloud-12']}
+
+    def test_find_method_projects_single_model(self, data_client, rmock):
+        rmock.get(
+            'http://baseurl/frameworks/g-cloud-12/suppliers',
+            json={'supplierFrameworks': {'supplierId': 1, 'declaration': {'status': 'complete'}}},
+            status_code=200)
+
+        assert data_client.find_framework_suppliers('g-cloud-12', fields=['supplierId']) == {
+            'supplierFrameworks': {'supplierId': 1},
+        }
+
+    @pytest.mark.parametrize('iter_kwargs', ({}, {'stream': True}, {'prefetch': 2}, {'records': True}))
+    def test_iter_projects_fields_of_every_page(self, data_client, rmock, iter_kwargs):
+        rmock.get(
+            'http://baseurl/services',
+            json={
+                'links': {'next': 'http://baseurl/services?page=2'},
+                'services': [{'id': '1', 'lot': 'cloud-hosting', 'status': 'published'}],
+            },
+            status_code=200)
+        rmock.get(
+            'http://baseurl/services?page=2',
+            json={'links': {}, 'services': [{'id': '2', 'lot': 'cloud-support', 'status': 'published'}]},
+            status_code=200)
+
+        services = list(data_client.find_services_iter(fields=['id', 'lot'], **iter_kwargs))
+
+        if iter_kwargs.get('records'):
+            services = [service.to_dict() for service in services]
+            assert services[0]['status'] is None
+        else:
+            assert services == [{'id': '1', 'lot': 'cloud-hosting'}, {'id': '2', 'lot': 'cloud-support'}]
+        assert [service['lot'] for service in services] == ['cloud-hosting', 'cloud-support']
+        assert all('fields' not in r.qs for r in rmock.request_history)
+
+    def test_iter_passes_fields_to_server_side_projection(self, data_client, rmock):
+        rmock.get(
+            'http://baseurl/direct-award/projects/1/services?fields=id,price',
+            json={'services': [{'id': '1', 'price': '£1', 'supplier': 'Supplier'}], 'links': {}},
+            status_code=200)
+
+        services = list(data_client.find_direct_award_project_services_iter(project_id=1, fields=['id', 'price']))
+
+        # as returned by the server
+        assert services == [{'id': '1', 'price': '£1', 'supplier': 'Supplier'}]
+
+
+class TestDataAPIClientBulkMethods(object):
+    def test_get_services(self, data_client, rmock):
+        rmock.get("http://baseurl/services/3", json={"services": {"id": 3}}, status_code=200)
+        rmock.get("http://baseurl/services/1", json={"services": {"id": 1}}, status_code=200)
+        rmock.get("http://baseurl/services/2", json={"error": "Not found"}, status_code=404)
+        rmock.get("http://baseurl/services/4", json={"error": "Forbidden"}, status_code=403)
+
+        result = data_client.get_services([3, 1, 2, 4, 1])
+
+        assert list(result.items()) == [
+            (3, {"services": {"id": 3}}),
+            (1, {"services": {"id": 1}}),
+            (2, None),
+        ]
+        assert list(result.errors.keys()) == [4]
+        assert isinstance(result.errors[4], HTTPError)
+        assert result.errors[4].status_code == 403
+        # duplicate ids are only fetched once
+        assert rmock.call_count == 4
+
+    def test_get_users_maps_missing_users_to_none(self, data_client, rmock):
+        rmock.get("http://baseurl/users/1", json={"users": {"id": 1}}, status_code=200)
+        rmock.get("http://baseurl/users/2", json={"error": "Not found"}, status_code=404)
+
+        result = data_client.get_users(iter([1, 2]))
+
+        assert list(result.items()) == [(1, {"users": {"id": 1}}), (2, None)]
+        assert result.errors == {}
+
+    @pytest.mark.parametrize("method_name,url_path,model_name", (
+        ("get_suppliers", "suppliers", "suppliers"),
+        ("get_briefs", "briefs", "briefs"),
+        ("get_brief_responses", "brief-responses", "briefResponses"),
+    ))
+    def test_bulk_get_collects_errors(self, data_client, rmock, method_name, url_path, model_name):
+        rmock.get("http://baseurl/{}/1".format(url_path), json={model_name: {"id": 1}}, status_code=200)
+        rmock.get("http://baseurl/{}/2".format(url_path), json={"error": "Not found"}, status_code=404)
+
+        result = getattr(data_client, method_name)(["1", "2"])
+
+        assert list(result.items()) == [("1", {model_name: {"id": 1}})]
+        assert list(result.errors.keys()) == ["2"]
+        assert result.errors["2"].status_code == 404
+
+    def test_bulk_get_of_nothing(self, data_client, rmock):
+        assert data_client.get_briefs([]) == {}
+        assert rmock.call_count == 0
+
+    @pytest.mark.parametrize("max_workers,expected_max_workers", ((None, 10), (3, 3)))
+    def test_bulk_get_concurrency_defaults_to_pool_size(self, data_client, max_workers, expected_max_workers):
+        with mock.patch("dmapiclient.base.fetch_concurrently") as fetch_concurrently:
+            data_client.get_briefs([1, 2], max_workers=max_workers)
+
+        assert fetch_concurrently.call_args_list == [mock.call(data_client.get_brief, [1, 2], expected_max_workers)]
+
+    def test_bulk_get_propagates_request_context(self, data_client, rmock, app):
+        rmock.get("http://baseurl/briefs/1", json={"briefs": {"id": 1}}, status_code=200)
+        rmock.get("http://baseurl/briefs/2", json={"briefs": {"id": 2}}, status_code=200)
+
+        with app.test_request_context('/'):
+            request.get_onwards_request_headers = mock.Mock(return_value={"X-Onwards": "yes"})
+            data_client.get_briefs([1, 2])
+
+        assert [req.headers.get("X-Onwards") for req in rmock.request_history] == ["yes", "yes"]
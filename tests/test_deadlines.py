@@ -0,0 +1,110 @@
+import time
+
+import mock
+import pytest
+from urllib3.exceptions import MaxRetryError, ProtocolError
+
+from dmapiclient import deadlines
+from dmapiclient.deadlines import deadline, remaining, set_request_deadline, shrink_timeout
+from dmapiclient.retries import RetryPolicy, _DeadlineRetry
+
+
+class TestDeadline(object):
+    def test_no_deadline_by_default(self):
+        assert remaining() is None
+
+    def test_time_left_within_block(self):
+        with deadline(10):
+            assert 9 < remaining() <= 10
+        assert remaining() is None
+
+    def test_nested_deadline_can_only_shorten(self):
+        with deadline(5):
+            with deadline(10):
+                assert remaining() <= 5
+            with deadline(1):
+                assert remaining() <= 1
+
+    @mock.patch("dmapiclient.deadlines.time.monotonic", side_effect=[100., 105.])
+    def test_time_left_can_be_negative(self, monotonic):
+        with deadline(2):
+            assert remaining() == -3
+
+    def test_flask_request_deadline(self, app):
+        with app.test_request_context("/"):
+            assert remaining() is None
+            set_request_deadline(10)
+            assert 9 < remaining() <= 10
+
+            with deadline(1):
+                assert remaining() <= 1
+            with deadline(20):
+                assert remaining() <= 10
+
+    def test_init_app_sets_deadline_for_each_request(self, app):
+        app.config["DM_API_REQUEST_DEADLINE"] = 10
+        deadlines.init_app(app)
+
+        @app.route("/")
+        def view():
+            return str(remaining())
+
+        assert 9 < float(app.test_client().get("/").data) <= 10
+
+    def test_init_app_without_config_sets_no_deadline(self, app):
+        deadlines.init_app(app)
+
+        @app.route("/")
+        def view():
+            return str(remaining())
+
+        assert app.test_client().get("/").data == b"None"
+
+
+@pytest.mark.parametrize("timeout,expected", (
+    ((15, 45), (5, 5)),
+    ((2, 45), (2, 5)),
+    ((None, 3), (5, 3)),
+    (45, 5),
+    (None, 5),
+))
+def test_shrink_timeout(timeout, expected):
+    assert shrink_timeout(timeout, 5) == expected
+
+
+class TestDeadlineRetry(object):
+    def test_retries_while_time_left(self):
+        retry = _DeadlineRetry(total=3, backoff_factor=0.1)
+
+        with deadline(10):
+            retry = retry.increment("GET", "/", error=ProtocolError())
+            retry = retry.increment("GET", "/", error=ProtocolError())
+
+        assert len(retry.history) == 2
+
+    def test_gives_up_when_backoff_would_pass_deadline(self):
+        retry = _DeadlineRetry(total=3, backoff_factor=10).increment("GET", "/", error=ProtocolError())
+
+        with deadline(1):
+            with pytest.raises(MaxRetryError) as e:
+                retry.increment("GET", "/", error=ProtocolError())
+
+        assert e.value._dmapiclient_deadline_exceeded is True
+        assert e.value._dmapiclient_retries == 1
+
+    def test_policy_retries_respect_deadline(self):
+        retry = RetryPolicy(5, backoff_factor=5, jitter=False).make_retry(None)
+
+        with deadline(1):
+            with pytest.raises(MaxRetryError) as e:
+                retry.increment("GET", "/", error=ProtocolError())
+
+        assert e.value._dmapiclient_deadline_exceeded is True
+
+    def test_passed_deadline_stops_retries(self):
+        retry = _DeadlineRetry(total=3)
+
+        with deadline(0.01):
+            time.sleep(0.02)
+            with pytest.raises(MaxRetryError):
+                retry.increment("GET", "/", error=ProtocolError())
@@ -0,0 +1,78 @@
+import pytest
+
+from dmapiclient.hedging import Hedger, HedgingPolicy
+
+
+class TestHedgingPolicy(object):
+    @pytest.mark.parametrize("method,path,handled", (
+        ("GET", "/services/123", True),
+        ("HEAD", "/services/123", True),
+        ("GET", "/services", False),
+        ("POST", "/services/123", False),
+        ("DELETE", "/services/123", False),
+    ))
+    def test_handles_safe_methods_to_given_endpoints(self, method, path, handled):
+        assert HedgingPolicy(endpoints=["/services/{service_id}"]).handles(method, path) is handled
+
+    def test_handles_any_endpoint_by_default(self):
+        assert HedgingPolicy().handles("GET", "/anything/at/all") is True
+
+
+class TestHedger(object):
+    def test_no_delay_until_enough_samples(self):
+        hedger = Hedger(HedgingPolicy(min_samples=3, max_hedge_ratio=1))
+        hedger.record_latency("/services/{id}", 0.1)
+        hedger.record_latency("/services/{id}", 0.2)
+
+        assert hedger.delay_for("/services/{id}") is None
+        hedger.record_latency("/services/{id}", 0.3)
+        assert hedger.delay_for("/services/{id}") is not None
+        assert hedger.delay_for("/briefs/{id}") is None
+
+    def test_delay_is_percentile_of_recent_latencies(self):
+        hedger = Hedger(HedgingPolicy(0.9, min_samples=1, min_delay=0, max_hedge_ratio=1))
+        for latency in reversed(range(1, 101)):
+            hedger.record_latency("/services/{id}", latency / 100)
+
+        assert hedger.delay_for("/services/{id}") == 0.91
+
+    def test_delay_at_least_min_delay(self):
+        hedger = Hedger(HedgingPolicy(min_samples=1, min_delay=0.05, max_hedge_ratio=1))
+        hedger.record_latency("/services/{id}", 0.001)
+
+        assert hedger.delay_for("/services/{id}") == 0.05
+
+    def test_only_recent_latencies_kept(self):
+        hedger = Hedger(HedgingPolicy(0.5, min_samples=1, min_delay=0, window=3, max_hedge_ratio=1))
+        for latency in (5., 6., 7., 1., 2., 3.):
+            hedger.record_latency("/services/{id}", latency)
+
+        assert hedger.delay_for("/services/{id}") == 2.
+
+    def test_hedges_limited_to_proportion_of_requests(self):
+        hedger = Hedger(HedgingPolicy(max_hedge_ratio=0.25))
+
+        allowed = []
+        for _ in range(20):
+            hedger.delay_for("/services/{id}")
+            allowed.append(hedger.try_hedge())
+
+        assert allowed.count(True) == 5
+        assert hedger.stats == {"requests": 20, "hedged": 5, "hedges_won": 0}
+
+    def test_no_delay_while_no_hedge_could_be_sent(self):
+        hedger = Hedger(HedgingPolicy(min_samples=1, max_hedge_ratio=0.5))
+        hedger.record_latency("/services/{id}", 0.1)
+
+        assert hedger.delay_for("/services/{id}") is None
+        assert hedger.delay_for("/services/{id}") is not None
+        assert hedger.try_hedge() is True
+        assert hedger.delay_for("/services/{id}") is None
+        assert hedger.stats == {"requests": 3, "hedged": 1, "hedges_won": 0}
+
+    def test_saved_hedges_limited(self):
+        hedger = Hedger(HedgingPolicy(max_hedge_ratio=1))
+        for _ in range(100):
+            hedger.delay_for("/services/{id}")
+
+        assert sum(hedger.try_hedge() for _ in range(100)) == Hedger.MAX_SAVED_HEDGES
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+from dmapiclient.jsoncodec import StdlibJSONCodec, available_codecs, default_codec
+
+
+DOCUMENT = {
+    "briefResponses": [
+        {"id": 1, "essentialRequirementsMet": True, "niceToHaveRequirements": [{"yesNo": False}, None]},
+        {"id": 2, "respondToEmailAddress": "supplier@example.com", "dayRate": "1000.50", "score": 12.5},
+    ],
+    "links": {"next": "http://localhost/briefs/1/responses?page=2"},
+    "meta": {"total": 2, "description": "Ünïcode / “quotes”"},
+}
+
+
+@pytest.fixture(params=available_codecs(), ids=lambda codec: codec.name)
+def codec(request):
+    return request.param
+
+
+class TestJSONCodecs(object):
+    def test_round_trip(self, codec):
+        assert codec.loads(codec.dumps(DOCUMENT)) == DOCUMENT
+
+    def test_dumps_is_readable_by_the_standard_library(self, codec):
+        encoded = codec.dumps(DOCUMENT)
+
+        assert isinstance(encoded, bytes)
+        assert json.loads(encoded.decode("utf-8")) == DOCUMENT
+
+    @pytest.mark.parametrize("body", (
+        json.dumps(DOCUMENT).encode("utf-8"),
+        json.dumps(DOCUMENT, ensure_ascii=False).encode("utf-8"),
+        json.dumps(DOCUMENT),
+    ))
+    def test_loads_bytes_or_str(self, codec, body):
+        assert codec.loads(body) == DOCUMENT
+
+    @pytest.mark.parametrize("body", (b"", b"not json", b'{"a": 1', b"<html></html>"))
+    def test_invalid_json_raises_value_error(self, codec, body):
+        with pytest.raises(ValueError):
+            codec.loads(body)
+
+    @pytest.mark.parametrize("obj", (
+        {1: "a", 2.5: "b", False: "c", None: "d"},
+        {"counts": {2019: 1, 2020: 2}},
+    ))
+    def test_dumps_non_str_keys_like_the_standard_library(self, codec, obj):
+        assert codec.loads(codec.dumps(obj)) == json.loads(json.dumps(obj))
+
+    @pytest.mark.parametrize("value", (float("nan"), float("inf"), float("-inf")))
+    @pytest.mark.parametrize("wrap", (
+        lambda value: value,
+        lambda value: {"score": value},
+        lambda value: {"a": None, "scores": [1.5, value]},
+        lambda value: [None, (value,)],
+    ))
+    def test_dumps_rejects_nan_and_infinity(self, codec, value, wrap):
+        with pytest.raises(ValueError):
+            codec.dumps(wrap(value))
+
+    def test_dumps_finite_floats_with_nulls(self, codec):
+        assert codec.loads(codec.dumps({"a": None, "b": [0.5, -1e300]})) == {"a": None, "b": [0.5, -1e300]}
+
+
+def test_stdlib_codec_encodes_like_requests():
+    assert StdlibJSONCodec().dumps({"a": "b", "c": [1, None]}) == b'{"a": "b", "c": [1, null]}'
+
+
+def test_default_codec_is_fastest_available():
+    assert type(default_codec()) is type(available_codecs()[0])
+    assert available_codecs()[-1].name == "json"
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+import re
+
+import pytest
+
+from dmapiclient import AntivirusAPIClient, DataAPIClient, SearchAPIClient
+from dmapiclient.metrics import Histogram, InMemoryMetrics, PrometheusMetrics
+from dmapiclient.routes import EndpointNormaliser
+
+
+class TestEndpointNormaliser(object):
+    @pytest.fixture
+    def normaliser(self):
+        return EndpointNormaliser((
+            "/suppliers/{supplier_id}/frameworks/interest",
+            "/suppliers/{supplier_id}/frameworks/{framework_slug}",
+            "/services/{service_id}",
+        ))
+
+    @pytest.mark.parametrize("path,expected", (
+        ("/services/123", "/services/{service_id}"),
+        ("/services/123/", "/services/{service_id}"),
+        ("/suppliers/1/frameworks/interest", "/suppliers/{supplier_id}/frameworks/interest"),
+        ("/suppliers/1/frameworks/g-cloud-12", "/suppliers/{supplier_id}/frameworks/{framework_slug}"),
+        ("/unknown/123/thing/someone@example.com", "/unknown/{id}/thing/{id}"),
+        ("/unknown/things", "/unknown/things"),
+    ))
+    def test_normalise(self, normaliser, path, expected):
+        assert normaliser.normalise(path) == expected
+
+    def test_no_templates(self):
+        assert EndpointNormaliser(()).normalise("/services/123") == "/services/{id}"
+
+
+@pytest.mark.parametrize("client_class", (DataAPIClient, SearchAPIClient, AntivirusAPIClient))
+def test_endpoint_templates_are_reachable(client_class):
+    # a template shadowed by an earlier one in the list would never be reported
+    normaliser = EndpointNormaliser(client_class.ENDPOINT_TEMPLATES)
+    for template in client_class.ENDPOINT_TEMPLATES:
+        assert normaliser.normalise(re.sub(r"\{[^/{}]*\}", "x", template)) == template
+
+
+class TestHistogram(object):
+    def test_observe(self):
+        histogram = Histogram((0.1, 1.))
+        for value in (0.05, 0.1, 0.5, 2., 3.):
+            histogram.observe(value)
+
+        assert list(histogram.cumulative_counts()) == [(0.1, 2), (1., 3), (float("inf"), 5)]
+        assert histogram.count == 5
+        assert histogram.sum == pytest.approx(5.65)
+
+    def test_quantile(self):
+        histogram = Histogram((0.1, 1., 10.))
+        for value in [0.05] * 90 + [5.] * 10:
+            histogram.observe(value)
+
+        assert histogram.quantile(.5) == 0.1
+        assert histogram.quantile(.95) == 10.
+        assert Histogram().quantile(.5) is None
+
+
+class TestInMemoryMetrics(object):
+    def test_snapshot(self):
+        metrics = InMemoryMetrics(buckets=(0.1, 1.))
+        metrics.record_request("DataAPIClient", "GET", "/services/{service_id}", 200, 0.05, 0, 0, 100)
+        metrics.record_request("DataAPIClient", "GET", "/services/{service_id}", 404, 0.5, 2, 0, 20)
+        metrics.record_request("DataAPIClient", "POST", "/services/{service_id}", 200, 0.2, 0, 50, 10)
+
+        assert metrics.snapshot() == {
+            ("DataAPIClient", "GET", "/services/{service_id}"): {
+                "requests": 2,
+                "status_codes": {200: 1, 404: 1},
+                "retries": 2,
+                "request_bytes": 0,
+                "response_bytes": 120,
+                "latency_sum": pytest.approx(0.55),
+                "latency_p50": 0.1,
+                "latency_p99": 1.,
+            },
+            ("DataAPIClient", "POST", "/services/{service_id}"): {
+                "requests": 1,
+                "status_codes": {200: 1},
+                "retries": 0,
+                "request_bytes": 50,
+                "response_bytes": 10,
+                "latency_sum": pytest.approx(0.2),
+                "latency_p50": 1.,
+                "latency_p99": 1.,
+            },
+        }
+
+    def test_slowest(self):
+        metrics = InMemoryMetrics()
+        for endpoint, elapsed_time in (("/a", 0.1), ("/b", 2.), ("/c", 0.5), ("/b", 1.)):
+            metrics.record_request("DataAPIClient", "GET", endpoint, 200, elapsed_time, 0, 0, 0)
+
+        assert metrics.slowest(2) == [("DataAPIClient", "GET", "/b"), ("DataAPIClient", "GET", "/c")]
+
+    def test_clear(self):
+        metrics = InMemoryMetrics()
+        metrics.record_request("DataAPIClient", "GET", "/a", 200, 0.1, 0, 0, 0)
+        metrics.clear()
+
+        assert metrics.snapshot() == {}
+
+
+class TestPrometheusMetrics(object):
+    def test_render(self):
+        metrics = PrometheusMetrics(buckets=(0.1, 1.))
+        metrics.record_request("DataAPIClient", "GET", "/services/{service_id}", 200, 0.05, 1, 0, 100)
+        metrics.record_request("DataAPIClient", "GET", "/services/{service_id}", 503, 2., 5, 0, 20)
+
+        labels = 'client="DataAPIClient",method="GET",endpoint="/services/{service_id}"'
+        assert metrics.render().splitlines() == [
+            "# HELP dmapiclient_request_duration_seconds Time taken by API requests, with retries.",
+            "# TYPE dmapiclient_request_duration_seconds histogram",
+            'dmapiclient_request_duration_seconds_bucket{%s,le="0.1"} 1' % labels,
+            'dmapiclient_request_duration_seconds_bucket{%s,le="1.0"} 1' % labels,
+            'dmapiclient_request_duration_seconds_bucket{%s,le="+Inf"} 2' % labels,
+            "dmapiclient_request_duration_seconds_sum{%s} 2.05" % labels,
+            "dmapiclient_request_duration_seconds_count{%s} 2" % labels,
+            "# HELP dmapiclient_requests_total API requests made, by response status code.",
+            "# TYPE dmapiclient_requests_total counter",
+            'dmapiclient_requests_total{%s,status="200"} 1' % labels,
+            'dmapiclient_requests_total{%s,status="503"} 1' % labels,
+            "# HELP dmapiclient_request_retries_total Retries of API requests.",
+            "# TYPE dmapiclient_request_retries_total counter",
+            "dmapiclient_request_retries_total{%s} 6" % labels,
+            "# HELP dmapiclient_request_bytes_total Bytes of API request bodies sent.",
+            "# TYPE dmapiclient_request_bytes_total counter",
+            "dmapiclient_request_bytes_total{%s} 0" % labels,
+            "# HELP dmapiclient_response_bytes_total Bytes of API response bodies received.",
+            "# TYPE dmapiclient_response_bytes_total counter",
+            "dmapiclient_response_bytes_total{%s} 120" % labels,
+        ]
+
+    def test_label_values_are_escaped(self):
+        metrics = PrometheusMetrics(namespace="app")
+        metrics.record_request("DataAPIClient", "GET", '/a"b\\c', 200, 0.05, 0, 0, 0)
+
+        assert 'endpoint="/a\\"b\\\\c"' in metrics.render()
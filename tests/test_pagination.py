@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import pytest
+import mock
+
+from dmapiclient.pagination import fan_out_pages, follow_pages, prefetch_pages
+
+
+def _pages(count):
+    return {
+        "page{}".format(i): {
+            "items": [i],
+            "links": {"next": "page{}".format(i + 1)} if i < count else {},
+        }
+        for i in range(1, count + 1)
+    }
+
+
+class TestFollowPages(object):
+    def test_follows_next_links_lazily(self):
+        pages = _pages(3)
+        get_page = mock.Mock(side_effect=pages.__getitem__)
+
+        walker = follow_pages(pages["page1"], get_page)
+
+        assert next(walker) is pages["page1"]
+        assert get_page.call_args_list == []
+        assert list(walker) == [pages["page2"], pages["page3"]]
+        assert get_page.call_args_list == [mock.call("page2"), mock.call("page3")]
+
+
+class TestPrefetchPages(object):
+    @pytest.mark.parametrize("depth", (1, 2, 5))
+    def test_yields_all_pages_in_order(self, depth):
+        pages = _pages(6)
+
+        assert list(prefetch_pages(pages["page1"], pages.__getitem__, depth)) == [
+            pages["page{}".format(i)] for i in range(1, 7)
+        ]
+
+    def test_next_page_fetched_before_current_page_consumed(self):
+        pages = _pages(2)
+        fetched = threading.Event()
+
+        def get_page(url):
+            fetched.set()
+            return pages[url]
+
+        walker = prefetch_pages(pages["page1"], get_page, 1)
+
+        assert next(walker) is pages["page1"]
+        assert fetched.wait(timeout=5)
+        assert list(walker) == [pages["page2"]]
+
+    def test_prefetched_pages_are_bounded_by_depth(self):
+        pages = _pages(10)
+        get_page = mock.Mock(side_effect=pages.__getitem__)
+
+        walker = prefetch_pages(pages["page1"], get_page, 2, poll_interval=0.01)
+        next(walker)
+
+        # two pages can be waiting in the queue, and a third fetched and waiting to be queued
+        deadline = time.monotonic() + 5
+        while get_page.call_count < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        assert get_page.call_count == 3
+
+        walker.close()
+
+    def test_closing_stops_further_fetches(self):
+        pages = _pages(5)
+        in_flight = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def get_page(url):
+            calls.append(url)
+            in_flight.set()
+            release.wait(timeout=5)
+            return pages[url]
+
+        walker = prefetch_pages(pages["page1"], get_page, 1, poll_interval=0.01)
+        next(walker)
+        assert in_flight.wait(timeout=5)
+
+        walker.close()
+        release.set()
+        time.sleep(0.1)
+
+        assert calls == ["page2"]
+
+    def test_errors_are_raised_to_the_consumer(self):
+        pages = _pages(3)
+
+        def get_page(url):
+            if url == "page3":
+                raise ValueError("broken")
+            return pages[url]
+
+        walker = prefetch_pages(pages["page1"], get_page, 2)
+
+        assert next(walker) is pages["page1"]
+        assert next(walker) is pages["page2"]
+        with pytest.raises(ValueError, match="broken"):
+            next(walker)
+
+    def test_single_page_needs_no_fetches(self):
+        get_page = mock.Mock()
+        page = {"items": [], "links": {}}
+
+        assert list(prefetch_pages(page, get_page, 3)) == [page]
+        assert get_page.call_args_list == []
+
+    def test_depth_must_be_positive(self):
+        with pytest.raises(ValueError):
+            next(prefetch_pages({}, mock.Mock(), 0))
+
+
+def _numbered_pages(count, url="http://baseurl/services?framework=g-cloud-12&page={}"):
+    return {
+        url.format(i): {
+            "items": [i],
+            "links": dict(
+                {"next": url.format(i + 1)} if i < count else {},
+                last=url.format(count),
+            ),
+        }
+        for i in range(1, count + 1)
+    }
+
+
+class TestFanOutPages(object):
+    @pytest.mark.parametrize("workers", (1, 3, 20))
+    def test_yields_all_pages_in_order(self, workers):
+        pages = _numbered_pages(10)
+        first_url = "http://baseurl/services?framework=g-cloud-12&page=1"
+
+        assert [page["items"] for page in fan_out_pages(pages[first_url], pages.__getitem__, workers)] == [
+            [i] for i in range(1, 11)
+        ]
+
+    def test_unordered_yields_all_pages(self):
+        pages = _numbered_pages(10)
+        first_url = "http://baseurl/services?framework=g-cloud-12&page=1"
+
+        walker = fan_out_pages(pages[first_url], pages.__getitem__, 4, ordered=False)
+
+        assert next(walker) is pages[first_url]
+        assert sorted(page["items"][0] for page in walker) == list(range(2, 11))
+
+    def test_unordered_yields_pages_as_they_arrive(self):
+        pages = _numbered_pages(3)
+        release_slow_page = threading.Event()
+
+        def get_page(url):
+            if url.endswith("page=2"):
+                assert release_slow_page.wait(timeout=5)
+            return pages[url]
+
+        walker = fan_out_pages(pages["http://baseurl/services?framework=g-cloud-12&page=1"], get_page, 2, ordered=False)
+
+        assert next(walker)["items"] == [1]
+        assert next(walker)["items"] == [3]
+        release_slow_page.set()
+        assert next(walker)["items"] == [2]
+        assert list(walker) == []
+
+    def test_requests_pages_by_number_from_last_link(self):
+        pages = _numbered_pages(4, url="http://baseurl/services?page={}&lot=cloud-hosting")
+        get_page = mock.Mock(side_effect=pages.__getitem__)
+
+        list(fan_out_pages(pages["http://baseurl/services?page=1&lot=cloud-hosting"], get_page, 2))
+
+        assert sorted(call[0][0] for call in get_page.call_args_list) == [
+            "http://baseurl/services?page=2&lot=cloud-hosting",
+            "http://baseurl/services?page=3&lot=cloud-hosting",
+            "http://baseurl/services?page=4&lot=cloud-hosting",
+        ]
+
+    def test_starts_from_the_next_page(self):
+        pages = _numbered_pages(5)
+        get_page = mock.Mock(side_effect=pages.__getitem__)
+
+        walker = fan_out_pages(pages["http://baseurl/services?framework=g-cloud-12&page=3"], get_page, 2)
+
+        assert [page["items"] for page in walker] == [[3], [4], [5]]
+        assert get_page.call_count == 2
+
+    def test_falls_back_to_following_next_links_without_last_link(self):
+        pages = _pages(3)
+        get_page = mock.Mock(side_effect=pages.__getitem__)
+
+        assert list(fan_out_pages(pages["page1"], get_page, 4)) == [pages["page1"], pages["page2"], pages["page3"]]
+
+    def test_single_page(self):
+        page = {"items": [1], "links": {"last": "http://baseurl/services?page=1"}}
+        get_page = mock.Mock()
+
+        assert list(fan_out_pages(page, get_page, 4)) == [page]
+        assert get_page.call_args_list == []
+
+    def test_in_flight_pages_are_bounded_by_workers(self):
+        pages = _numbered_pages(20)
+        get_page = mock.Mock(side_effect=pages.__getitem__)
+
+        walker = fan_out_pages(pages["http://baseurl/services?framework=g-cloud-12&page=1"], get_page, 3)
+        next(walker)
+        next(walker)
+        time.sleep(0.05)
+        walker.close()
+
+        # pages 2-4 are requested up front, and page 5 only once page 2 has been handed over
+        assert get_page.call_count <= 4
+
+    def test_errors_are_raised_to_the_consumer(self):
+        pages = _numbered_pages(4)
+
+        def get_page(url):
+            if url.endswith("page=3"):
+                raise ValueError("broken")
+            return pages[url]
+
+        walker = fan_out_pages(pages["http://baseurl/services?framework=g-cloud-12&page=1"], get_page, 2)
+
+        assert next(walker)["items"] == [1]
+        assert next(walker)["items"] == [2]
+        with pytest.raises(ValueError, match="broken"):
+            next(walker)
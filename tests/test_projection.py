@@ -0,0 +1,41 @@
+from dmapiclient.projection import Projection
+
+
+SUPPLIER = {
+    "id": 1,
+    "name": "Supplier",
+    "contactInformation": [
+        {"email": "one@example.com", "phoneNumber": "01234"},
+        {"email": "two@example.com", "phoneNumber": "05678"},
+    ],
+    "service_counts": {"G-Cloud 12": 3, "G-Cloud 11": 1},
+}
+
+
+class TestProjection(object):
+    def test_top_level_fields(self):
+        assert Projection(["id", "name"])(SUPPLIER) == {"id": 1, "name": "Supplier"}
+
+    def test_nested_fields(self):
+        assert Projection(["id", "service_counts.G-Cloud 12"])(SUPPLIER) == {
+            "id": 1, "service_counts": {"G-Cloud 12": 3},
+        }
+
+    def test_fields_of_lists_of_objects(self):
+        assert Projection(["contactInformation.email"])(SUPPLIER) == {
+            "contactInformation": [{"email": "one@example.com"}, {"email": "two@example.com"}],
+        }
+
+    def test_whole_field_includes_nested_fields(self):
+        for fields in (
+            ["service_counts", "service_counts.G-Cloud 12"],
+            ["service_counts.G-Cloud 12", "service_counts"],
+        ):
+            assert Projection(fields)(SUPPLIER) == {"service_counts": SUPPLIER["service_counts"]}
+
+    def test_missing_fields_are_left_out(self):
+        assert Projection(["id", "dunsNumber", "name.first"])(SUPPLIER) == {"id": 1, "name": "Supplier"}
+
+    def test_does_not_change_model(self):
+        Projection(["contactInformation.email"])(SUPPLIER)
+        assert SUPPLIER["contactInformation"][0]["phoneNumber"] == "01234"
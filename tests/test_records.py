@@ -0,0 +1,72 @@
+import pickle
+
+import pytest
+
+from dmapiclient.records import AuditEvent, Brief, Service, record_type
+
+
+AUDIT_EVENT = {
+    "id": 10,
+    "type": "update_service",
+    "user": "user@example.com",
+    "createdAt": "2026-01-01T00:00:00.000000Z",
+    "acknowledged": False,
+    "objectType": "services",
+    "objectId": "1123456789",
+    "data": {"serviceId": "1123456789"},
+    "links": {"self": "http://baseurl/audit-events/10"},
+}
+
+
+class TestRecord(object):
+    def test_slotted_fields(self):
+        audit_event = AuditEvent(AUDIT_EVENT)
+
+        assert audit_event.id == 10
+        assert audit_event.created_at == "2026-01-01T00:00:00.000000Z"
+        assert audit_event.object_id == "1123456789"
+        # missing from the model
+        assert audit_event.acknowledged_by is None
+        assert not hasattr(audit_event, "__dict__")
+
+    def test_lookup_by_key(self):
+        audit_event = AuditEvent(AUDIT_EVENT)
+
+        assert audit_event["createdAt"] == "2026-01-01T00:00:00.000000Z"
+        assert audit_event["data"] == {"serviceId": "1123456789"}
+        assert audit_event.get("links") == {"self": "http://baseurl/audit-events/10"}
+        assert audit_event.get("missing", "default") == "default"
+        assert "data" in audit_event
+        assert "missing" not in audit_event
+        with pytest.raises(KeyError):
+            audit_event["missing"]
+
+    def test_without_other_fields(self):
+        brief = Brief({"id": 1, "status": "live"})
+
+        assert brief.get("data") is None
+        with pytest.raises(KeyError):
+            brief["data"]
+
+    def test_to_dict(self):
+        assert AuditEvent(AUDIT_EVENT).to_dict() == dict(
+            AUDIT_EVENT, acknowledgedBy=None, acknowledgedAt=None,
+        )
+
+    def test_equality_and_pickling(self):
+        audit_event = AuditEvent(AUDIT_EVENT)
+
+        assert pickle.loads(pickle.dumps(audit_event)) == audit_event
+        assert audit_event != AuditEvent(dict(AUDIT_EVENT, id=11))
+        assert Service({"id": 1}) != Brief({"id": 1})
+
+    def test_repr(self):
+        assert repr(Service({"id": "1", "lot": "cloud-hosting"})) == (
+            "Service(id='1', service_name=None, supplier_id=None, supplier_name=None, framework_slug=None, "
+            "lot='cloud-hosting', status=None)"
+        )
+
+    def test_record_type(self):
+        assert record_type("find_services", ("services",)) is Service
+        with pytest.raises(ValueError):
+            record_type("find_outcomes", ("outcomes",))
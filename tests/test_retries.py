@@ -0,0 +1,105 @@
+import mock
+import pytest
+from urllib3.exceptions import MaxRetryError, ProtocolError
+from urllib3.response import HTTPResponse
+
+from dmapiclient.retries import RetryBudget, RetryPolicy
+
+
+class TestRetryBudget(object):
+    def test_minimum_retries_allowed_without_successes(self, clock):
+        budget = RetryBudget(0.5, min_retries_per_second=0.2, window=10, clock=clock)
+
+        assert [budget.try_retry() for _ in range(3)] == [True, True, False]
+        assert budget.stats == {"successes": 0, "retries": 2, "denied": 1}
+
+    def test_successes_top_up_budget(self, clock):
+        budget = RetryBudget(0.5, min_retries_per_second=0, window=10, clock=clock)
+
+        assert budget.try_retry() is False
+        for _ in range(4):
+            budget.record_success()
+
+        assert [budget.try_retry() for _ in range(3)] == [True, True, False]
+
+    def test_old_activity_forgotten(self, clock):
+        budget = RetryBudget(1, min_retries_per_second=0, window=10, clock=clock)
+        budget.record_success()
+        assert budget.try_retry() is True
+        assert budget.try_retry() is False
+
+        clock.now += 5
+        budget.record_success()
+
+        clock.now += 5
+        # the first second's success and retry have now expired, leaving one unspent success
+        assert budget.try_retry() is True
+        assert budget.stats == {"successes": 1, "retries": 1, "denied": 1}
+
+
+class TestRetryPolicy(object):
+    def test_overrides_by_endpoint(self):
+        export_policy = RetryPolicy(0)
+        policy = RetryPolicy(overrides={"/suppliers/export/{framework_slug}": export_policy})
+
+        assert policy.for_path("/suppliers/export/g-cloud-12") is export_policy
+        assert policy.for_path("/suppliers/export") is policy
+        assert policy.for_path("/suppliers/123") is policy
+
+    def test_no_budget(self):
+        assert RetryPolicy(budget_ratio=None).new_budget() is None
+        assert RetryPolicy(budget_ratio=0.5).new_budget().ratio == 0.5
+
+    def test_jittered_backoff_is_decorrelated_and_capped(self):
+        policy = RetryPolicy(backoff_factor=1, backoff_max=10)
+
+        with mock.patch("random.uniform", side_effect=lambda low, high: high) as uniform:
+            assert policy.next_backoff(0) == 3
+            assert policy.next_backoff(3) == 9
+            assert policy.next_backoff(9) == 10
+
+        assert uniform.call_args_list == [mock.call(1, 3), mock.call(1, 9), mock.call(1, 27)]
+        assert all(1 <= policy.next_backoff(5) <= 10 for _ in range(100))
+
+    def test_backoff_without_jitter_doubles(self):
+        policy = RetryPolicy(backoff_factor=0.5, backoff_max=3, jitter=False)
+
+        backoffs = [0.]
+        for _ in range(4):
+            backoffs.append(policy.next_backoff(backoffs[-1]))
+
+        assert backoffs == [0., 0.5, 1., 2., 3.]
+
+    def test_retry_backs_off_and_draws_on_budget(self, clock):
+        budget = RetryBudget(0, min_retries_per_second=0.2, window=10, clock=clock)
+        retry = RetryPolicy(5, backoff_factor=1, jitter=False).make_retry(budget)
+
+        retry = retry.increment("GET", "/", error=ProtocolError())
+        assert retry.get_backoff_time() == 1
+        retry = retry.increment("GET", "/", error=ProtocolError())
+        assert retry.get_backoff_time() == 2
+
+        with pytest.raises(MaxRetryError) as e:
+            retry.increment("GET", "/", error=ProtocolError())
+
+        assert e.value._dmapiclient_retries == 2
+        assert budget.stats["denied"] == 1
+
+    def test_read_timeouts_not_retried_for_nowait_requests(self):
+        retry = RetryPolicy(3).make_retry(None, retry_read_timeouts=False)
+
+        assert (retry.total, retry.read, retry.connect) == (3, 0, 3)
+
+    @pytest.mark.parametrize("headers,expected_sleep", (
+        ({"Retry-After": "7"}, 7),
+        ({}, 1),
+    ))
+    def test_retry_after_honoured(self, headers, expected_sleep):
+        retry = RetryPolicy(5, backoff_factor=1, jitter=False).make_retry(None)
+        response = HTTPResponse(status=429, headers=headers)
+        retry = retry.increment("GET", "/", response=response)
+
+        with mock.patch("urllib3.util.retry.time.sleep") as sleep:
+            retry.sleep(response)
+
+        assert sleep.call_args_list == [mock.call(expected_sleep)]
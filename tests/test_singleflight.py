@@ -0,0 +1,197 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from dmapiclient.deadlines import deadline
+from dmapiclient.errors import DeadlineExceeded, HTTPError
+from dmapiclient.singleflight import SingleFlight
+
+
+def run_concurrently(single_flight, key, fn, callers):
+    """Call ``single_flight.do`` from ``callers`` threads, letting ``fn`` finish once they're all waiting"""
+    release = threading.Event()
+
+    def blocking_fn():
+        release.wait(5)
+        return fn()
+
+    def call():
+        try:
+            return single_flight.do(key, blocking_fn, name=str(key))
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(callers) as executor:
+        futures = [executor.submit(call) for _ in range(callers)]
+        while single_flight.stats["calls"] < callers:
+            threading.Event().wait(0.001)
+        release.set()
+        return [future.result() for future in futures]
+
+
+class TestSingleFlight(object):
+    def test_concurrent_calls_share_one_call(self):
+        single_flight = SingleFlight()
+        calls = []
+
+        results = run_concurrently(single_flight, "key", lambda: calls.append(1) or "result", 5)
+
+        assert results == ["result"] * 5
+        assert len(calls) == 1
+        assert single_flight.stats == {"calls": 5, "coalesced": 4, "in_flight": 0}
+        assert single_flight.key_stats() == {"key": {"calls": 5, "coalesced": 4}}
+
+    def test_error_raised_to_every_caller(self):
+        single_flight = SingleFlight()
+        error = HTTPError(message="Oops")
+
+        def fail():
+            raise error
+
+        results = run_concurrently(single_flight, "key", fail, 3)
+
+        assert all(isinstance(result, HTTPError) for result in results)
+        assert [(result.message, result.status_code) for result in results] == [("Oops", 503)] * 3
+        # each caller has its own copy
+        assert len({id(result) for result in results}) == 3
+
+    def test_calls_after_one_finishes_not_shared(self):
+        single_flight = SingleFlight()
+        results = iter(("first", "second"))
+
+        assert single_flight.do("key", lambda: next(results), name="key") == "first"
+        assert single_flight.do("key", lambda: next(results), name="key") == "second"
+        assert single_flight.stats["coalesced"] == 0
+
+    def test_different_keys_not_shared(self):
+        single_flight = SingleFlight()
+
+        assert single_flight.do("a", lambda: single_flight.do("b", lambda: "b", name="b"), name="a") == "b"
+        assert single_flight.key_stats() == {"a": {"calls": 1, "coalesced": 0}, "b": {"calls": 1, "coalesced": 0}}
+
+    def test_key_stats_limited_to_recent_names(self):
+        single_flight = SingleFlight(max_tracked_keys=2)
+        for name in ("a", "b", "a", "c"):
+            single_flight.do(name, lambda: None, name=name)
+
+        assert list(single_flight.key_stats()) == ["a", "c"]
+        assert single_flight.stats["calls"] == 4
+
+    def test_waiters_give_up_at_their_deadline(self):
+        single_flight = SingleFlight()
+        release = threading.Event()
+
+        with ThreadPoolExecutor(1) as executor:
+            leader = executor.submit(single_flight.do, "key", lambda: release.wait(5) and "result", name="key")
+            while single_flight.stats["in_flight"] < 1:
+                time.sleep(0.001)
+
+            start_time = time.perf_counter()
+            with deadline(0.1), pytest.raises(DeadlineExceeded):
+                single_flight.do("key", lambda: "waiter's result", name="key")
+            assert time.perf_counter() - start_time < 1
+
+            release.set()
+            assert leader.result() == "result"
+
+    def test_leaders_deadline_exceeded_not_shared(self):
+        single_flight = SingleFlight()
+
+        def run_out_of_time():
+            while single_flight.stats["calls"] < 2:
+                time.sleep(0.001)
+            raise DeadlineExceeded(message="Out of time")
+
+        with ThreadPoolExecutor(1) as executor:
+            leader = executor.submit(single_flight.do, "key", run_out_of_time, name="key")
+            while single_flight.stats["in_flight"] < 1:
+                time.sleep(0.001)
+
+            # this waiter has no deadline, so makes its own call instead
+            assert single_flight.do("key", lambda: "waiter's result", name="key") == "waiter's result"
+            with pytest.raises(DeadlineExceeded):
+                leader.result()
+
+    def test_async_concurrent_calls_share_one_call(self):
+        single_flight = SingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        async def test():
+            return await asyncio.gather(*(single_flight.do_async("key", fn, name="key") for _ in range(3)))
+
+        assert asyncio.run(test()) == ["result"] * 3
+        assert len(calls) == 1
+        assert single_flight.stats == {"calls": 3, "coalesced": 2, "in_flight": 0}
+
+    def test_async_waiters_call_again_if_leader_cancelled(self):
+        single_flight = SingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        async def test():
+            leader = asyncio.ensure_future(single_flight.do_async("key", fn, name="key"))
+            await asyncio.sleep(0)
+            waiter = asyncio.ensure_future(single_flight.do_async("key", fn, name="key"))
+            await asyncio.sleep(0)
+            leader.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+            return await waiter
+
+        assert asyncio.run(test()) == "result"
+        assert len(calls) == 2
+
+    def test_async_waiters_give_up_at_their_deadline(self):
+        single_flight = SingleFlight()
+
+        async def slow_fn():
+            await asyncio.sleep(0.5)
+            return "result"
+
+        async def waiter():
+            with deadline(0.05):
+                return await single_flight.do_async("key", slow_fn, name="key")
+
+        async def test():
+            leader = asyncio.ensure_future(single_flight.do_async("key", slow_fn, name="key"))
+            await asyncio.sleep(0)
+            start_time = time.perf_counter()
+            with pytest.raises(DeadlineExceeded):
+                await waiter()
+            assert time.perf_counter() - start_time < 0.4
+            return await leader
+
+        assert asyncio.run(test()) == "result"
+
+    def test_async_leaders_deadline_exceeded_not_shared(self):
+        single_flight = SingleFlight()
+
+        async def run_out_of_time():
+            await asyncio.sleep(0.01)
+            raise DeadlineExceeded(message="Out of time")
+
+        async def own_call():
+            return "waiter's result"
+
+        async def test():
+            leader = asyncio.ensure_future(single_flight.do_async("key", run_out_of_time, name="key"))
+            await asyncio.sleep(0)
+            waiter = asyncio.ensure_future(single_flight.do_async("key", own_call, name="key"))
+            with pytest.raises(DeadlineExceeded):
+                await leader
+            return await waiter
+
+        assert asyncio.run(test()) == "waiter's result"
+        assert single_flight.stats == {"calls": 3, "coalesced": 1, "in_flight": 0}
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+from dmapiclient.streaming import JSONArrayStream
+
+
+DOCUMENT = {
+    "links": {"next": "http://baseurl/suppliers?page=2"},
+    "meta": {"total": 3},
+    "suppliers": [{"id": 1, "name": "Ünïcode Ltd"}, {"id": 2, "tags": [1.5, None, True]}, 3],
+}
+
+
+def _chunked(body, size):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+class TestJSONArrayStream(object):
+    @pytest.mark.parametrize("chunk_size", (1, 2, 7, 64, 4096))
+    def test_yields_items_and_collects_other_members(self, chunk_size):
+        body = json.dumps(DOCUMENT, indent=2, ensure_ascii=False).encode("utf-8")
+        stream = JSONArrayStream(_chunked(body, chunk_size), ("suppliers",))
+
+        assert list(stream) == DOCUMENT["suppliers"]
+        assert stream.array_name == "suppliers"
+        assert stream.members == {"links": DOCUMENT["links"], "meta": DOCUMENT["meta"]}
+
+    def test_items_are_yielded_before_the_body_is_finished(self):
+        body = json.dumps({"users": [{"id": 1}, {"id": 2}]}).encode("utf-8")
+        read = []
+
+        def chunks():
+            for chunk in _chunked(body, 4):
+                read.append(chunk)
+                yield chunk
+
+        items = iter(JSONArrayStream(chunks(), ("users",)))
+
+        assert next(items) == {"id": 1}
+        assert len(b"".join(read)) < len(body)
+
+    def test_numbers_split_across_chunks(self):
+        assert list(JSONArrayStream([b'{"ids": [12', b'34, 5', b"6]}"], ("ids",))) == [1234, 56]
+
+    def test_first_named_array_in_the_document_is_streamed(self):
+        stream = JSONArrayStream([b'{"b": [2], "a": [1]}'], ("a", "b"))
+
+        assert list(stream) == [2]
+        assert stream.members == {"a": [1]}
+
+    @pytest.mark.parametrize("body", (b'{}', b'{"suppliers": []}', b'{"suppliers": {"id": 1}}', b' {"other": [1]} '))
+    def test_no_items(self, body):
+        assert list(JSONArrayStream([body], ("suppliers",))) == []
+
+    @pytest.mark.parametrize("body", (
+        b"",
+        b"not json",
+        b'{"suppliers": [{"id": 1}',
+        b'{"suppliers": [{"id": 1}]',
+        b'{"suppliers": [{"id": 1}}',
+        b'{"suppliers": [1]} trailing',
+        b'{1: []}',
+    ))
+    def test_invalid_json(self, body):
+        with pytest.raises(ValueError):
+            list(JSONArrayStream(_chunked(body, 3), ("suppliers",)))
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+import gzip
+
+import mock
+
+from dmapiclient.transfer import TransferStats, gzip_body, response_wire_size
+
+
+def test_gzip_body():
+    assert gzip.decompress(gzip_body(b'{"a": 1}', 6)) == b'{"a": 1}'
+
+
+class TestResponseWireSize(object):
+    def test_uses_bytes_read_from_raw_response(self):
+        response = mock.Mock(raw=mock.Mock(tell=mock.Mock(return_value=40)), headers={"Content-Length": "50"})
+
+        assert response_wire_size(response) == 40
+
+    def test_falls_back_to_content_length(self):
+        response = mock.Mock(raw=None, headers={"Content-Length": "50"}, content=b"x" * 100)
+
+        assert response_wire_size(response) == 50
+
+    def test_falls_back_to_content(self):
+        response = mock.Mock(raw=None, headers={}, content=b"x" * 100)
+
+        assert response_wire_size(response) == 100
+
+
+class TestTransferStats(object):
+    def test_stats(self):
+        stats = TransferStats()
+        stats.record("POST", "http://baseurl/thing", 1000, 200, 10, 10)
+        stats.record("GET", "http://baseurl/thing", 0, 0, 5000, 1000)
+
+        assert stats.stats == {
+            "requests": 2,
+            "compressed_requests": 1,
+            "request_bytes": 1000,
+            "request_wire_bytes": 200,
+            "response_bytes": 5010,
+            "response_wire_bytes": 1010,
+            "bytes_saved": 4800,
+        }